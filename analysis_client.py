@@ -0,0 +1,61 @@
+#!/usr/bin/python3
+from argparse import ArgumentParser
+import json
+import os
+import sys
+from typing import Dict, List
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+# only the standard library, to start in milliseconds
+DEFAULT_PORT = 8765
+
+def request(port: int, report: str, params: Dict[str, str]) -> dict:
+    url = f"http://127.0.0.1:{port}/{report}?{urlencode({name: value for name, value in params.items() if value is not None})}"
+    try:
+        with urlopen(url) as response:
+            return json.load(response)
+    except HTTPError as e:
+        print(json.load(e)["error"], file=sys.stderr)
+        exit(1)
+
+def writeFiles(directory: str, files: Dict[str, str]):
+    os.makedirs(directory, exist_ok=True)
+    for filename, content in files.items():
+        with open(os.path.join(directory, filename), "w") as f:
+            f.write(content)
+
+if __name__ == '__main__':
+    parser = ArgumentParser(prog="Gets the reports of the analysis scripts from a running analysis_server.py and writes them where the scripts would")
+    parser.add_argument("--port", help="Port of the analysis server", default=DEFAULT_PORT, type=int)
+    # every report takes the options of the scripts
+    options = ArgumentParser(add_help=False)
+    options.add_argument("--timeout", help="Virtual timeout cut in seconds, slower results count as timeouts", type=float)
+    reports = parser.add_subparsers(dest="report", required=True)
+    summaryParser = reports.add_parser("summary", parents=[options], help="result counts of every experiment, as summary.py prints them")
+    summaryParser.add_argument("--category", help="Only count results of this query category, e.g. ReachabilityCardinality")
+    matrixParser = reports.add_parser("matrix", parents=[options], help="the table of create_matrix.py")
+    matrixParser.add_argument("experiments", nargs='+', help="all experiments included in the matrix in <name>-<strategy> format")
+    cactusParser = reports.add_parser("cactus", parents=[options], help="the tables/ files of create_cactus_data.py")
+    cactusParser.add_argument("time_lower_threshold", type=float)
+    cactusParser.add_argument("experiments", nargs='+', help="all experiments included in the matrix in <name>-<strategy> format")
+    compareParser = reports.add_parser("compare", parents=[options], help="the compared/ files of compare.py")
+    compareParser.add_argument("experiment_a", help="Name of experiment in the format <name>-<strategy>")
+    compareParser.add_argument("experiment_b", help="Name of experiment in the format <name>-<strategy>")
+    args = parser.parse_args()
+
+    if (args.report == "summary"):
+        rows: List[dict] = request(args.port, "summary", {"timeout": args.timeout, "category": args.category})["experiments"]
+        if (len(rows) > 0):
+            header = list(rows[0].keys())
+            table = [header] + [[str(row[column]) for column in header] for row in rows]
+            widths = [max(len(row[i]) for row in table) for i in range(len(header))]
+            for row in table:
+                print("  ".join(value.ljust(width) if i == 0 else value.rjust(width) for i, (value, width) in enumerate(zip(row, widths))))
+    elif (args.report == "matrix"):
+        sys.stdout.write(request(args.port, "matrix", {"experiments": ",".join(args.experiments), "timeout": args.timeout})["table"])
+    elif (args.report == "cactus"):
+        writeFiles("tables", request(args.port, "cactus", {"experiments": ",".join(args.experiments), "threshold": args.time_lower_threshold, "timeout": args.timeout})["files"])
+    elif (args.report == "compare"):
+        writeFiles("compared", request(args.port, "compare", {"baseline": args.experiment_a, "candidate": args.experiment_b, "timeout": args.timeout})["files"])
@@ -1,5 +1,7 @@
 import sqlite3
-from typing import Self
+from typing import Optional, Self
+
+from schema import STATUS_CODES
 
 class Experiment:
     def __init__(self, name: str, strategy: str):
@@ -35,4 +37,38 @@ class Experiment:
 
 def getExperimentId(con: sqlite3.Connection, experiment: Experiment):
     res = con.execute("SELECT id FROM experiment WHERE name=? AND search_strategy=?", (experiment.name, experiment.strategy))
-    return res.fetchone()[0]
\ No newline at end of file
+    return res.fetchone()[0]
+def attachCatalogue(con: sqlite3.Connection, cataloguePath: str = "catalogue.db"):
+    """Makes the model and query catalogue built by catalogue.py readable as catalogue.model, catalogue.query_file and catalogue.query"""
+    con.execute("ATTACH DATABASE ? AS catalogue", (cataloguePath,))
+
+def applyTimeout(con: sqlite3.Connection, timeout: Optional[float]):
+    """
+    Shadows query_result on this connection with a temporary view of the
+    results as if every query had been stopped after timeout seconds: slower
+    results become Timeouts without time, result, states and timings, as
+    generate_data used to store them. max_memory is kept. None keeps the
+    results as measured. The database must have been migrated by
+    schema.migrate_schema.
+    """
+    con.execute("DROP VIEW IF EXISTS temp.query_result")
+    if (timeout is None):
+        return
+    cut = repr(float(timeout))
+    con.execute(f"""
+    CREATE TEMP VIEW query_result AS
+        SELECT
+            id,
+            experiment_id,
+            query_instance_id,
+            CASE WHEN time > {cut} THEN NULL ELSE time END AS time,
+            CASE WHEN time > {cut} THEN 'Timeout' ELSE status END AS status,
+            CASE WHEN time > {cut} THEN NULL ELSE result END AS result,
+            max_memory,
+            CASE WHEN time > {cut} THEN NULL ELSE states END AS states,
+            CASE WHEN time > {cut} THEN NULL ELSE color_reduction_time END AS color_reduction_time,
+            CASE WHEN time > {cut} THEN NULL ELSE verification_time END AS verification_time,
+            CASE WHEN time > {cut} THEN {STATUS_CODES['Timeout']} ELSE status_code END AS status_code,
+            CASE WHEN time > {cut} THEN NULL ELSE result_code END AS result_code
+        FROM main.query_result
+    """)
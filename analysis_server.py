@@ -0,0 +1,149 @@
+#!/usr/bin/python3
+from argparse import ArgumentParser
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from io import StringIO
+import json
+import os
+import sqlite3
+import tempfile
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from analysis_client import DEFAULT_PORT
+from analysis_helper import Experiment, applyTimeout, getExperimentId
+from columnar_cache import ColumnarCache
+import compare
+from create_cactus_data import CactusCurve, EasyInstances, createTab
+from create_matrix import getUniquesMatrix, print_matrix
+from schema import require_schema
+from summary import COUNTS, get_summary
+
+CACHE_SIZE = 256
+
+Params = Dict[str, List[str]]
+
+def optionalFloat(params: Params, name: str) -> Optional[float]:
+    return float(params[name][0]) if name in params else None
+
+def experimentList(params: Params, name: str = "experiments") -> List[str]:
+    return [experiment for value in params.get(name, []) for experiment in value.split(",") if experiment != ""]
+
+class AnalysisService:
+    """
+    Answers the reports of the analysis scripts on one open connection. The
+    answers are memoized by report and parameters until the database changes,
+    which PRAGMA data_version tells as it changes whenever another connection,
+    e.g. generate_data.py, commits.
+    """
+    def __init__(self, databasePath: str):
+        self.con = sqlite3.connect(databasePath)
+        require_schema(self.con, databasePath)
+        self.columnarCache = ColumnarCache(self.con, databasePath)
+        self.generation: Optional[int] = None
+        self.answers: "OrderedDict[Tuple, dict]" = OrderedDict()
+        self.reports: Dict[str, Callable[[Params], dict]] = {
+            "summary": self.summaryReport,
+            "matrix": self.matrixReport,
+            "cactus": self.cactusReport,
+            "compare": self.compareReport,
+        }
+
+    def answer(self, report: str, params: Params) -> Tuple[dict, bool]:
+        """The answer and whether it was memoized"""
+        if (report not in self.reports):
+            raise KeyError(f"unknown report {report}, available: {', '.join(self.reports)}")
+        generation = self.con.execute("PRAGMA data_version").fetchone()[0]
+        if (generation != self.generation):
+            self.answers.clear()
+            self.generation = generation
+        key = (report, tuple(sorted((name, tuple(values)) for name, values in params.items())))
+        if (key in self.answers):
+            self.answers.move_to_end(key)
+            return self.answers[key], True
+        answer = self.reports[report](params)
+        self.answers[key] = answer
+        if (len(self.answers) > CACHE_SIZE):
+            self.answers.popitem(last=False)
+        return answer, False
+
+    def experimentIds(self, experiments: List[str]) -> List[int]:
+        return [getExperimentId(self.con, Experiment.fromFormat(experiment)) for experiment in experiments]
+
+    def summaryReport(self, params: Params) -> dict:
+        timeout = optionalFloat(params, "timeout")
+        applyTimeout(self.con, timeout)
+        rows = []
+        for id, name, strategy in self.con.execute("SELECT id, name, search_strategy FROM experiment ORDER BY id").fetchall():
+            experimentSummary = get_summary(self.con, id, timeout)
+            rows.append({"experiment": f"{name}-{strategy}", **{column: experimentSummary.count(column, params.get("category", [None])[0]) for column in COUNTS}})
+        return {"experiments": rows}
+
+    def matrixReport(self, params: Params) -> dict:
+        """The matrix and the table create_matrix.py prints of it"""
+        experiments = [Experiment.fromFormat(experiment) for experiment in experimentList(params)]
+        matrix = getUniquesMatrix(self.con, experiments, optionalFloat(params, "timeout"))
+        table = StringIO()
+        print_matrix(table, experiments, matrix)
+        return {"matrix": matrix, "table": table.getvalue()}
+
+    def cactusReport(self, params: Params) -> dict:
+        """The .tab files of create_cactus_data.py by name"""
+        experiments = experimentList(params)
+        columns = self.columnarCache.loadMany(self.experimentIds(experiments), optionalFloat(params, "timeout"))
+        easy = EasyInstances(columns).mask(float(params["threshold"][0]))
+        files = {}
+        for experiment, experimentColumns in zip(experiments, columns):
+            out = StringIO()
+            createTab(out, CactusCurve(experimentColumns).points(easy))
+            files[f"{Experiment.fromFormat(experiment).getFullStrategyName()}.tab"] = out.getvalue()
+        return {"files": files}
+
+    def compareReport(self, params: Params) -> dict:
+        """The files compare.py writes to compared/ by name"""
+        baselineName = params["baseline"][0]
+        candidateName = params["candidate"][0]
+        applyTimeout(self.con, optionalFloat(params, "timeout"))
+        baseline, baselineErrors = compare.loadBaseline(self.con, compare.getExperimentId(self.con, baselineName))
+        with tempfile.TemporaryDirectory() as directory:
+            compare.compare(self.con, baseline, baselineErrors, baselineName, compare.getExperimentId(self.con, candidateName), candidateName, directory)
+            files = {}
+            for filename in sorted(os.listdir(directory)):
+                with open(os.path.join(directory, filename)) as f:
+                    files[filename] = f.read()
+        return {"files": files}
+
+class AnalysisRequestHandler(BaseHTTPRequestHandler):
+    service: AnalysisService
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        try:
+            answer, cached = self.service.answer(url.path.strip("/"), parse_qs(url.query))
+            status = 200
+        except Exception as e:
+            answer, cached = {"error": f"{type(e).__name__}: {e}"}, False
+            status = 400
+        body = json.dumps(answer).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("X-Cached", "1" if cached else "0")
+        self.end_headers()
+        self.wfile.write(body)
+
+if __name__ == '__main__':
+    parser = ArgumentParser(prog="Serves the reports of the analysis scripts over HTTP on localhost, keeping data.db and its caches open between requests")
+    parser.add_argument("--db", help="Path to the database", default="data.db")
+    parser.add_argument("--port", help="Port to listen on", default=DEFAULT_PORT, type=int)
+    args = parser.parse_args()
+
+    AnalysisRequestHandler.service = AnalysisService(args.db)
+    # one request at a time, they share the connection
+    server = HTTPServer(("127.0.0.1", args.port), AnalysisRequestHandler)
+    print(f"serving {args.db} on http://127.0.0.1:{args.port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
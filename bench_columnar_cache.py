@@ -0,0 +1,49 @@
+#!/usr/bin/python3
+from argparse import ArgumentParser
+import os
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+
+from bench_schema import createDatabase
+from columnar_cache import ColumnarCache
+from schema import migrate_schema
+
+parser = ArgumentParser(prog="Benchmark of loading experiments from the columnar cache instead of query_result rows")
+parser.add_argument("-e", "--experiments", help="Number of experiments in the database", default=100, type=int)
+parser.add_argument("-q", "--query-instances", help="Number of query instances every experiment has a result for", default=5000, type=int)
+parser.add_argument("--seed", default=0, type=int)
+
+def rowCounts(con: sqlite3.Connection, experimentIds):
+    """Solve counts the way the scripts computed them: every row through Python"""
+    counts = []
+    for experimentId in experimentIds:
+        rows = con.execute("SELECT query_instance_id, status_code, time, max_memory, states, verification_time, color_reduction_time FROM query_result WHERE experiment_id = ?", (experimentId,)).fetchall()
+        counts.append(sum(1 for row in rows if row[1] == 0))
+    return counts
+
+def cacheCounts(cache: ColumnarCache, experimentIds):
+    return [int(np.count_nonzero(columns.answered())) for columns in cache.loadMany(experimentIds)]
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "data.db")
+        createDatabase(path, args.experiments, args.query_instances, args.seed)
+        con = sqlite3.connect(path)
+        migrate_schema(con)
+        experimentIds = list(range(1, args.experiments + 1))
+        cache = ColumnarCache(con, path)
+
+        start = time.perf_counter()
+        expected = rowCounts(con, experimentIds)
+        print(f"query_result rows: {time.perf_counter() - start:.2f}s")
+        start = time.perf_counter()
+        assert cacheCounts(cache, experimentIds) == expected
+        print(f"cache export: {time.perf_counter() - start:.2f}s")
+        start = time.perf_counter()
+        assert cacheCounts(cache, experimentIds) == expected
+        print(f"cached: {time.perf_counter() - start:.2f}s")
+        con.close()
@@ -0,0 +1,30 @@
+#!/usr/bin/python3
+from argparse import ArgumentParser
+import random
+import time
+
+from find_best_combination import DEFAULT_SEARCH_LIMIT, findCombinations, greedyCombination
+
+parser = ArgumentParser(prog="Checks that find_best_combination.py --method auto stays interactive on experiments answering independent random queries, where branch and bound cuts the least")
+parser.add_argument("-e", "--experiments", help="Number of experiments", default=50, type=int)
+parser.add_argument("-q", "--query-instances", help="Number of query instances", default=5000, type=int)
+parser.add_argument("-k", help="Largest number of experiments in a combination, every k from 1 up is run", default=6, type=int)
+parser.add_argument("--search-limit", help="Seconds the exact search runs before it falls back to greedy", default=DEFAULT_SEARCH_LIMIT, type=float)
+parser.add_argument("--slack", help="Seconds a run may take beyond the search limit, for the greedy fallback", default=2.0, type=float)
+parser.add_argument("--seed", default=0, type=int)
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    # every experiment answers every query with probability 1/2, independently of the others
+    sets = [rng.getrandbits(args.query_instances) for _ in range(args.experiments)]
+    for k in range(1, args.k + 1):
+        start = time.perf_counter()
+        combinations, upperBound = findCombinations(sets, k, 5, "auto", args.search_limit)
+        elapsed = time.perf_counter() - start
+        print(f"k = {k}: {combinations[0][0]} queries{'' if upperBound is None else f', at most {upperBound}'} in {elapsed:.2f}s")
+        assert elapsed <= args.search_limit + args.slack, f"k = {k} took {elapsed:.2f}s"
+        greedy, greedyBound = greedyCombination(sets, k)
+        assert greedy[0] <= combinations[0][0] <= greedyBound
+        if (upperBound is not None):
+            assert combinations[0][0] <= upperBound
@@ -0,0 +1,72 @@
+#!/usr/bin/python3
+from argparse import ArgumentParser
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from generate_data import ResultWriter, configure_bulk_load, create_tables
+from result_parser import QueryInstance, QueryResult, Result, Status
+
+parser = ArgumentParser(prog="Benchmark of inserting one experiment's results into a database")
+parser.add_argument("-n", "--results", help="Number of results in the experiment", default=100000, type=int)
+parser.add_argument("-l", "--legacy-results", help="Number of results inserted with the previous per row statements, which are too slow for the full experiment", default=2000, type=int)
+parser.add_argument("--seed", default=0, type=int)
+
+CATEGORIES = ["ReachabilityCardinality", "ReachabilityFireability"]
+
+def createDatabase(path: str, queryInstances: int) -> sqlite3.Connection:
+    con = sqlite3.connect(path)
+    create_tables(con)
+    con.executemany("INSERT INTO query_instance (model_name, query_name, query_index, query_type, expected_answer) VALUES (?, ?, ?, ?, ?)",
+        ((f"Model{i // 32}-COL-010", CATEGORIES[i // 16 % 2], i % 16 + 1, "ef", None) for i in range(queryInstances)))
+    con.commit()
+    return con
+
+def createResults(count: int, seed: int):
+    rng = random.Random(seed)
+    for i in range(count):
+        out = f"\n###### RUNNING Model{i // 32}-COL-010 X even-DFS X {CATEGORIES[i // 16 % 2]} X {i % 16 + 1} ######\npassed states: {rng.randint(1, 10 ** 6)}\nQuery is satisfied\n"
+        err = f"\n###### RUNNING Model{i // 32}-COL-010 X even-DFS X {CATEGORIES[i // 16 % 2]} X {i % 16 + 1} ######\nTOTAL_TIME: {rng.uniform(0, 300):.2f}s\nMAX_MEMORY: 1000kB\n"
+        yield Result(QueryInstance(f"Model{i // 32}-COL-010", CATEGORIES[i // 16 % 2], i % 16 + 1), rng.uniform(0, 300), Status.Answered, QueryResult.Satisfied, 1000.0, 10.0, "even_DFS", None, 1.0, out, err)
+
+def legacyInsert(con: sqlite3.Connection, results):
+    """The insertion as it was before the writer: one lookup and two single row inserts per result"""
+    cur = con.cursor()
+    experimentId = cur.execute("INSERT INTO experiment (name, search_strategy) VALUES (?, ?) RETURNING id", ("legacy", "even_DFS")).fetchone()[0]
+    for result in results:
+        queryInstanceId = con.execute("SELECT id FROM query_instance WHERE model_name=? AND query_name=? AND query_index=?",
+            (result.query_instance.model_name, result.query_instance.query_name, int(result.query_instance.query_index))).fetchone()[0]
+        res = cur.execute("INSERT INTO query_result (experiment_id, query_instance_id, time, status, result, max_memory, states, color_reduction_time, verification_time) VALUES (?,?,?,?,?,?,?,?,?) RETURNING id",
+            (experimentId, queryInstanceId, result.time, result.status.name, result.result.name, result.maxMemory, result.states, result.colorReductionTime, result.verificationTime))
+        cur.execute("INSERT INTO extended_result (query_result_id, stdout, stderr) VALUES (?, ?, ?)", (res.fetchone()[0], result.fullOut, result.fullErr))
+    con.commit()
+
+def writerInsert(con: sqlite3.Connection, results):
+    writer = ResultWriter(con, 10000)
+    for result in results:
+        writer.add("bench", result)
+    writer.commit()
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        con = createDatabase(os.path.join(directory, "legacy.db"), args.results)
+        # the database as it was before: no index on the query instance key and default pragmas
+        con.execute("DROP INDEX query_instance_key")
+        results = list(createResults(args.legacy_results, args.seed))
+        start = time.perf_counter()
+        legacyInsert(con, results)
+        elapsed = time.perf_counter() - start
+        print(f"per row statements: {len(results)} results in {elapsed:.2f}s, {len(results) / elapsed:.0f} rows/s")
+        con.close()
+
+        con = createDatabase(os.path.join(directory, "writer.db"), args.results)
+        configure_bulk_load(con)
+        results = list(createResults(args.results, args.seed))
+        start = time.perf_counter()
+        writerInsert(con, results)
+        elapsed = time.perf_counter() - start
+        print(f"batched writer: {len(results)} results in {elapsed:.2f}s, {len(results) / elapsed:.0f} rows/s")
+        con.close()
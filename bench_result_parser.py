@@ -0,0 +1,93 @@
+#!/usr/bin/python3
+from argparse import ArgumentParser
+import random
+import re
+import time
+from typing import List, Tuple
+
+from result_parser import QUERY_SATISFIED, QUERY_TIMEOUT, QUERY_UNSATISFIED, TOO_MANY_BINDINGS, QueryInstance, Result, Status, large_pattern
+
+parser = ArgumentParser(prog="Micro-benchmark of result parsing on a synthetic corpus")
+parser.add_argument("-n", "--queries", help="Number of query segments in the corpus", default=20000, type=int)
+parser.add_argument("-r", "--repeat", help="Number of timed runs, the best is reported", default=3, type=int)
+parser.add_argument("-f", "--filler-lines", help="Number of uninteresting verifypn lines per query", default=5, type=int)
+parser.add_argument("--seed", default=0, type=int)
+
+FILLER = [
+    "Parameters: -x 3 model.pnml ReachabilityCardinality.xml -C -n 1",
+    "Size of colored net: 23 places, 31 transitions, and 76 arcs",
+    "Query before reduction: AG (p12 <= p3)",
+    "Query after reduction: AG (p12 <= p3)",
+    "Unfolded in 0.0041 seconds",
+]
+
+def createCorpus(queries: int, fillerLines: int, seed: int) -> Tuple[bytes, bytes]:
+    rng = random.Random(seed)
+    out: List[str] = []
+    err: List[str] = []
+    for index in range(queries):
+        header = f"\n###### RUNNING Model{index // 33}-COL-010 X even-DFS X ReachabilityCardinality X {index % 16 + 1} ######\n"
+        out.append(header)
+        err.append(header)
+        out.extend(rng.choice(FILLER) + "\n" for _ in range(fillerLines))
+        out.append(f"Colored structural reductions computed in {rng.uniform(0, 2):.3e} seconds\n")
+        kind = rng.random()
+        if kind < 0.7:
+            out.append(f"passed states: {rng.randint(1, 10 ** 7)}\n")
+            out.append(f"Spent {rng.uniform(0, 60):.4f} on verification\n")
+            out.append((QUERY_SATISFIED if rng.random() < 0.5 else QUERY_UNSATISFIED) + "\n")
+        elif kind < 0.9:
+            out.append(QUERY_TIMEOUT + "\n")
+        else:
+            out.append(TOO_MANY_BINDINGS + "\n")
+        err.append(f"TOTAL_TIME: {rng.uniform(0, 300):.2f}s\nMAX_MEMORY: {rng.randint(1000, 10 ** 6)}kB\n")
+    return "".join(out).encode(), "".join(err).encode()
+
+def legacyParse(out: bytes, err: bytes) -> int:
+    """The parser as it was before the compiled extractor: decode everything, then one re.search and substring scan per field"""
+    outText = out.decode()
+    errText = err.decode()
+    count = 0
+    for outMatch, errMatch in zip(re.finditer(large_pattern, outText), re.finditer(large_pattern, errText)):
+        outResult = outMatch.group(5)
+        errResult = errMatch.group(5)
+        timeMatch = re.search(r"TOTAL_TIME: ([0-9]+(\.[0-9]+)?)s", errResult)
+        memoryMatch = re.search("MAX_MEMORY: ([0-9]+)kB", errResult)
+        passedListMatch = re.search(r"passed states: ([0-9]+)", outResult)
+        verificationTimeMatch = re.search(r"Spent ([0-9]+(\.[0-9]+)?) on verification", outResult)
+        colorReductionTimeMatch = re.search(r"Colored structural reductions computed in ([0-9]+(\.[0-9]+)?(e(\+|\-)[0-9]+)?) seconds", outResult)
+        values = [float(match.group(1)) if match is not None else None for match in (timeMatch, memoryMatch, passedListMatch, verificationTimeMatch, colorReductionTimeMatch)]
+        if (QUERY_SATISFIED in outResult):
+            status = Status.Answered
+        elif (QUERY_UNSATISFIED in outResult):
+            status = Status.Answered
+        elif (QUERY_TIMEOUT in outResult):
+            status = Status.Timeout
+        elif (TOO_MANY_BINDINGS in outResult):
+            status = Status.TooManyBindings
+        else:
+            status = Status.Error
+        Result(QueryInstance(outMatch.group(1), outMatch.group(3), int(outMatch.group(4))), values[0], status, None, values[1], values[2], outMatch.group(2), values[4], values[3], outResult, errResult)
+        count += 1
+    return count
+
+def currentParse(out: bytes, err: bytes) -> int:
+    return sum(1 for _ in Result.fromOutErr(out, err, True))
+
+def bench(name: str, parse, out: bytes, err: bytes, repeat: int):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = parse(out, err)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{name}: {count} results in {best:.3f}s, {count / best:.0f} results/s")
+    return count / best
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    out, err = createCorpus(args.queries, args.filler_lines, args.seed)
+    print(f"corpus: {args.queries} queries, {len(out) + len(err)} bytes")
+    legacy = bench("per-field re.search", legacyParse, out, err, args.repeat)
+    current = bench("compiled extractor", currentParse, out, err, args.repeat)
+    print(f"speedup: {current / legacy:.2f}x")
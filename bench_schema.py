@@ -0,0 +1,135 @@
+#!/usr/bin/python3
+from argparse import ArgumentParser
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from generate_data import create_tables
+from schema import migrate_schema
+
+parser = ArgumentParser(prog="Benchmark of the report queries before and after the schema migration")
+parser.add_argument("-e", "--experiments", help="Number of experiments in the database", default=55, type=int)
+parser.add_argument("-q", "--query-instances", help="Number of query instances every experiment has a result for", default=2000, type=int)
+parser.add_argument("-r", "--repeat", help="Number of timed runs, the best is reported", default=3, type=int)
+parser.add_argument("--seed", default=0, type=int)
+
+STATUSES = ["Answered"] * 6 + ["Timeout"] * 2 + ["TooManyBindings", "OutOfMemory", "Error"]
+CATEGORIES = ["ReachabilityCardinality", "ReachabilityFireability"]
+
+# (name, query as the scripts ran it before, query as they run it now), all take two experiment ids
+REPORT_QUERIES = [
+    ("compare.py uniques", """
+        SELECT COUNT(*) FILTER (WHERE l.status == "Answered"), COUNT(*) FILTER (WHERE r.status == "Answered")
+        FROM query_result l
+        LEFT JOIN query_result r On r.query_instance_id = l.query_instance_id
+        LEFT JOIN query_instance qi ON qi.id == l.query_instance_id
+        WHERE l.experiment_id = ? and r.experiment_id = ? AND ((l.status = "Answered" AND r.status != "Answered") OR (l.status != "Answered" AND r.status = "Answered"))
+    """, """
+        SELECT COUNT(*) FILTER (WHERE l.status_code == 0), COUNT(*) FILTER (WHERE r.status_code == 0)
+        FROM query_result l
+        LEFT JOIN query_result r On r.query_instance_id = l.query_instance_id
+        LEFT JOIN query_instance qi ON qi.id == l.query_instance_id
+        WHERE l.experiment_id = ? and r.experiment_id = ? AND ((l.status_code = 0 AND r.status_code != 0) OR (l.status_code != 0 AND r.status_code = 0))
+    """),
+    ("compare.py errors", """
+        SELECT COUNT(*) FILTER (WHERE lower(l.status) == "error"), COUNT(*) FILTER (WHERE lower(r.status) == "error")
+        FROM query_result l
+        LEFT JOIN query_result r On r.query_instance_id = l.query_instance_id
+        LEFT JOIN query_instance qi ON qi.id == l.query_instance_id
+        WHERE l.experiment_id = ? and r.experiment_id = ?
+    """, """
+        SELECT COUNT(*) FILTER (WHERE l.status_code = 4), COUNT(*) FILTER (WHERE r.status_code = 4)
+        FROM query_result l
+        LEFT JOIN query_result r On r.query_instance_id = l.query_instance_id
+        LEFT JOIN query_instance qi ON qi.id == l.query_instance_id
+        WHERE l.experiment_id = ? and r.experiment_id = ?
+    """),
+    ("compare.py memory ratio", """
+        SELECT SUM(l.max_memory)/SUM(r.max_memory)
+        FROM query_result l
+        LEFT JOIN query_result r On r.query_instance_id = l.query_instance_id
+        WHERE l.experiment_id = ? and r.experiment_id = ? and lower(l.status) == "answered" AND lower(r.status) == 'answered'
+    """, """
+        SELECT SUM(l.max_memory)/SUM(r.max_memory)
+        FROM query_result l
+        LEFT JOIN query_result r On r.query_instance_id = l.query_instance_id
+        WHERE l.experiment_id = ? and r.experiment_id = ? and l.status_code = 0 AND r.status_code = 0
+    """),
+    ("create_total_solve_type.py", """
+        SELECT COUNT(*) FILTER (WHERE (qi.query_type = 'ef' AND qr1.result = 'Satisfied') OR (qi.query_type = 'ag' AND qr1.result = 'Unsatisfied')),
+            COUNT(*) FILTER (WHERE ((qi.query_type = 'ag' AND qr1.result = 'Satisfied') OR (qi.query_type = 'ef' AND qr1.result = 'Unsatisfied')) AND baseline.status != 'Answered')
+        FROM query_instance qi
+        LEFT JOIN query_result qr1 ON qr1.query_instance_id = qi.id AND qr1.experiment_id = ?
+        LEFT JOIN query_result baseline on baseline.query_instance_id = qi.id AND baseline.experiment_id = ?
+    """, """
+        SELECT COUNT(*) FILTER (WHERE (qi.query_type = 'ef' AND qr1.result_code = 0) OR (qi.query_type = 'ag' AND qr1.result_code = 1)),
+            COUNT(*) FILTER (WHERE ((qi.query_type = 'ag' AND qr1.result_code = 0) OR (qi.query_type = 'ef' AND qr1.result_code = 1)) AND baseline.status_code != 0)
+        FROM query_instance qi
+        LEFT JOIN query_result qr1 ON qr1.query_instance_id = qi.id AND qr1.experiment_id = ?
+        LEFT JOIN query_result baseline on baseline.query_instance_id = qi.id AND baseline.experiment_id = ?
+    """),
+]
+
+def createDatabase(path: str, experiments: int, queryInstances: int, seed: int):
+    rng = random.Random(seed)
+    con = sqlite3.connect(path)
+    # marks the database as migrated, so create_tables leaves the schema as it was before
+    con.execute("PRAGMA user_version = 1")
+    create_tables(con)
+    con.execute("PRAGMA user_version = 0")
+    con.executemany("INSERT INTO experiment (id, name, search_strategy) VALUES (?, ?, ?)", ((i + 1, f"exp{i}", "DFS") for i in range(experiments)))
+    con.executemany("INSERT INTO query_instance (id, model_name, query_name, query_index, query_type, expected_answer) VALUES (?, ?, ?, ?, ?, ?)",
+        ((i + 1, f"Model{i // 32}-COL-010", CATEGORIES[i // 16 % 2], i % 16 + 1, rng.choice(["ag", "ef"]), None) for i in range(queryInstances)))
+    rows = []
+    for experimentId in range(1, experiments + 1):
+        for queryInstanceId in range(1, queryInstances + 1):
+            status = rng.choice(STATUSES)
+            rows.append((experimentId, queryInstanceId, rng.uniform(0, 300), status, rng.choice(["Satisfied", "Unsatisfied"]) if status == "Answered" else None,
+                rng.uniform(1000, 10 ** 6), rng.randint(1, 10 ** 6), rng.uniform(0, 1), rng.uniform(0, 60)))
+    # results are ingested archive by archive, so rows of one experiment are stored together
+    con.executemany("INSERT INTO query_result (experiment_id, query_instance_id, time, status, result, max_memory, states, color_reduction_time, verification_time) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    con.commit()
+    con.close()
+
+def bench(con: sqlite3.Connection, query: str, pairs, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for pair in pairs:
+            con.execute(query, pair).fetchall()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def printPlan(con: sqlite3.Connection, query: str):
+    for row in con.execute("EXPLAIN QUERY PLAN " + query, (1, 2)):
+        print(f"        {row[3]}")
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    pairs = [tuple(rng.sample(range(1, args.experiments + 1), 2)) for _ in range(10)]
+    with tempfile.TemporaryDirectory() as directory:
+        beforePath = os.path.join(directory, "before.db")
+        afterPath = os.path.join(directory, "after.db")
+        createDatabase(beforePath, args.experiments, args.query_instances, args.seed)
+        shutil.copy(beforePath, afterPath)
+        after = sqlite3.connect(afterPath)
+        start = time.perf_counter()
+        migrate_schema(after)
+        print(f"migration of {args.experiments * args.query_instances} results: {time.perf_counter() - start:.2f}s")
+        before = sqlite3.connect(beforePath)
+        for name, legacyQuery, query in REPORT_QUERIES:
+            beforeTime = bench(before, legacyQuery, pairs, args.repeat)
+            afterTime = bench(after, query, pairs, args.repeat)
+            assert [before.execute(legacyQuery, pair).fetchall() for pair in pairs] == [after.execute(query, pair).fetchall() for pair in pairs]
+            print(f"{name}: {1000 * beforeTime / len(pairs):.1f}ms -> {1000 * afterTime / len(pairs):.1f}ms per experiment pair ({beforeTime / afterTime:.0f}x)")
+            print("    before:")
+            printPlan(before, legacyQuery)
+            print("    after:")
+            printPlan(after, query)
+        before.close()
+        after.close()
@@ -0,0 +1,211 @@
+#!/usr/bin/python3
+from argparse import ArgumentParser
+from multiprocessing import Pool
+from pathlib import Path
+import re
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+import xml.etree.ElementTree as ET
+
+CATALOGUE_VERSION = 1
+QUERY_CATEGORIES = ["ReachabilityCardinality", "ReachabilityFireability", "LTLCardinality", "LTLFireability", "CTLCardinality", "CTLFireability"]
+
+def create_catalogue_tables(con: sqlite3.Connection):
+    """
+    The catalogue of an MCC model directory: every model with the size of its
+    net, and every query of its query files. The mtimes are those of the files
+    the rows were read from, a rebuild only reads files whose mtime changed.
+    """
+    if (con.execute("PRAGMA user_version").fetchone()[0] != CATALOGUE_VERSION):
+        for table in ["query", "query_file", "model", "catalogue_info"]:
+            con.execute(f"DROP TABLE IF EXISTS {table}")
+        con.execute(f"PRAGMA user_version = {CATALOGUE_VERSION}")
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS catalogue_info (key TEXT PRIMARY KEY, value)
+    """)
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS model (
+        name TEXT PRIMARY KEY,
+        pnml_mtime_ns INTEGER,
+        places INTEGER,
+        transitions INTEGER,
+        colour_sets INTEGER
+    )
+    """)
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS query_file (
+        model_name TEXT REFERENCES model(name),
+        category TEXT,
+        mtime_ns INTEGER,
+        query_count INTEGER,
+        PRIMARY KEY (model_name, category)
+    )
+    """)
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS query (
+        model_name TEXT,
+        category TEXT,
+        query_index INTEGER,
+        query_id TEXT,
+        query_type TEXT,
+        PRIMARY KEY (model_name, category, query_index),
+        FOREIGN KEY (model_name, category) REFERENCES query_file(model_name, category)
+    )
+    """)
+
+def parse_query_and_type(property: ET.Element) -> Tuple[str, int, Optional[str]]:
+    name = property.find("./{http://mcc.lip6.fr/}id").text
+    m = re.match(r".+\-([^-0-9]+)\-([0-9]+\-)?([0-9]+)$", name)
+    query_name = m.group(1)
+    index = int(m.group(3)) + 1
+
+    if property.find("./{http://mcc.lip6.fr/}formula/{http://mcc.lip6.fr/}all-paths") is not None:
+        return query_name, index, "ag"
+    elif property.find("./{http://mcc.lip6.fr/}formula/{http://mcc.lip6.fr/}exists-path") is not None:
+        return query_name, index, "ef"
+    elif property.find("./{http://mcc.lip6.fr/}formula/{http://mcc.lip6.fr/}negation/{http://mcc.lip6.fr/}all-paths") is not None:
+        return query_name, index, "ef"
+    elif property.find("./{http://mcc.lip6.fr/}formula/{http://mcc.lip6.fr/}negation/{http://mcc.lip6.fr/}exists-path") is not None:
+        return query_name, index, "ag"
+    else:
+        return query_name, index, None
+
+def read_query_types(queryFilePath: Path) -> List[Tuple[int, str, Optional[str]]]:
+    """The index, id and query type of every property of a query file, in file order, parsed in one streaming pass"""
+    queries = []
+    root = None
+    for event, element in ET.iterparse(str(queryFilePath), events=("start", "end")):
+        if (root is None):
+            root = element
+        if (event == "end" and element.tag == "{http://mcc.lip6.fr/}property"):
+            _, index, query_type = parse_query_and_type(element)
+            queries.append((index, element.find("./{http://mcc.lip6.fr/}id").text, query_type))
+            # drop the parsed property, only the root stays in memory
+            root.clear()
+    return queries
+
+def read_pnml_stats(pnmlPath: Path) -> Tuple[int, int, int]:
+    """Counts the places, transitions and colour sets (named sorts) of a net in one streaming pass"""
+    places = 0
+    transitions = 0
+    colourSets = 0
+    for _, element in ET.iterparse(str(pnmlPath), events=("end",)):
+        tag = element.tag.rsplit("}", 1)[-1]
+        if (tag == "place"):
+            places += 1
+        elif (tag == "transition"):
+            transitions += 1
+        elif (tag == "namedsort"):
+            colourSets += 1
+        # nothing is needed after the end tag, dropping the content keeps memory flat on large nets
+        element.clear()
+    return places, transitions, colourSets
+
+def mtime_ns(path: Path) -> Optional[int]:
+    try:
+        return path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+class ModelScan:
+    """What has to be re-read of one model, the unit of work of update_catalogue"""
+    def __init__(self, modelRoot: Path, pnmlMtime: Optional[int], readPnml: bool, categoryMtimes: Dict[str, Optional[int]]):
+        self.modelRoot = modelRoot
+        self.pnmlMtime = pnmlMtime
+        self.readPnml = readPnml
+        self.categoryMtimes = categoryMtimes
+
+def read_model(scan: ModelScan) -> Tuple[Optional[Tuple[int, int, int]], Dict[str, List[Tuple[int, str, Optional[str]]]]]:
+    stats = None
+    if (scan.readPnml and scan.pnmlMtime is not None):
+        stats = read_pnml_stats(scan.modelRoot / "model.pnml")
+    queries = dict()
+    for category, categoryMtime in scan.categoryMtimes.items():
+        queries[category] = [] if categoryMtime is None else read_query_types(scan.modelRoot / (category + ".xml"))
+    return stats, queries
+
+def update_catalogue(con: sqlite3.Connection, modelsPath: str, jobs: int = 1):
+    """Brings the catalogue up to date with the model directory, reading only new and changed files"""
+    create_catalogue_tables(con)
+    resolvedPath = str(Path(modelsPath).resolve())
+    storedPath = con.execute("SELECT value FROM catalogue_info WHERE key = 'models_path'").fetchone()
+    if (storedPath is not None and storedPath[0] != resolvedPath):
+        print(f"catalogue was built from {storedPath[0]}, rebuilding it")
+        for table in ["query", "query_file", "model"]:
+            con.execute(f"DELETE FROM {table}")
+    con.execute("INSERT OR REPLACE INTO catalogue_info (key, value) VALUES ('models_path', ?)", (resolvedPath,))
+
+    knownPnmlMtimes = dict(con.execute("SELECT name, pnml_mtime_ns FROM model"))
+    knownQueryMtimes = {(model_name, category): fileMtime for model_name, category, fileMtime in con.execute("SELECT model_name, category, mtime_ns FROM query_file")}
+    modelRoots = sorted(modelRoot for modelRoot in Path(modelsPath).iterdir() if modelRoot.is_dir())
+    scans: List[ModelScan] = []
+    for modelRoot in modelRoots:
+        pnmlMtime = mtime_ns(modelRoot / "model.pnml")
+        changedCategories = dict()
+        for category in QUERY_CATEGORIES:
+            categoryMtime = mtime_ns(modelRoot / (category + ".xml"))
+            key = (modelRoot.name, category)
+            if (key not in knownQueryMtimes or knownQueryMtimes[key] != categoryMtime):
+                changedCategories[category] = categoryMtime
+        pnmlChanged = modelRoot.name not in knownPnmlMtimes or knownPnmlMtimes[modelRoot.name] != pnmlMtime
+        if (pnmlChanged or len(changedCategories) > 0):
+            scans.append(ModelScan(modelRoot, pnmlMtime, pnmlChanged, changedCategories))
+
+    if (jobs > 1 and len(scans) > 1):
+        with Pool(jobs) as pool:
+            parsed = pool.map(read_model, scans, chunksize=4)
+    else:
+        parsed = [read_model(scan) for scan in scans]
+
+    for scan, (stats, queries) in zip(scans, parsed):
+        model_name = scan.modelRoot.name
+        if (scan.readPnml):
+            places, transitions, colourSets = stats if stats is not None else (None, None, None)
+            con.execute("INSERT OR REPLACE INTO model (name, pnml_mtime_ns, places, transitions, colour_sets) VALUES (?, ?, ?, ?, ?)",
+                (model_name, scan.pnmlMtime, places, transitions, colourSets))
+        for category, categoryQueries in queries.items():
+            con.execute("DELETE FROM query WHERE model_name = ? AND category = ?", (model_name, category))
+            con.execute("INSERT OR REPLACE INTO query_file (model_name, category, mtime_ns, query_count) VALUES (?, ?, ?, ?)",
+                (model_name, category, scan.categoryMtimes[category], len(categoryQueries)))
+            # the position in the file is the index verifypn's -x selects
+            con.executemany("INSERT INTO query (model_name, category, query_index, query_id, query_type) VALUES (?, ?, ?, ?, ?)",
+                ((model_name, category, position + 1, query_id, query_type) for position, (_, query_id, query_type) in enumerate(categoryQueries)))
+
+    removed = set(knownPnmlMtimes.keys()) - set(modelRoot.name for modelRoot in modelRoots)
+    for model_name in removed:
+        con.execute("DELETE FROM query WHERE model_name = ?", (model_name,))
+        con.execute("DELETE FROM query_file WHERE model_name = ?", (model_name,))
+        con.execute("DELETE FROM model WHERE name = ?", (model_name,))
+    con.commit()
+    print(f"catalogue: {len(modelRoots)} models, {len(scans)} re-read, {len(removed)} removed")
+
+def load_catalogue(cataloguePath: str, modelsPath: str, jobs: int = 1) -> sqlite3.Connection:
+    con = sqlite3.connect(cataloguePath)
+    update_catalogue(con, modelsPath, jobs)
+    return con
+
+def get_models(con: sqlite3.Connection) -> List[str]:
+    return [name for (name,) in con.execute("SELECT name FROM model ORDER BY name")]
+
+def get_query_counts(con: sqlite3.Connection, model_name: str) -> Dict[str, int]:
+    return dict(con.execute("SELECT category, query_count FROM query_file WHERE model_name = ?", (model_name,)))
+
+def get_query_types(con: sqlite3.Connection) -> Dict[Tuple[str, str], List[Tuple[int, Optional[str]]]]:
+    """(model, category) -> [(index, query type)] in file order, the index being the one in the query id"""
+    queryTypes: Dict[Tuple[str, str], List[Tuple[int, Optional[str]]]] = dict()
+    for model_name, category, query_id, query_type in con.execute("SELECT model_name, category, query_id, query_type FROM query ORDER BY model_name, category, query_index"):
+        index = int(re.match(r".+\-([^-0-9]+)\-([0-9]+\-)?([0-9]+)$", query_id).group(3)) + 1
+        queryTypes.setdefault((model_name, category), []).append((index, query_type))
+    return queryTypes
+
+if __name__ == '__main__':
+    parser = ArgumentParser(prog="Builds or updates the catalogue of the models and queries of an MCC model directory")
+    parser.add_argument('-m', '--models', help="Path to directory containing the mcc models", default='/usr/local/share/mcc/')
+    parser.add_argument('--catalogue', help="Path to the catalogue", default='catalogue.db')
+    parser.add_argument('-j', '--jobs', help="Number of processes parsing model and query files", default=1, type=int)
+    args = parser.parse_args()
+    con = load_catalogue(args.catalogue, args.models, args.jobs)
+    modelCount, places, transitions, colourSets = con.execute("SELECT COUNT(*), SUM(places), SUM(transitions), SUM(colour_sets) FROM model").fetchone()
+    queryCount = con.execute("SELECT COUNT(*) FROM query").fetchone()[0]
+    print(f"{modelCount} models with {places} places, {transitions} transitions and {colourSets} colour sets, {queryCount} queries")
+    con.close()
@@ -4,9 +4,13 @@ from io import TextIOWrapper
 import sqlite3
 from typing import List
 
+from analysis_helper import applyTimeout
+from schema import require_schema
+
 
 parser = ArgumentParser(prog="Gets inconsistencies between the expected results from MCC and the experiment's result")
 parser.add_argument("experiment", help="Name of experiment in the format <name>-<strategy>")
+parser.add_argument("--timeout", help="Virtual timeout cut in seconds, slower results count as timeouts", type=float)
 args = parser.parse_args()
 EXPERIMENT = args.experiment
 
@@ -16,6 +20,8 @@ def getExperimentId(con: sqlite3.Connection, nameAndStrategy: str):
     return res.fetchone()[0]
 
 con = sqlite3.connect("data.db")
+require_schema(con)
+applyTimeout(con, args.timeout)
 
 experiment_id = getExperimentId(con, EXPERIMENT)
 
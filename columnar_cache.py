@@ -0,0 +1,148 @@
+#!/usr/bin/python3
+from argparse import ArgumentParser
+import json
+import os
+from pathlib import Path
+import shutil
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from analysis_helper import Experiment, getExperimentId
+from schema import STATUS_CODES, require_schema
+
+CACHE_VERSION = 1
+# status_code and result_code of query instances the experiment has no result for
+MISSING = -1
+FLOAT_COLUMNS = ["time", "max_memory", "states", "verification_time", "color_reduction_time"]
+CODE_COLUMNS = ["status_code", "result_code"]
+
+class ExperimentColumns:
+    """
+    The results of one experiment as arrays indexed by query_instance_id.
+    Query instances without a result have status and result MISSING and NaN
+    metrics, so the arrays of all experiments of a database are aligned.
+    """
+    def __init__(self, experimentId: int, arrays: Dict[str, np.ndarray]):
+        self.experimentId = experimentId
+        self.status: np.ndarray = arrays["status_code"]
+        self.result: np.ndarray = arrays["result_code"]
+        self.time: np.ndarray = arrays["time"]
+        self.maxMemory: np.ndarray = arrays["max_memory"]
+        self.states: np.ndarray = arrays["states"]
+        self.verificationTime: np.ndarray = arrays["verification_time"]
+        self.colorReductionTime: np.ndarray = arrays["color_reduction_time"]
+
+    def present(self) -> np.ndarray:
+        return self.status != MISSING
+
+    def answered(self) -> np.ndarray:
+        return self.status == STATUS_CODES["Answered"]
+
+    def withTimeout(self, timeout: Optional[float]) -> "ExperimentColumns":
+        """The columns as analysis_helper.applyTimeout shows them, without touching the cached arrays"""
+        if (timeout is None):
+            return self
+        cut = self.time > timeout
+        arrays = {"max_memory": self.maxMemory}
+        arrays["status_code"] = np.where(cut, STATUS_CODES["Timeout"], self.status).astype(np.int8)
+        arrays["result_code"] = np.where(cut, MISSING, self.result).astype(np.int8)
+        for column, values in [("time", self.time), ("states", self.states), ("verification_time", self.verificationTime), ("color_reduction_time", self.colorReductionTime)]:
+            arrays[column] = np.where(cut, np.nan, values)
+        return ExperimentColumns(self.experimentId, arrays)
+
+class ColumnarCache:
+    """
+    Memory mapped .npy files of every experiment's query_result, stored in
+    <database>.cache/<experiment id>/. An experiment is exported again when
+    its fingerprint, the count, largest id and total time of its results and
+    the number of query instances, no longer matches the cached one.
+    """
+    def __init__(self, con: sqlite3.Connection, databasePath: str = "data.db"):
+        self.con = con
+        self.directory = Path(databasePath + ".cache")
+
+    def fingerprint(self, experimentId: int) -> List:
+        count, maxId, totalTime = self.con.execute("SELECT COUNT(*), MAX(id), TOTAL(time) FROM main.query_result WHERE experiment_id = ?", (experimentId,)).fetchone()
+        instanceCount = self.con.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM query_instance").fetchone()[0]
+        return [CACHE_VERSION, count, maxId, totalTime, instanceCount]
+
+    def export(self, experimentId: int, fingerprint: List):
+        instanceCount = fingerprint[-1]
+        arrays = {column: np.full(instanceCount, MISSING, dtype=np.int8) for column in CODE_COLUMNS}
+        arrays.update({column: np.full(instanceCount, np.nan) for column in FLOAT_COLUMNS})
+        cur = self.con.execute(f"SELECT query_instance_id, {', '.join(CODE_COLUMNS + FLOAT_COLUMNS)} FROM main.query_result WHERE experiment_id = ?", (experimentId,))
+        while True:
+            rows = cur.fetchmany(100000)
+            if (len(rows) == 0):
+                break
+            columns = list(zip(*rows))
+            ids = np.array(columns[0], dtype=np.int64)
+            for column, values in zip(CODE_COLUMNS + FLOAT_COLUMNS, columns[1:]):
+                if (column in CODE_COLUMNS):
+                    arrays[column][ids] = [MISSING if value is None else value for value in values]
+                else:
+                    arrays[column][ids] = np.array(values, dtype=np.float64)
+        # written next to the old export and swapped in, readers never see a partial one
+        temporary = self.directory / f"{experimentId}.tmp"
+        shutil.rmtree(temporary, ignore_errors=True)
+        temporary.mkdir(parents=True)
+        for column, values in arrays.items():
+            np.save(temporary / f"{column}.npy", values)
+        with (temporary / "fingerprint.json").open("w") as f:
+            json.dump(fingerprint, f)
+        target = self.directory / str(experimentId)
+        shutil.rmtree(target, ignore_errors=True)
+        os.replace(temporary, target)
+
+    def load(self, experimentId: int) -> ExperimentColumns:
+        target = self.directory / str(experimentId)
+        fingerprint = self.fingerprint(experimentId)
+        try:
+            with (target / "fingerprint.json").open() as f:
+                upToDate = json.load(f) == fingerprint
+        except FileNotFoundError:
+            upToDate = False
+        if (not upToDate):
+            self.export(experimentId, fingerprint)
+        return ExperimentColumns(experimentId, {column: np.load(target / f"{column}.npy", mmap_mode="r") for column in CODE_COLUMNS + FLOAT_COLUMNS})
+
+    def loadMany(self, experimentIds: List[int], timeout: Optional[float] = None) -> List[ExperimentColumns]:
+        return [self.load(experimentId).withTimeout(timeout) for experimentId in experimentIds]
+
+    def prune(self):
+        """Deletes the exports of experiments that are no longer in the database"""
+        if (not self.directory.exists()):
+            return
+        experimentIds = set(str(id) for (id,) in self.con.execute("SELECT id FROM experiment"))
+        for exported in self.directory.iterdir():
+            if (exported.name not in experimentIds):
+                shutil.rmtree(exported)
+
+def loadExperiments(con: sqlite3.Connection, names: List[str], timeout: Optional[float]) -> Tuple[List[str], List[ExperimentColumns]]:
+    """The names and cached columns of the experiments in <name>-<strategy> format, of all experiments when none are given"""
+    if (len(names) > 0):
+        experimentIds = [getExperimentId(con, Experiment.fromFormat(name)) for name in names]
+    else:
+        rows = con.execute("SELECT id, name, search_strategy FROM experiment ORDER BY id").fetchall()
+        names = [f"{name}-{strategy}" for _, name, strategy in rows]
+        experimentIds = [id for id, _, _ in rows]
+    return names, ColumnarCache(con).loadMany(experimentIds, timeout)
+
+if __name__ == '__main__':
+    parser = ArgumentParser(prog="Builds the columnar cache of data.db and prints the solved queries of the experiments")
+    parser.add_argument("experiments", nargs='*', help="experiments in <name>-<strategy> format, all when none are given")
+    parser.add_argument("--timeout", help="Virtual timeout cut in seconds, slower results count as timeouts", type=float)
+    args = parser.parse_args()
+    con = sqlite3.connect("data.db")
+    require_schema(con)
+    cache = ColumnarCache(con)
+    cache.prune()
+    if (len(args.experiments) > 0):
+        experiments = [(experiment, getExperimentId(con, Experiment.fromFormat(experiment))) for experiment in args.experiments]
+    else:
+        experiments = [(f"{name}-{strategy}", id) for id, name, strategy in con.execute("SELECT id, name, search_strategy FROM experiment ORDER BY id")]
+    for (name, _), columns in zip(experiments, cache.loadMany([id for _, id in experiments], args.timeout)):
+        print(f"{name}: {np.count_nonzero(columns.answered())} answered of {np.count_nonzero(columns.present())}")
+    con.close()
@@ -1,192 +1,177 @@
 #!/usr/bin/python3
 from argparse import ArgumentParser
 from io import TextIOWrapper
+import os
 import sqlite3
-from typing import List
+from typing import Dict, List, Optional, Tuple
 
+from analysis_helper import applyTimeout
+from schema import STATUS_CODES, require_schema
 
-parser = ArgumentParser(prog="Generates comparison between two experiments based on data.db")
-parser.add_argument("experiment_a", help="Name of experiment in the format <name>-<strategy>")
-parser.add_argument("experiment_b", help="Name of experiment in the format <name>-<strategy>")
-args = parser.parse_args()
-EXPERIMENT_A = args.experiment_a
-EXPERIMENT_B = args.experiment_b
+ANSWERED = STATUS_CODES["Answered"]
+ERROR = STATUS_CODES["Error"]
+
+# (status_code, result, max_memory, states, verification_time) of every query instance of the baseline
+BaselineResult = Tuple[Optional[int], Optional[str], Optional[float], Optional[float], Optional[float]]
 
 def getExperimentId(con: sqlite3.Connection, nameAndStrategy: str):
     name, strategy = nameAndStrategy.split("-")
     res = con.execute("SELECT id FROM experiment WHERE name=? AND search_strategy=?", (name, strategy))
     return res.fetchone()[0]
 
-con = sqlite3.connect("data.db")
-
-aId = getExperimentId(con, EXPERIMENT_A)
-bId = getExperimentId(con, EXPERIMENT_B)
-
-
 def writeToCSV(file: TextIOWrapper, *args):
     file.write(",".join(map(lambda x: str(x), args)) + "\n")
 
-def createFileFromQuery(con: sqlite3.Connection, filename: str, headers: List[str], query: str, data: tuple):
-    res = con.execute(query, data)
-    inconsistenciesFile = open(filename, "w")
-    writeToCSV(inconsistenciesFile, *headers)
-    for inconsistency in res.fetchall():
-        writeToCSV(inconsistenciesFile, *inconsistency)
-    inconsistenciesFile.close()
-
-
-createFileFromQuery(con, "compared/inconsistencies.csv",
-    ["model name", "query name", "query index", f"{EXPERIMENT_A} result", f"{EXPERIMENT_B} result"], """
-    SELECT qi.model_name, qi.query_name, qi.query_index, l.result, r.result as b_result FROM query_result l
-        LEFT JOIN query_result r On r.query_instance_id = l.query_instance_id
-        LEFT JOIN query_instance qi ON qi.id == l.query_instance_id
-        WHERE l.experiment_id = ? and r.experiment_id = ? and l.result IS NOT NULL AND r.result IS NOT NULL AND l.result != r.result 
-""", (aId, bId))
-
-for experimentId, name in [(aId, "a"), (bId, "b")]:
-    createFileFromQuery(con, f"compared/errors_{name}.csv", 
-        ["Model name, Query name, Query index, Status, Max memory"],
-        """
-        SELECT qi.model_name, qi.query_name, qi.query_index, l.status, l.max_memory
-        FROM query_result l
-        LEFT JOIN query_instance qi ON qi.id == l.query_instance_id
-        WHERE l.experiment_id = ? AND lower(l.status) = "error"
+def openCSV(filename: str, headers: List[str]) -> TextIOWrapper:
+    file = open(filename, "w")
+    writeToCSV(file, *headers)
+    return file
+
+def iterResults(con: sqlite3.Connection, experimentId: int):
+    """The results of the experiment with their query instance, by query_instance_id"""
+    return con.execute("""
+        SELECT qr.query_instance_id, qi.model_name, qi.query_name, qi.query_index, qr.status, qr.result, qr.status_code, qr.max_memory, qr.states, qr.verification_time
+        FROM query_result qr
+        LEFT JOIN query_instance qi ON qi.id == qr.query_instance_id
+        WHERE qr.experiment_id = ?
+        ORDER BY qr.query_instance_id
     """, (experimentId,))
 
-for leftId, rightId, name in [(aId, bId, "a"), (bId, aId, "b")]:
-    createFileFromQuery(con, f"compared/uniques_{name}.csv",
-        ["model name", "query name", "query index"], """
-        SELECT 
-            qi.model_name, qi.query_name, qi.query_index
-        FROM query_result l
-        LEFT JOIN query_result r On r.query_instance_id = l.query_instance_id
-        LEFT JOIN query_instance qi ON qi.id == l.query_instance_id
-        WHERE l.experiment_id = ? and r.experiment_id = ? AND (
-            (l.status = "Answered" AND r.status != "Answered")
-        )
-    """, (leftId, rightId))
-
-createFileFromQuery(con, f"compared/memory_comparison.csv",
-    ["model name", "query name", "query index", "memory usage a", "memory usage b", "factor"], """
-    SELECT 
-        qi.model_name, qi.query_name, qi.query_index, l.max_memory, r.max_memory, round(l.max_memory / r.max_memory, 2)
-    FROM query_result l
-    LEFT JOIN query_result r On r.query_instance_id = l.query_instance_id
-    LEFT JOIN query_instance qi ON qi.id == l.query_instance_id
-    WHERE l.experiment_id = ? and r.experiment_id = ? AND (
-        (l.status = "Answered" AND r.status = "Answered")
-    )
-    ORDER BY abs(l.max_memory / r.max_memory) DESC
-""", (leftId, rightId))
-
-unique_cur = con.execute(
-        """
-        SELECT 
-            COUNT(*) FILTER (WHERE l.status == "Answered"),
-            COUNT(*) FILTER (WHERE r.status == "Answered")
-        FROM query_result l
-        LEFT JOIN query_result r On r.query_instance_id = l.query_instance_id
-        LEFT JOIN query_instance qi ON qi.id == l.query_instance_id
-        WHERE l.experiment_id = ? and r.experiment_id = ? AND (
-            (l.status = "Answered" AND r.status != "Answered") 
-            OR 
-            (l.status != "Answered" AND r.status = "Answered")
-        )
-    """, (aId, bId))
-
-unique_a, unique_b = unique_cur.fetchone()
-
-error_cur = con.execute(
-        """
-        SELECT 
-            COUNT(*) FILTER (WHERE lower(l.status) == "error"),
-            COUNT(*) FILTER (WHERE lower(r.status) == "error")
-        FROM query_result l
-        LEFT JOIN query_result r On r.query_instance_id = l.query_instance_id
-        LEFT JOIN query_instance qi ON qi.id == l.query_instance_id
-        WHERE l.experiment_id = ? and r.experiment_id = ?
-    """, (aId, bId))
-
-error_a, error_b = error_cur.fetchone()
-
-total_cur = con.execute(
-        """
-        SELECT 
-            COUNT(*) FILTER (WHERE lower(l.status) == "answered"),
-            COUNT(*) FILTER (WHERE lower(r.status) == "answered")
-        FROM query_result l
-        LEFT JOIN query_result r On r.query_instance_id = l.query_instance_id
-        LEFT JOIN query_instance qi ON qi.id == l.query_instance_id
-        WHERE l.experiment_id = ? and r.experiment_id = ?
-    """, (aId, bId))
-
-total_a, total_b = total_cur.fetchone()
-
-cardinality_cur = con.execute(
-        """
-        SELECT 
-            COUNT(*) FILTER (WHERE lower(l.status) = "answered"),
-            COUNT(*) FILTER (WHERE lower(r.status) = "answered")
-        FROM query_result l
-        LEFT JOIN query_result r On r.query_instance_id = l.query_instance_id
-        LEFT JOIN query_instance qi ON qi.id == l.query_instance_id
-        WHERE l.experiment_id = ? and r.experiment_id = ? AND qi.query_name = "ReachabilityCardinality"
-    """, (aId, bId))
-
-total_cardinality_a, total_cardinality_b = cardinality_cur.fetchone()
-
-fireability_cur = con.execute(
-        """
-        SELECT 
-            COUNT(*) FILTER (WHERE lower(l.status) = "answered"),
-            COUNT(*) FILTER (WHERE lower(r.status) = "answered")
-        FROM query_result l
-        LEFT JOIN query_result r On r.query_instance_id = l.query_instance_id
-        LEFT JOIN query_instance qi ON qi.id == l.query_instance_id
-        WHERE l.experiment_id = ? and r.experiment_id = ? AND qi.query_name = "ReachabilityFireability"
-    """, (aId, bId))
-
-total_fireability_a, total_fireability_b = fireability_cur.fetchone()
-
-throughput_cur = con.execute(
-        """
-        SELECT 
-            AVG(l.states/l.verification_time) FILTER (WHERE lower(l.status) == "answered" AND l.states > 4 and l.verification_time > 0),
-            AVG(r.states/r.verification_time) FILTER (WHERE lower(r.status) == "answered" AND r.states > 4 and r.verification_time > 0)
-        FROM query_result l
-        LEFT JOIN query_result r On r.query_instance_id = l.query_instance_id
-        LEFT JOIN query_instance qi ON qi.id == l.query_instance_id
-        WHERE l.experiment_id = ? and r.experiment_id = ?
-    """, (aId, bId))
-
-throughput_a, throughput_b = throughput_cur.fetchone()
-
-memory_usage_cur = con.execute(
-        """
-        SELECT 
-            SUM(l.max_memory)/SUM(r.max_memory)
-        FROM query_result l
-        LEFT JOIN query_result r On r.query_instance_id = l.query_instance_id
-        WHERE l.experiment_id = ? and r.experiment_id = ? and lower(l.status) == "answered" AND lower(r.status) == 'answered'
-    """, (aId, bId))
-
-memory_usage_ratio, = memory_usage_cur.fetchone()
-
-resultsFile = open("compared/results.txt", "w")
-
-resultsFile.write(f"total for {EXPERIMENT_A}: {total_a}\n")
-resultsFile.write(f"cardinality for {EXPERIMENT_A}: {total_cardinality_a}\n")
-resultsFile.write(f"fireablity for {EXPERIMENT_A}: {total_fireability_a}\n")
-resultsFile.write(f"unique for {EXPERIMENT_A}: {unique_a}\n")
-resultsFile.write(f"error for {EXPERIMENT_A}: {error_a}\n")
-resultsFile.write(f"throughput for {EXPERIMENT_A}: {throughput_a}\n")
-resultsFile.write(f"\n")
-resultsFile.write(f"memory usage ratio ({EXPERIMENT_A}/{EXPERIMENT_B}): {round(memory_usage_ratio * 100, 2)}%\n")
-resultsFile.write(f"\n")
-resultsFile.write(f"total for {EXPERIMENT_B}: {total_b}\n")
-resultsFile.write(f"cardinality for {EXPERIMENT_B}: {total_cardinality_b}\n")
-resultsFile.write(f"fireablity for {EXPERIMENT_B}: {total_fireability_b}\n")
-resultsFile.write(f"unique for {EXPERIMENT_B}: {unique_b}\n")
-resultsFile.write(f"error for {EXPERIMENT_B}: {error_b}\n")
-resultsFile.write(f"throughput for {EXPERIMENT_B}: {throughput_b}\n")
-resultsFile.close()
\ No newline at end of file
+def loadBaseline(con: sqlite3.Connection, experimentId: int) -> Tuple[Dict[int, BaselineResult], List[tuple]]:
+    """The results of the baseline by query instance and its error rows, shared by the comparisons with every candidate"""
+    results: Dict[int, BaselineResult] = {}
+    errors: List[tuple] = []
+    for queryInstanceId, modelName, queryName, queryIndex, status, result, statusCode, maxMemory, states, verificationTime in iterResults(con, experimentId):
+        results[queryInstanceId] = (statusCode, result, maxMemory, states, verificationTime)
+        if (statusCode == ERROR):
+            errors.append((modelName, queryName, queryIndex, status, maxMemory))
+    return results, errors
+
+def sqlRound(con: sqlite3.Connection, value: Optional[float]) -> Optional[float]:
+    """round(value, 2) as sqlite rounds, which rounds halves up where Python rounds the binary value"""
+    return con.execute("SELECT round(?, 2)", (value,)).fetchone()[0]
+
+def throughput(states: Optional[float], verificationTime: Optional[float]) -> Optional[float]:
+    if (states is None or verificationTime is None or not (states > 4 and verificationTime > 0)):
+        return None
+    return states / verificationTime
+
+def average(values: List[float]) -> Optional[float]:
+    return sum(values) / len(values) if len(values) > 0 else None
+
+def ratio(numerator: Optional[float], denominator: Optional[float]) -> Optional[float]:
+    """numerator / denominator with sqlite's NULL propagation and NULL on division by zero"""
+    if (numerator is None or denominator is None or denominator == 0):
+        return None
+    return numerator / denominator
+
+class PairCounts:
+    """The counts of one experiment over the query instances both experiments have a result for"""
+    def __init__(self):
+        self.total = 0
+        self.cardinality = 0
+        self.fireability = 0
+        self.unique = 0
+        self.error = 0
+        self.throughputs: List[float] = []
+
+    def add(self, queryName: Optional[str], statusCode: Optional[int], otherStatusCode: Optional[int], states: Optional[float], verificationTime: Optional[float]):
+        if (statusCode == ANSWERED):
+            self.total += 1
+            if (queryName == "ReachabilityCardinality"):
+                self.cardinality += 1
+            elif (queryName == "ReachabilityFireability"):
+                self.fireability += 1
+            if (otherStatusCode is not None and otherStatusCode != ANSWERED):
+                self.unique += 1
+            resultThroughput = throughput(states, verificationTime)
+            if (resultThroughput is not None):
+                self.throughputs.append(resultThroughput)
+        elif (statusCode == ERROR):
+            self.error += 1
+
+    def write(self, file: TextIOWrapper, name: str):
+        file.write(f"total for {name}: {self.total}\n")
+        file.write(f"cardinality for {name}: {self.cardinality}\n")
+        file.write(f"fireablity for {name}: {self.fireability}\n")
+        file.write(f"unique for {name}: {self.unique}\n")
+        file.write(f"error for {name}: {self.error}\n")
+        file.write(f"throughput for {name}: {average(self.throughputs)}\n")
+
+def compare(con: sqlite3.Connection, baseline: Dict[int, BaselineResult], baselineErrors: List[tuple], baselineName: str, candidateId: int, candidateName: str, outDir: str):
+    """
+    Writes the comparison of the baseline (a) with the candidate (b) to outDir
+    in one pass over the candidate's results. Like the self-joins it replaces,
+    everything but the error files only covers the query instances both
+    experiments have a result for.
+    """
+    inconsistencies = openCSV(os.path.join(outDir, "inconsistencies.csv"), ["model name", "query name", "query index", f"{baselineName} result", f"{candidateName} result"])
+    errorFiles = {name: openCSV(os.path.join(outDir, f"errors_{name}.csv"), ["Model name, Query name, Query index, Status, Max memory"]) for name in ["a", "b"]}
+    uniqueFiles = {name: openCSV(os.path.join(outDir, f"uniques_{name}.csv"), ["model name", "query name", "query index"]) for name in ["a", "b"]}
+    for error in baselineErrors:
+        writeToCSV(errorFiles["a"], *error)
+    countsA = PairCounts()
+    countsB = PairCounts()
+    # (memory of b, memory of a, b / a) of the query instances both answered
+    memoryRows: List[tuple] = []
+    memoryA = []
+    memoryB = []
+    for queryInstanceId, modelName, queryName, queryIndex, status, result, statusCode, maxMemory, states, verificationTime in iterResults(con, candidateId):
+        if (statusCode == ERROR):
+            writeToCSV(errorFiles["b"], modelName, queryName, queryIndex, status, maxMemory)
+        if (queryInstanceId not in baseline):
+            continue
+        baselineStatusCode, baselineResult, baselineMaxMemory, baselineStates, baselineVerificationTime = baseline[queryInstanceId]
+        countsA.add(queryName, baselineStatusCode, statusCode, baselineStates, baselineVerificationTime)
+        countsB.add(queryName, statusCode, baselineStatusCode, states, verificationTime)
+        if (baselineResult is not None and result is not None and baselineResult != result):
+            writeToCSV(inconsistencies, modelName, queryName, queryIndex, baselineResult, result)
+        if (baselineStatusCode == ANSWERED and statusCode is not None and statusCode != ANSWERED):
+            writeToCSV(uniqueFiles["a"], modelName, queryName, queryIndex)
+        if (statusCode == ANSWERED and baselineStatusCode is not None and baselineStatusCode != ANSWERED):
+            writeToCSV(uniqueFiles["b"], modelName, queryName, queryIndex)
+        if (baselineStatusCode == ANSWERED and statusCode == ANSWERED):
+            memoryRows.append((modelName, queryName, queryIndex, maxMemory, baselineMaxMemory, ratio(maxMemory, baselineMaxMemory)))
+            memoryA.append(baselineMaxMemory)
+            memoryB.append(maxMemory)
+    for file in [inconsistencies, *errorFiles.values(), *uniqueFiles.values()]:
+        file.close()
+
+    # largest factor first, the ones without a factor last
+    memoryRows.sort(key=lambda row: (row[5] is None, -abs(row[5]) if row[5] is not None else 0))
+    memoryFile = openCSV(os.path.join(outDir, "memory_comparison.csv"), ["model name", "query name", "query index", "memory usage a", "memory usage b", "factor"])
+    for *row, factor in memoryRows:
+        writeToCSV(memoryFile, *row, sqlRound(con, factor))
+    memoryFile.close()
+
+    memoryA = [memory for memory in memoryA if memory is not None]
+    memoryB = [memory for memory in memoryB if memory is not None]
+    memoryUsageRatio = ratio(sum(memoryA) if len(memoryA) > 0 else None, sum(memoryB) if len(memoryB) > 0 else None)
+
+    # without a query both answered there is nothing to compare the memory usage on
+    memoryUsage = f"{round(memoryUsageRatio * 100, 2)}%" if memoryUsageRatio is not None else "n/a"
+    resultsFile = open(os.path.join(outDir, "results.txt"), "w")
+    countsA.write(resultsFile, baselineName)
+    resultsFile.write(f"\n")
+    resultsFile.write(f"memory usage ratio ({baselineName}/{candidateName}): {memoryUsage}\n")
+    resultsFile.write(f"\n")
+    countsB.write(resultsFile, candidateName)
+    resultsFile.close()
+
+if __name__ == '__main__':
+    parser = ArgumentParser(prog="Generates comparison between two experiments based on data.db")
+    parser.add_argument("experiment_a", help="Name of experiment in the format <name>-<strategy>")
+    parser.add_argument("experiment_b", nargs='+', help="Name of experiment in the format <name>-<strategy>, with several each is compared with experiment_a in compared/<name>-<strategy>/")
+    parser.add_argument("--timeout", help="Virtual timeout cut in seconds, slower results count as timeouts", type=float)
+    args = parser.parse_args()
+
+    con = sqlite3.connect("data.db")
+    require_schema(con)
+    applyTimeout(con, args.timeout)
+
+    baseline, baselineErrors = loadBaseline(con, getExperimentId(con, args.experiment_a))
+    for candidate in args.experiment_b:
+        outDir = "compared" if len(args.experiment_b) == 1 else os.path.join("compared", candidate)
+        os.makedirs(outDir, exist_ok=True)
+        compare(con, baseline, baselineErrors, args.experiment_a, getExperimentId(con, candidate), candidate, outDir)
+    con.close()
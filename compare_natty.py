@@ -1,9 +1,17 @@
 #!/usr/bin/python3
+from argparse import ArgumentParser
 from itertools import islice
 import sqlite3
-from analysis_helper import Experiment, getExperimentId
+from analysis_helper import Experiment, applyTimeout, getExperimentId
+from schema import RESULT_CODES, STATUS_CODES, require_schema
+
+parser = ArgumentParser(prog="Compares the natty experiments with the main experiment")
+parser.add_argument("--timeout", help="Virtual timeout cut in seconds, slower results count as timeouts", type=float)
+args = parser.parse_args()
 
 con = sqlite3.connect("data.db")
+require_schema(con)
+applyTimeout(con, args.timeout)
 
 prettyNames = {
     "bCFP": "CFP ",
@@ -35,11 +43,11 @@ def main():
     cur = con.execute(f"""
         SELECT
             e.name,
-            COUNT(*) FILTER (WHERE qr.status = "Answered") AS total_answered,
-            COUNT(*) FILTER (WHERE (qi.query_type = "ef" AND qr.result = "Satisfied") OR (qi.query_type = "ag" AND qr.result = "Unsatisfied")) AS positive_answers,
-            COUNT(*) FILTER (WHERE (qi.query_type = "ag" AND qr.result = "Satisfied") OR (qi.query_type = "ef" AND qr.result = "Unsatisfied")) AS negative_answers,
-            COUNT(*) FILTER (WHERE qr.status = "Answered" AND nattyQr.status != "Answered") AS natty_unique_answers,
-            COUNT(*) FILTER (WHERE qr.status = "Answered" AND mainQr.status != "Answered") AS main_unique_answers
+            COUNT(*) FILTER (WHERE qr.status_code = {STATUS_CODES['Answered']}) AS total_answered,
+            COUNT(*) FILTER (WHERE (qi.query_type = "ef" AND qr.result_code = {RESULT_CODES['Satisfied']}) OR (qi.query_type = "ag" AND qr.result_code = {RESULT_CODES['Unsatisfied']})) AS positive_answers,
+            COUNT(*) FILTER (WHERE (qi.query_type = "ag" AND qr.result_code = {RESULT_CODES['Satisfied']}) OR (qi.query_type = "ef" AND qr.result_code = {RESULT_CODES['Unsatisfied']})) AS negative_answers,
+            COUNT(*) FILTER (WHERE qr.status_code = {STATUS_CODES['Answered']} AND nattyQr.status_code != {STATUS_CODES['Answered']}) AS natty_unique_answers,
+            COUNT(*) FILTER (WHERE qr.status_code = {STATUS_CODES['Answered']} AND mainQr.status_code != {STATUS_CODES['Answered']}) AS main_unique_answers
         FROM query_result qr
             LEFT JOIN query_result nattyQr ON nattyQr.query_instance_id = qr.query_instance_id AND nattyQr.experiment_id = {nattyId}
             LEFT JOIN query_result mainQr ON mainQr.query_instance_id = qr.query_instance_id AND mainQr.experiment_id = {mainId}
@@ -1,12 +1,22 @@
 #!/usr/bin/python3
 from argparse import ArgumentParser
+import math
 import os
 from pathlib import Path
+import sqlite3
 import subprocess
 import sys
 from time import sleep
 from typing import List
 
+from analysis_helper import Experiment, getExperimentId
+from catalogue import get_models, get_query_counts, load_catalogue
+from job_packing import PackedJob, PlannedQuery, pack_queries, write_query_list
+from resume import completed_queries
+from runtime_predictor import RuntimePredictor, configuration_name, load_model_sizes, load_observations
+from schema import require_schema
+from slurm_array import DEFAULT_MAX_ARRAY_SIZE, DEFAULT_THROTTLE, DEFAULT_TIME_BUCKET, bucket_time_limits, submit_array
+
 parser = ArgumentParser(prog="CPN slurm big job starter")
 parser.add_argument('-m', '--models', help="Path to directory containing the mcc models", default='/nfs/petrinet/mcc/2024/colour/')
 parser.add_argument('-s', '--sbatch-script', help="Path to the sbatch script that is started", default='./big_job_script.sh')
@@ -21,6 +31,17 @@ parser.add_argument('-d', '--deadlock-query', help='path to the global deadlock
 parser.add_argument('-v', '--verifypn-path', help='path to the verifypn binary', default='/nfs/home/student.aau.dk/jhajri20/verifypn-linux64')
 parser.add_argument('-t', '--timeout', help="The timeout for each query", type=int, default=5)
 parser.add_argument("-c", "--categories", help="comma seperated list of jobs", default="ReachabilityCardinality,ReachabilityFireability,ReachabilityDeadlock")
+parser.add_argument('--catalogue', help="Path to the model and query catalogue, updated from --models before the jobs are created", default='catalogue.db')
+parser.add_argument('--array', help="Submit the jobs as slurm job arrays, one per time limit, reading their tasks from a manifest in the output folder", action='store_true')
+parser.add_argument('--throttle', help="The maximum number of tasks of one job array running at once", default=DEFAULT_THROTTLE, type=int)
+parser.add_argument('--max-array-size', help="The maximum number of tasks in one job array, larger arrays are split", default=DEFAULT_MAX_ARRAY_SIZE, type=int)
+parser.add_argument('--time-bucket', help="With --array, time limits are rounded up to multiples of this many minutes and every distinct limit is submitted as an array of its own", default=DEFAULT_TIME_BUCKET, type=int)
+parser.add_argument('-p', '--parallel', help="Number of queries a job runs at once, the job gets the 2 CPUs and 16G of big_job_script.sh for each, so every query keeps the 15G memory limit of a job running one at a time", type=int, default=1)
+parser.add_argument('--resume', help="Only run the queries without a complete result in the output folder, once its jobs have finished", action='store_true')
+parser.add_argument('--history', help="Path to a data.db of previous experiments, packs the queries into jobs of --target-duration by their runtimes as runtime_predictor.py predicts them from it: the median of the same query, else of its model, a fit over its model family or net size, the median of its category, and only when nothing is known the timeout")
+parser.add_argument('--history-experiments', help="comma seperated list of the experiments in --history to take runtimes from in <name>-<strategy> format, all experiments when not given")
+parser.add_argument('--target-duration', help="The predicted duration of packed jobs in minutes", type=float, default=60)
+parser.add_argument('--time-margin', help="The fraction added to the predicted duration of a packed job for its time limit", type=float, default=0.25)
 only_args = sys.argv[1:]
 EXTRA_ARGS = []
 try:
@@ -46,6 +67,19 @@ DEADLOCK_QUERY = args.deadlock_query
 VERIFYPN_PATH = args.verifypn_path
 TIMEOUT = args.timeout
 CATEGORIES = set(args.categories.split(","))
+CATALOGUE_PATH = args.catalogue
+USE_ARRAY = args.array
+THROTTLE = args.throttle
+MAX_ARRAY_SIZE = args.max_array_size
+TIME_BUCKET = args.time_bucket
+PARALLEL = args.parallel
+RESUME = args.resume
+HISTORY_PATH = args.history
+HISTORY_EXPERIMENTS = args.history_experiments.split(",") if args.history_experiments is not None else None
+TARGET_DURATION = args.target_duration
+TIME_MARGIN = args.time_margin
+# the --mem of big_job_script.sh, a job running queries in parallel gets it for each
+QUERY_MEMORY_GB = 16
 print(CATEGORIES)
 
 def validate_scg(scg: str):
@@ -100,18 +134,27 @@ class Model:
     def name(self):
         return self.modelRoot.name
 
-def createEnv(model: Model):
-    my_env = os.environ.copy()
+def modelTask(model: Model) -> dict[str,str]:
     categoriesList: List[str] = []
     for queryFile in model.queryFiles:
         categoriesList.append(f'{queryFile.queryCount}:{queryFile.categoryName}:{1 if queryFile.isLTL else 0}:{queryFile.queryPath}')
-    my_env["CATEGORIES"] = " ".join(categoriesList)
-    my_env["MODEL_NAME"] = model.modelRoot.name
-    my_env["MODEL_FILE_PATH"] = model.modelPath
+    return {
+        "CATEGORIES": " ".join(categoriesList),
+        "MODEL_NAME": model.modelRoot.name,
+        "MODEL_FILE_PATH": str(model.modelPath),
+    }
+
+def createEnv(model: Model = None):
+    """The environment of the job of the model, of every array task when it is None"""
+    my_env = os.environ.copy()
+    if (model is not None):
+        my_env.update(modelTask(model))
     my_env["VERIFYPN_PATH"] = VERIFYPN_PATH
     my_env["SEARCH_STRATEGY"] = STRATEGY or "default"
     my_env["SUCCESSOR_GENERATOR"] = COLORED_SUCCESSOR_GENERATOR or "default"
     my_env["PER_QUERY_TIMEOUT"] = str(TIMEOUT * 60)
+    my_env["JOB_RUNNER"] = str(Path(__file__).parent.absolute() / "job_runner.py")
+    my_env["RUNNER_JOBS"] = str(PARALLEL)
     reachabilityOptions = []
     reachabilityOptions.append("-n")
     reachabilityOptions.append("1")
@@ -130,18 +173,24 @@ def createEnv(model: Model):
     my_env["LTL_OPTIONS"] = " ".join(ltlOptions)
     return my_env
 
-def scheduleJob(model: Model):
-    env = createEnv(model)
+def resourceArgs() -> List[str]:
+    # parallel queries get the 2 CPUs and the memory of big_job_script.sh each, job_runner.py splits the memory between them
+    if (PARALLEL > 1):
+        return ["--cpus-per-task", str(2 * PARALLEL), "--mem", f"{QUERY_MEMORY_GB * PARALLEL}G"]
+    return []
+
+def submitJob(jobName: str, env: dict[str,str], timeLimit: int):
     args = [
         "sbatch",
         "--job-name",
-        f'{model.modelRoot.name}_{OUT_NAME}',
+        jobName,
         "--output",
-        str(OUTPUT_PATH / f"{model.modelRoot.name}_{OUT_NAME}-%j.out"),
+        str(OUTPUT_PATH / f"{jobName}-%j.out"),
         "--error",
-        str(OUTPUT_PATH / f"{model.modelRoot.name}_{OUT_NAME}-%j.err"),
+        str(OUTPUT_PATH / f"{jobName}-%j.err"),
         "--time",
-        str(model.timeout + 10),
+        str(timeLimit),
+        *resourceArgs(),
         SBATCH_SCRIPT
     ]
 
@@ -150,6 +199,54 @@ def scheduleJob(model: Model):
     else:
         print(args)
 
+def scheduleJob(model: Model):
+    submitJob(f'{model.modelRoot.name}_{OUT_NAME}', createEnv(model), model.timeout + 10)
+
+def schedulePackedJob(index: int, queryListPath: Path, timeLimit: int):
+    env = createEnv()
+    env["QUERY_LIST"] = str(queryListPath.absolute())
+    submitJob(f'{OUT_NAME}_{index}', env, timeLimit)
+
+def scheduleArray(tasks: List[dict[str,str]], timeLimits: List[int]):
+    # the tasks of an array share its time limit, they are submitted as an array per limit
+    submit_array(OUTPUT_PATH / "tasks", tasks, SBATCH_SCRIPT, OUT_NAME, OUTPUT_PATH, resourceArgs(), createEnv(), THROTTLE, MAX_ARRAY_SIZE, GO, timeLimits)
+
+def plannedQueries(models: List[Model]) -> List[PlannedQuery]:
+    queries: List[PlannedQuery] = []
+    for model in models:
+        for queryFile in model.queryFiles:
+            for queryIndex in range(1, queryFile.queryCount + 1):
+                queries.append(PlannedQuery(model.name(), model.modelPath, queryFile.categoryName, queryFile.isLTL, queryFile.queryPath, queryIndex))
+    return queries
+
+def packQueries(queries: List[PlannedQuery], catalogue: sqlite3.Connection) -> List[PackedJob]:
+    """Packs the queries into jobs of the target duration by their runtimes predicted from the history"""
+    timeout = TIMEOUT * 60
+    con = sqlite3.connect(HISTORY_PATH)
+    require_schema(con, HISTORY_PATH)
+    experimentIds = None
+    if (HISTORY_EXPERIMENTS is not None):
+        experimentIds = [getExperimentId(con, Experiment.fromFormat(experiment)) for experiment in HISTORY_EXPERIMENTS]
+    predictor = RuntimePredictor(load_observations(con, timeout, experimentIds), timeout, load_model_sizes(catalogue))
+    con.close()
+    configuration = configuration_name(COLORED_SUCCESSOR_GENERATOR, STRATEGY)
+    predictions: List[float] = []
+    sources: dict[str,int] = {}
+    for query in queries:
+        prediction = predictor.predict(query.modelName, query.categoryName, query.queryIndex, configuration)
+        predictions.append(prediction.time)
+        sources[prediction.source] = sources.get(prediction.source, 0) + 1
+    print(f"Runtimes of {configuration} predicted by {', '.join(f'{source}: {count}' for source, count in sources.items())}")
+    # a job runs parallel queries at once, so it has that many times the target duration of CPU time
+    return pack_queries(queries, predictions, TARGET_DURATION * 60 * PARALLEL)
+
+def modelJobs(queries: List[PlannedQuery]) -> List[PackedJob]:
+    """A job per model, with the worst case time of its queries as the jobs of the models have"""
+    jobs: dict[str,PackedJob] = {}
+    for query in queries:
+        jobs.setdefault(query.modelName, PackedJob()).add(query, TIMEOUT * 60)
+    return list(jobs.values())
+
 
 def main():
     validate_scg(COLORED_SUCCESSOR_GENERATOR)
@@ -160,20 +257,23 @@ def main():
 
     print("finding models")
     totalQueries = 0
-    for modelRoot in Path(MODELS_PATH).iterdir():
+    catalogue = load_catalogue(CATALOGUE_PATH, MODELS_PATH)
+    for model_name in get_models(catalogue):
+        modelRoot = Path(MODELS_PATH) / model_name
         modelPnml = modelRoot / "model.pnml"
         localQueries = 0
-        queryFiles = list(filter(lambda x: x.categoryName in CATEGORIES, [
-            QueryFile("ReachabilityCardinality", modelRoot / 'ReachabilityCardinality.xml', 16, False),
-            QueryFile("ReachabilityFireability", modelRoot / "ReachabilityFireability.xml", 16, False),
-            QueryFile("LTLCardinality", modelRoot / "LTLCardinality.xml", 16, True),
-            QueryFile("LTLFireability", modelRoot / "LTLFireability.xml", 16, True),
+        queryCounts = get_query_counts(catalogue, model_name)
+        queryFiles = list(filter(lambda x: x.categoryName in CATEGORIES and x.queryCount > 0, [
+            QueryFile("ReachabilityCardinality", modelRoot / 'ReachabilityCardinality.xml', queryCounts.get("ReachabilityCardinality", 0), False),
+            QueryFile("ReachabilityFireability", modelRoot / "ReachabilityFireability.xml", queryCounts.get("ReachabilityFireability", 0), False),
+            QueryFile("LTLCardinality", modelRoot / "LTLCardinality.xml", queryCounts.get("LTLCardinality", 0), True),
+            QueryFile("LTLFireability", modelRoot / "LTLFireability.xml", queryCounts.get("LTLFireability", 0), True),
             QueryFile("ReachabilityDeadlock", Path(DEADLOCK_QUERY), 1, False)
         ]))
         for query in queryFiles:
             totalQueries += query.queryCount
             localQueries += query.queryCount
-        models.append(Model(modelRoot, modelPnml, queryFiles, localQueries * TIMEOUT))
+        models.append(Model(modelRoot, modelPnml, queryFiles, math.ceil(localQueries / PARALLEL) * TIMEOUT))
     
     print(f"Found {models.__len__()} models")
     print(f"Total number of queries: {totalQueries} needs maximum {totalQueries * TIMEOUT} CPU minutes")
@@ -182,9 +282,54 @@ def main():
     with (OUTPUT_PATH / "large").open("w") as f:
         pass
 
+    # packed and resumed jobs run query lists
+    useQueryLists = HISTORY_PATH is not None or RESUME
+    if (useQueryLists):
+        queries = plannedQueries(models)
+        if (RESUME):
+            completed = completed_queries(OUTPUT_PATH, True)
+            queries = [query for query in queries if query.key() not in completed]
+            print(f"{len(completed)} queries already completed, resuming {len(queries)} queries")
+        if (HISTORY_PATH is not None):
+            jobs = packQueries(queries, catalogue)
+            timeLimits = [job.timeLimit(TIME_MARGIN, PARALLEL) for job in jobs]
+            if (len(jobs) > 0):
+                print(f"Packed into {len(jobs)} jobs, the longest is predicted to take {max(job.predicted for job in jobs) / 60:.1f} minutes, {sum(job.predicted for job in jobs) / 60:.0f} CPU minutes in total")
+        else:
+            jobs = modelJobs(queries)
+            timeLimits = [job.timeLimit(0, PARALLEL) for job in jobs]
+        if (len(jobs) == 0):
+            print("Nothing to run")
+            return
+        queryListPaths = [OUTPUT_PATH / "queries" / f"{OUT_NAME}_{index}.queries" for index in range(len(jobs))]
+        if (GO):
+            (OUTPUT_PATH / "queries").mkdir(exist_ok=True)
+            for queryListPath, job in zip(queryListPaths, jobs):
+                write_query_list(queryListPath, job)
+        else:
+            print(f"FAKE WRITE {len(jobs)} query lists to {OUTPUT_PATH / 'queries'}")
+    else:
+        timeLimits = [model.timeout + 10 for model in models]
+    if (USE_ARRAY):
+        # every distinct time limit is an array of its own
+        print(f"{sum(timeLimits)} minutes of time limits, rounded up to multiples of {TIME_BUCKET} minutes for {len(set(bucket_time_limits(timeLimits, TIME_BUCKET)))} arrays")
+        timeLimits = bucket_time_limits(timeLimits, TIME_BUCKET)
+    print(f"Reserving {sum(timeLimits)} minutes instead of {sum(model.timeout + 10 for model in models)}")
+
     print("press enter to start")
     input()
 
+    if (useQueryLists):
+        if (USE_ARRAY):
+            scheduleArray([{"QUERY_LIST": str(queryListPath.absolute())} for queryListPath in queryListPaths], timeLimits)
+            return
+        for index, (queryListPath, timeLimit) in enumerate(zip(queryListPaths, timeLimits)):
+            schedulePackedJob(index, queryListPath, timeLimit)
+            sleep(WAIT_TIME)
+        return
+    if (USE_ARRAY):
+        scheduleArray([modelTask(model) for model in models], timeLimits)
+        return
     for model in models:
         scheduleJob(model)
         sleep(WAIT_TIME)
@@ -1,68 +1,79 @@
 #!/usr/bin/python3
 from argparse import ArgumentParser
 from io import TextIOWrapper
-from itertools import chain
-from os import mkdir
+import os
 import sqlite3
-import sys
-from typing import List
-
-from analysis_helper import Experiment, getExperimentId
+from typing import List, Optional
 
+import numpy as np
 
-parser = ArgumentParser(prog="Generates cactus graphs for all given experiments")
-parser.add_argument("time_lower_threshold", type=float)
-parser.add_argument("experiments", nargs='+', help="all experiments included in the matrix in <name>-<strategy> format")
-args = parser.parse_args()
+from analysis_helper import Experiment, getExperimentId
+from columnar_cache import ColumnarCache, ExperimentColumns
+from schema import require_schema
 
-con = sqlite3.connect("data.db")
 
-allExperimentIds = [getExperimentId(con, Experiment.fromFormat(experimentFormat)) for experimentFormat in args.experiments]
-allExperiments: List[Experiment] = [Experiment.fromFormat(experimentFormat) for experimentFormat in args.experiments]
+class EasyInstances:
+    """
+    The query instances every given experiment with a result for them finished
+    below a threshold, the ones the cactus plots skip. The slowest time of
+    every query instance is computed once, the easy set of a threshold is then
+    one comparison.
+    """
+    def __init__(self, experiments: List[ExperimentColumns]):
+        anyPresent = np.zeros(len(experiments[0].status), dtype=bool)
+        allTimed = np.ones(len(experiments[0].status), dtype=bool)
+        self.maxTime = np.full(len(experiments[0].status), -np.inf)
+        for columns in experiments:
+            present = columns.present()
+            anyPresent |= present
+            allTimed &= ~present | ~np.isnan(columns.time)
+            self.maxTime = np.where(present, np.fmax(self.maxTime, columns.time), self.maxTime)
+        self.candidates = anyPresent & allTimed
 
-def getSkipCount(con: sqlite3.Connection, all_experiments: List[int], time_lower_threshold: float):
-    cur = con.execute(f"""
-        SELECT COUNT(*) FROM (
-        SELECT 
-            iqi.id
-        FROM query_result iqr
-            LEFT JOIN query_instance iqi ON iqi.id = iqr.query_instance_id
-        WHERE iqr.experiment_id IN ({("?," * len(all_experiments))[:-1]})
-        GROUP BY iqr.query_instance_id
-        HAVING MAX(iqr.time) < ? AND COUNT(iqr.time) = COUNT(*))
-    """, (*all_experiments, time_lower_threshold))
-    return cur.fetchone()[0]
+    def mask(self, threshold: float) -> np.ndarray:
+        return self.candidates & (self.maxTime < threshold)
 
-skipCount = getSkipCount(con, allExperimentIds, args.time_lower_threshold)
+class CactusCurve:
+    """The answered query instances of an experiment ordered by time, sorted once for all thresholds"""
+    def __init__(self, columns: ExperimentColumns):
+        answered = np.flatnonzero(columns.answered())
+        times = columns.time[answered]
+        # sqlite orders results without a time first
+        order = np.lexsort((times, ~np.isnan(times)))
+        self.queryInstanceIds = answered[order]
+        self.times = times[order]
 
-def getTimes(con: sqlite3.Connection, experiment: int, all_experiments: List[int], time_lower_threshold: float):
-    cur = con.execute(f"""
-        SELECT qr.time FROM query_result qr
-        WHERE qr.experiment_id = ? AND qr.status = "Answered" 
-            AND qr.query_instance_id NOT IN (
-            SELECT 
-                iqi.id
-                FROM query_result iqr
-                LEFT JOIN query_instance iqi ON iqi.id = iqr.query_instance_id
-                WHERE iqr.experiment_id IN ({("?," * len(all_experiments))[:-1]})
-                GROUP BY iqr.query_instance_id
-                HAVING MAX(iqr.time) < ? AND COUNT(iqr.time) = COUNT(*)
-            )
-            ORDER BY qr.time
-    """, (experiment, *all_experiments, time_lower_threshold))
-    return [(skipCount + i, time[0]) for i, time in enumerate(cur.fetchall())]
+    def points(self, easy: np.ndarray) -> List[tuple[int, Optional[float]]]:
+        times = self.times[~easy[self.queryInstanceIds]]
+        skipCount = int(np.count_nonzero(easy))
+        return [(skipCount + i, None if np.isnan(time) else time) for i, time in enumerate(times.tolist())]
 
 def createTab(out: TextIOWrapper, data: List[tuple[int, float]]):
     out.write("counter\ttime\n")
     for dataPoint in data:
         i, time = dataPoint
         out.write(f"{i}\t{time}\n")
-try:
-    mkdir("tables")
-except FileExistsError:
-    pass
 
-for experiment in allExperiments:
-    id = getExperimentId(con, experiment)
-    with open(f"tables/{experiment.getFullStrategyName()}.tab", "w") as f:
-        createTab(f, getTimes(con, id, allExperimentIds, args.time_lower_threshold))
+if __name__ == '__main__':
+    parser = ArgumentParser(prog="Generates cactus graphs for all given experiments")
+    parser.add_argument("time_lower_threshold", type=float, help="Query instances all experiments answered faster are left out of the graphs")
+    parser.add_argument("experiments", nargs='+', help="all experiments included in the matrix in <name>-<strategy> format")
+    parser.add_argument("--thresholds", nargs='+', type=float, default=[], help="Further lower thresholds, the tables of each are written to tables/<threshold>/")
+    parser.add_argument("--timeout", help="Virtual timeout cut in seconds, slower results count as timeouts", type=float)
+    args = parser.parse_args()
+
+    con = sqlite3.connect("data.db")
+    require_schema(con)
+
+    allExperiments: List[Experiment] = [Experiment.fromFormat(experimentFormat) for experimentFormat in args.experiments]
+    allColumns = ColumnarCache(con).loadMany([getExperimentId(con, experiment) for experiment in allExperiments], args.timeout)
+    easyInstances = EasyInstances(allColumns)
+    curves = [CactusCurve(columns) for columns in allColumns]
+
+    for threshold, directory in [(args.time_lower_threshold, "tables")] + [(threshold, os.path.join("tables", f"{threshold:g}")) for threshold in args.thresholds]:
+        os.makedirs(directory, exist_ok=True)
+        easy = easyInstances.mask(threshold)
+        for experiment, curve in zip(allExperiments, curves):
+            with open(os.path.join(directory, f"{experiment.getFullStrategyName()}.tab"), "w") as f:
+                createTab(f, curve.points(easy))
+    con.close()
@@ -1,13 +1,17 @@
 #!/usr/bin/python3
 from pathlib import Path
 import sys
-from typing import List
+from typing import List, Optional
 from argparse import ArgumentParser
 from pathlib import Path
 import subprocess
 import os
 import time
 
+from catalogue import get_models, get_query_counts, load_catalogue
+from resume import completed_queries
+from slurm_array import DEFAULT_MAX_ARRAY_SIZE, DEFAULT_THROTTLE, submit_array
+
 parser = ArgumentParser(prog="colored petri net slurm job starter")
 parser.add_argument('-m', '--models', help="Path to directory containing the mcc models", default='/usr/local/share/mcc/')
 parser.add_argument('-s', '--sbatch-script', help="Path to the sbatch script that is started", default='./sbatch_script.sh')
@@ -20,6 +24,11 @@ parser.add_argument('-b', '--use-baseline', help="Disable the colored engine", a
 parser.add_argument('--base-output-dir', help='Base path for output', default="/nfs/home/student.aau.dk/jhajri20/slurm-output/")
 parser.add_argument('-d', '--deadlock-query', help='path to the global deadlock query', default='/nfs/home/student.aau.dk/jhajri20/ReachabilityDeadlock.xml')
 parser.add_argument('-v', '--verifypn-path', help='path to the verifypn binary', default='/nfs/home/student.aau.dk/jhajri20/verifypn-linux64')
+parser.add_argument('--catalogue', help="Path to the model and query catalogue, updated from --models before the jobs are created", default='catalogue.db')
+parser.add_argument('--array', help="Submit the jobs as one slurm job array reading its tasks from a manifest in the output folder", action='store_true')
+parser.add_argument('--throttle', help="The maximum number of tasks of one job array running at once", default=DEFAULT_THROTTLE, type=int)
+parser.add_argument('--max-array-size', help="The maximum number of tasks in one job array, larger arrays are split", default=DEFAULT_MAX_ARRAY_SIZE, type=int)
+parser.add_argument('--resume', help="Only run the queries without a complete result in the output folder, once its jobs have finished", action='store_true')
 only_args = sys.argv[1:]
 EXTRA_ARGS = []
 try:
@@ -43,6 +52,11 @@ slurm_output_path = Path(BASE_OUTPUT_DIR)
 OUTPUT_PATH = slurm_output_path / OUT_NAME
 DEADLOCK_QUERY = args.deadlock_query
 VERIFYPN_PATH = args.verifypn_path
+CATALOGUE_PATH = args.catalogue
+USE_ARRAY = args.array
+THROTTLE = args.throttle
+MAX_ARRAY_SIZE = args.max_array_size
+RESUME = args.resume
 
 def validate_scg(scg: str):
     if scg == "fixed":
@@ -111,9 +125,13 @@ class Model:
 models: List[Model] = []
 
 print("finding models")
-for modelRoot in Path(MODELS_PATH).iterdir():
+catalogue = load_catalogue(CATALOGUE_PATH, MODELS_PATH)
+for model_name in get_models(catalogue):
+    modelRoot = Path(MODELS_PATH) / model_name
     modelPnml = modelRoot / "model.pnml"
-    queryFiles = [QueryFile(modelRoot / 'ReachabilityCardinality.xml', 16), QueryFile(modelRoot / "ReachabilityFireability.xml", 16), QueryFile(Path(DEADLOCK_QUERY), 1)]
+    queryCounts = get_query_counts(catalogue, model_name)
+    queryFiles = [QueryFile(modelRoot / 'ReachabilityCardinality.xml', queryCounts.get("ReachabilityCardinality", 0)), QueryFile(modelRoot / "ReachabilityFireability.xml", queryCounts.get("ReachabilityFireability", 0)), QueryFile(Path(DEADLOCK_QUERY), 1)]
+    queryFiles = [queryFile for queryFile in queryFiles if queryFile.queryCount > 0]
     #queryFiles = [QueryFile(modelRoot / 'LTLCardinality.xml', 16), QueryFile(modelRoot / "LTLFireability.xml", 16)]
     models.append(Model(modelRoot, modelPnml, queryFiles))
 
@@ -123,6 +141,11 @@ class ModelCheckingJob:
     def __init__(self, model: Model, queryFile: QueryFile):
         self.model = model
         self.queryFile = queryFile
+        # the indices to run when not all of them
+        self.queryIndices: Optional[List[int]] = None
+
+    def queryCount(self) -> int:
+        return self.queryFile.queryCount if self.queryIndices is None else len(self.queryIndices)
 
     def __repr__(self):
         return f"{self.model.name()} {self.queryFile.name()}"
@@ -139,12 +162,7 @@ def startSbatchJob(env: dict[str,str], script_path: str, job_name: str, output_p
         script_path
     ], env=env)
 
-def scheduleJob(job: ModelCheckingJob):
-    my_env = os.environ.copy()
-    my_env["MODEL_FILE_PATH"] = os.path.abspath(job.model.modelPath)
-    my_env["QUERY_FILE_PATH"] = os.path.abspath(job.queryFile.queryPath)
-    my_env["QUERY_COUNT"] = str(job.queryFile.queryCount)
-    my_env["VERIFYPN_PATH"] = os.path.abspath(VERIFYPN_PATH)
+def verifypnOptions() -> str:
     verifypn_options = []
     if not USE_BASELINE:
         verifypn_options.append("-C")
@@ -157,10 +175,35 @@ def scheduleJob(job: ModelCheckingJob):
         verifypn_options.append("-s")
         verifypn_options.append(STRATEGY)
     verifypn_options = verifypn_options + EXTRA_ARGS
+    return ' '.join(verifypn_options)
+
+def jobName(job: ModelCheckingJob) -> str:
+    return f"{job.model.name()}_{job.queryFile.name()}_{'default' if STRATEGY is None else STRATEGY}"
 
-    my_env["VERIFYPN_OPTIONS"] = ' '.join(verifypn_options)
-    job_name = f"{job.model.name()}_{job.queryFile.name()}_{'default' if STRATEGY is None else STRATEGY}"
-    startSbatchJob(my_env, SBATCH_SCRIPT, job_name, OUTPUT_PATH)
+def jobTask(job: ModelCheckingJob) -> dict[str,str]:
+    task = {
+        "MODEL_FILE_PATH": os.path.abspath(job.model.modelPath),
+        "QUERY_FILE_PATH": os.path.abspath(job.queryFile.queryPath),
+        "QUERY_COUNT": str(job.queryFile.queryCount),
+    }
+    if (job.queryIndices is not None):
+        task["QUERY_INDICES"] = " ".join(str(queryIndex) for queryIndex in job.queryIndices)
+    return task
+
+def scheduleJob(job: ModelCheckingJob):
+    my_env = os.environ.copy()
+    my_env.update(jobTask(job))
+    my_env["VERIFYPN_PATH"] = os.path.abspath(VERIFYPN_PATH)
+    my_env["VERIFYPN_OPTIONS"] = verifypnOptions()
+    startSbatchJob(my_env, SBATCH_SCRIPT, jobName(job), OUTPUT_PATH)
+
+def scheduleArray(jobs: List[ModelCheckingJob]):
+    my_env = os.environ.copy()
+    my_env["VERIFYPN_PATH"] = os.path.abspath(VERIFYPN_PATH)
+    my_env["VERIFYPN_OPTIONS"] = verifypnOptions()
+    # the result parser reads model, category and strategy from the job name, TASK_NAME stands in for it
+    tasks = [{**jobTask(job), "TASK_NAME": jobName(job)} for job in jobs]
+    submit_array(OUTPUT_PATH / "tasks", tasks, SBATCH_SCRIPT, OUT_NAME, OUTPUT_PATH, [], my_env, THROTTLE, MAX_ARRAY_SIZE, GO)
 
 modelCheckingJobs: List[ModelCheckingJob] = []
 print("creating jobs list")
@@ -169,9 +212,16 @@ for model in models:
         modelCheckingJobs.append(ModelCheckingJob(model, queryFile))
 
 print(f"found {len(modelCheckingJobs)} jobs")
+if (RESUME):
+    completed = completed_queries(OUTPUT_PATH, False)
+    for modelCheckingJob in modelCheckingJobs:
+        category = Path(modelCheckingJob.queryFile.name()).stem
+        modelCheckingJob.queryIndices = [queryIndex for queryIndex in range(1, modelCheckingJob.queryFile.queryCount + 1) if (modelCheckingJob.model.name(), category, queryIndex) not in completed]
+    modelCheckingJobs = [modelCheckingJob for modelCheckingJob in modelCheckingJobs if modelCheckingJob.queryCount() > 0]
+    print(f"{len(completed)} queries already completed, resuming {len(modelCheckingJobs)} jobs")
 totalQueries = 0
 for modelCheckingJob in modelCheckingJobs:
-    totalQueries += modelCheckingJob.queryFile.queryCount
+    totalQueries += modelCheckingJob.queryCount()
 
 if (GO):
     create_out_path(OUTPUT_PATH)
@@ -182,8 +232,11 @@ print(f"requires an estimated {totalQueries} minutes of cpu time")
 print("Scheduling jobs, press enter to start")
 print(f"Using binary at {os.path.abspath(VERIFYPN_PATH)}")
 input()
-for modelCheckingJob in modelCheckingJobs:
-    time.sleep(WAIT_TIME)
-    scheduleJob(modelCheckingJob)
+if (USE_ARRAY):
+    scheduleArray(modelCheckingJobs)
+else:
+    for modelCheckingJob in modelCheckingJobs:
+        time.sleep(WAIT_TIME)
+        scheduleJob(modelCheckingJob)
 
 print("\a")
\ No newline at end of file
@@ -4,50 +4,34 @@ from io import TextIOWrapper
 from itertools import chain
 import sqlite3
 import sys
-from typing import List
+from typing import List, Optional
 
-from analysis_helper import Experiment, getExperimentId
-
-
-parser = ArgumentParser(prog="Generates comparison between two experiments based on data.db")
-parser.add_argument("experiments", nargs='+', help="all experiments included in the matrix in <name>-<strategy> format")
-args = parser.parse_args()
-
-experiments: List[Experiment] = [Experiment.fromFormat(x) for x in args.experiments]
-print(experiments)
+import numpy as np
 
-con = sqlite3.connect("data.db")
+from analysis_helper import Experiment, getExperimentId
+from columnar_cache import ColumnarCache
+from schema import require_schema
 
-matrix = [[0] * len(experiments) for _ in experiments]
 
-def getUniques(a: Experiment, b: Experiment) -> tuple[int, int]:
-    aId = getExperimentId(con, a)
-    bId = getExperimentId(con, b)
-    cur = con.execute(
-        """
-        SELECT 
-            COUNT(*) FILTER (WHERE l.status == "Answered"),
-            COUNT(*) FILTER (WHERE r.status == "Answered")
-        FROM query_result l
-        LEFT JOIN query_result r On r.query_instance_id = l.query_instance_id
-        LEFT JOIN query_instance qi ON qi.id == l.query_instance_id
-        WHERE l.experiment_id = ? and r.experiment_id = ? AND (
-            (l.status = "Answered" AND r.status != "Answered") 
-            OR 
-            (l.status != "Answered" AND r.status = "Answered")
-        )
-    """, (aId, bId))
-    return cur.fetchone()
+def toBitset(mask: np.ndarray) -> int:
+    """Bit i of the result is mask[i], i.e. a set of query instance ids"""
+    return int.from_bytes(np.packbits(mask, bitorder="little").tobytes(), "little")
 
-for aIndex in range(len(experiments)):
-    for bIndex in range(len(experiments)):
-        if (aIndex == bIndex):
-            matrix[aIndex][bIndex] = 0
-        a, b = getUniques(experiments[aIndex], experiments[bIndex])
-        matrix[aIndex][bIndex] = b
-        matrix[bIndex][aIndex] = a
+def getUniquesMatrix(con: sqlite3.Connection, experiments: List[Experiment], timeout: Optional[float]) -> List[List[int]]:
+    """
+    matrix[a][b] is the number of queries b answered that a has a result for
+    but did not answer, computed from one answered and one unanswered bitset
+    per experiment instead of a self-join per pair
+    """
+    cache = ColumnarCache(con)
+    answered: List[int] = []
+    unanswered: List[int] = []
+    for columns in cache.loadMany([getExperimentId(con, experiment) for experiment in experiments], timeout):
+        answered.append(toBitset(columns.answered()))
+        unanswered.append(toBitset(columns.present() & ~columns.answered()))
+    return [[(answered[bIndex] & unanswered[aIndex]).bit_count() for bIndex in range(len(experiments))] for aIndex in range(len(experiments))]
 
-def print_matrix(out: TextIOWrapper, matrix: List[List[int]]):
+def print_matrix(out: TextIOWrapper, experiments: List[Experiment], matrix: List[List[int]]):
     evens = list(filter(lambda x: experiments[x].type == "even", range(len(experiments))))
     fixeds = list(filter(lambda x: experiments[x].type == "fixed", range(len(experiments))))
     baseline = next(filter(lambda x: experiments[x].type == "baseline", range(len(experiments))))
@@ -124,4 +108,16 @@ def print_matrix(out: TextIOWrapper, matrix: List[List[int]]):
         out.write("\\hline\n")
     out.write("\\end{tabular}\n")
 
-print_matrix(sys.stdout, matrix)
\ No newline at end of file
+if __name__ == '__main__':
+    parser = ArgumentParser(prog="Generates comparison between two experiments based on data.db")
+    parser.add_argument("experiments", nargs='+', help="all experiments included in the matrix in <name>-<strategy> format")
+    parser.add_argument("--timeout", help="Virtual timeout cut in seconds, slower results count as timeouts", type=float)
+    args = parser.parse_args()
+
+    experiments: List[Experiment] = [Experiment.fromFormat(x) for x in args.experiments]
+    print(experiments)
+
+    con = sqlite3.connect("data.db")
+    require_schema(con)
+    matrix = getUniquesMatrix(con, experiments, args.timeout)
+    print_matrix(sys.stdout, experiments, matrix)
\ No newline at end of file
@@ -4,14 +4,18 @@ from io import TextIOWrapper
 from os import mkdir
 import sqlite3
 from typing import List
-from analysis_helper import Experiment, getExperimentId
+from analysis_helper import Experiment, applyTimeout, getExperimentId
+from schema import STATUS_CODES, require_schema
 
 
 parser = ArgumentParser(prog="Generates cactus graphs for all given experiments")
 parser.add_argument("experiments", nargs='+', help="all experiments included in the matrix in <name>-<strategy> format")
+parser.add_argument("--timeout", help="Virtual timeout cut in seconds, slower results count as timeouts", type=float)
 args = parser.parse_args()
 
 con = sqlite3.connect("data.db")
+require_schema(con)
+applyTimeout(con, args.timeout)
 
 allExperimentIds = [getExperimentId(con, Experiment.fromFormat(experimentFormat)) for experimentFormat in args.experiments]
 allExperiments: List[Experiment] = [Experiment.fromFormat(experimentFormat) for experimentFormat in args.experiments]
@@ -20,7 +24,7 @@ def getSkipCount(con: sqlite3.Connection, experiment: int):
     cur = con.execute(f"""
         SELECT COUNT(*) FROM query_result qr
 	        WHERE qr.experiment_id = ? 
-	        AND qr.status = "Answered"
+	        AND qr.status_code = {STATUS_CODES['Answered']}
 	        AND (
                 STATES <= 2
                 OR qr.verification_time IS NULL
@@ -36,7 +40,7 @@ def getThroughputs(con: sqlite3.Connection, experiment: int):
 	        WHERE qr.experiment_id = ? 
             AND qr.verification_time IS NOT NULL
 	        AND qr.states IS NOT NULL
-	        AND qr.status = "Answered"
+	        AND qr.status_code = {STATUS_CODES['Answered']}
 	        AND STATES > 2
             AND throughput > 1
 	        ORDER BY throughput ASC
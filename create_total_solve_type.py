@@ -6,18 +6,23 @@ import sqlite3
 import sys
 from typing import List
 
-from analysis_helper import Experiment, getExperimentId
+from analysis_helper import Experiment, applyTimeout, getExperimentId
+from schema import RESULT_CODES, STATUS_CODES, require_schema
+from summary import get_summary
 
 
 parser = ArgumentParser(prog="Generates comparison between all experiments based on data.db")
 parser.add_argument("baseline", help="The baseline result to compare with uniques")
 parser.add_argument("experiments", nargs='+', help="all experiments included in the matrix in <name>-<strategy> format")
+parser.add_argument("--timeout", help="Virtual timeout cut in seconds, slower results count as timeouts", type=float)
 args = parser.parse_args()
 
 baseline = Experiment.fromFormat(args.baseline)
 experiments: List[Experiment] = [Experiment.fromFormat(x) for x in args.experiments]
 
 con = sqlite3.connect("data.db")
+require_schema(con)
+applyTimeout(con, args.timeout)
 
 class SolveStats:
     def __init__(self, total: int, unique: int):
@@ -25,18 +30,18 @@ class SolveStats:
         self.unique = unique
 
 def getSolveStats(con: sqlite3.Connection, baselineId: int, experimentId: int) -> SolveStats:
-    cur = con.execute("""
+    summary = get_summary(con, experimentId, args.timeout)
+    cur = con.execute(f"""
     SELECT 
-        COUNT(*) FILTER (WHERE (qi.query_type = 'ef' AND qr1.result = 'Satisfied') OR (qi.query_type = 'ag' AND qr1.result = 'Unsatisfied')) AS counter_total, 
-        COUNT(*) FILTER (WHERE (qi.query_type = 'ag' AND qr1.result = 'Satisfied') OR (qi.query_type = 'ef' AND qr1.result = 'Unsatisfied')) AS full_total,
-        COUNT(*) FILTER (WHERE ((qi.query_type = 'ef' AND qr1.result = 'Satisfied') OR (qi.query_type = 'ag' AND qr1.result = 'Unsatisfied')) AND baseline.status != 'Answered') AS counter_total_unique,
-        COUNT(*) FILTER (WHERE ((qi.query_type = 'ag' AND qr1.result = 'Satisfied') OR (qi.query_type = 'ef' AND qr1.result = 'Unsatisfied')) AND baseline.status != 'Answered') AS full_total_unique
-    FROM query_instance qi
-        LEFT JOIN query_result qr1 ON qr1.query_instance_id = qi.id AND qr1.experiment_id = ?
-        LEFT JOIN query_result baseline on baseline.query_instance_id = qi.id AND baseline.experiment_id = ?
-    """, (experimentId, baselineId))
-    counter, full, counter_unique, full_unique = cur.fetchone()
-    return SolveStats(counter, counter_unique), SolveStats(full, full_unique)
+        COUNT(*) FILTER (WHERE (qi.query_type = 'ef' AND qr1.result_code = {RESULT_CODES['Satisfied']}) OR (qi.query_type = 'ag' AND qr1.result_code = {RESULT_CODES['Unsatisfied']})) AS counter_total_unique,
+        COUNT(*) FILTER (WHERE (qi.query_type = 'ag' AND qr1.result_code = {RESULT_CODES['Satisfied']}) OR (qi.query_type = 'ef' AND qr1.result_code = {RESULT_CODES['Unsatisfied']})) AS full_total_unique
+    FROM query_result qr1
+        LEFT JOIN query_instance qi ON qi.id = qr1.query_instance_id
+        JOIN query_result baseline on baseline.query_instance_id = qr1.query_instance_id AND baseline.experiment_id = ?
+    WHERE qr1.experiment_id = ? AND baseline.status_code != {STATUS_CODES['Answered']}
+    """, (baselineId, experimentId))
+    counter_unique, full_unique = cur.fetchone()
+    return SolveStats(summary.count("counter_example"), counter_unique), SolveStats(summary.count("full_state_space"), full_unique)
 
 def writeTable(out: TextIOWrapper, solveStats: List[tuple[str, SolveStats, SolveStats]]):
     out.write(r"\begin{tabularx}{\textwidth}{X c c c c c}")
@@ -6,12 +6,15 @@ import sqlite3
 import sys
 from typing import List
 
-from analysis_helper import Experiment, getExperimentId
+from analysis_helper import Experiment, applyTimeout, getExperimentId
+from schema import require_schema
+from summary import get_summary
 
 
 parser = ArgumentParser(prog="Generates comparison between two experiments based on data.db")
 parser.add_argument("-n", "--non-reduced", nargs='+', help="all experiments included in the matrix in <name>-<strategy> format")
 parser.add_argument("-r", "--reduced", nargs='+', help="all experiments included in the matrix in <name>-<strategy> format")
+parser.add_argument("--timeout", help="Virtual timeout cut in seconds, slower results count as timeouts", type=float)
 args = parser.parse_args()
 
 
@@ -19,6 +22,8 @@ nonReduced: List[Experiment] = [Experiment.fromFormat(x) for x in args.non_reduc
 reduced: List[Experiment] = [Experiment.fromFormat(x) for x in args.reduced]
 
 con = sqlite3.connect("data.db")
+require_schema(con)
+applyTimeout(con, args.timeout)
 
 class SolveStats:
     def __init__(self, cardinality: int, fireability: int):
@@ -27,17 +32,8 @@ class SolveStats:
 
 def getSolveStats(con: sqlite3.Connection, experimentId: int) -> SolveStats:
     print(experimentId)
-    cur = con.execute(
-        """
-        SELECT 
-            COUNT(*) FILTER (WHERE qi.query_name = "ReachabilityCardinality"),
-            COUNT(*) FILTER (WHERE qi.query_name = "ReachabilityFireability")
-        FROM query_result qr
-            LEFT JOIN query_instance qi ON qi.id == qr.query_instance_id
-        WHERE qr.experiment_id = ? AND qr.status == "Answered"
-    """, (experimentId,))
-    cardinality, fireability = cur.fetchone()
-    return SolveStats(cardinality, fireability)
+    summary = get_summary(con, experimentId, args.timeout)
+    return SolveStats(summary.count("answered", "ReachabilityCardinality"), summary.count("answered", "ReachabilityFireability"))
 
 def writeTable(out: TextIOWrapper, solveStats: List[tuple[str, SolveStats, SolveStats]]):
     out.write(r"\begin{tabularx}{\textwidth}{X c c c c c}")
@@ -22,19 +22,35 @@ for i in argIter:
 JOB_NAME: str = parsedArgs["--job-name"]
 OUTPUT = parsedArgs["--output"]
 ERROR = parsedArgs["--error"]
-TIME = parsedArgs["--time"]
+TIME = parsedArgs.get("--time")
+# --array first-last%throttle, the throttle does not matter when the jobs are run by hand
+ARRAY = parsedArgs.get("--array")
 COMMAND = positionalArgs
 
 OUTPUT_FOLDER = Path("fake_sbatch_jobs")
 OUTPUT_FOLDER.mkdir(exist_ok=True)
 
-with (OUTPUT_FOLDER / (JOB_NAME + ".sh")).open("w") as f:
-    f.write("#!/bin/bash\n")
-    f.write(f"# {JOB_NAME}\n")
-    env = os.environ.copy()
-    for (key, val) in env.items():
-        f.write(f"declare -x {key}=\"{val}\"\n")
-    f.write(f"{" ".join(COMMAND)} 2>\"{ERROR.replace("%j", "JOB_NUMBER")}\" 1>\"{OUTPUT.replace("%j", "JOB_NUMBER")}\"\n")
-    print(f"created job {JOB_NAME}")
+def writeJob(scriptName: str, output: str, error: str, arrayTaskId: int = None):
+    with (OUTPUT_FOLDER / (scriptName + ".sh")).open("w") as f:
+        f.write("#!/bin/bash\n")
+        f.write(f"# {scriptName}\n")
+        env = os.environ.copy()
+        if (arrayTaskId is not None):
+            env["SLURM_ARRAY_TASK_ID"] = str(arrayTaskId)
+        for (key, val) in env.items():
+            f.write(f"declare -x {key}=\"{val}\"\n")
+        f.write(f"{" ".join(COMMAND)} 2>\"{error}\" 1>\"{output}\"\n")
+        print(f"created job {scriptName}")
 
-(OUTPUT_FOLDER / (JOB_NAME + ".sh")).chmod(0o775)
\ No newline at end of file
+    (OUTPUT_FOLDER / (scriptName + ".sh")).chmod(0o775)
+
+if (ARRAY is None):
+    writeJob(JOB_NAME, OUTPUT.replace("%j", "JOB_NUMBER"), ERROR.replace("%j", "JOB_NUMBER"))
+else:
+    first, last = ARRAY.split("%")[0].split("-")
+    # every split of a large array is its own job
+    arrayJob = f"JOB_NUMBER_{os.environ.get('ARRAY_OFFSET', '0')}"
+    def taskPath(path: str, arrayTaskId: int) -> str:
+        return path.replace("%A", arrayJob).replace("%a", str(arrayTaskId)).replace("%j", f"{arrayJob}_{arrayTaskId}")
+    for arrayTaskId in range(int(first), int(last) + 1):
+        writeJob(f"{JOB_NAME}_{arrayJob}_{arrayTaskId}", taskPath(OUTPUT, arrayTaskId), taskPath(ERROR, arrayTaskId), arrayTaskId)
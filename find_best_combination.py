@@ -1,26 +1,159 @@
 #!/usr/bin/python3
 from argparse import ArgumentParser
-from itertools import combinations, permutations
+import heapq
 import sqlite3
-from typing import List
-
-from analysis_helper import Experiment, getExperimentId
-
-con = sqlite3.connect("data.db")
-
-parser = ArgumentParser(prog="Generates comparison between two experiments based on data.db")
-parser.add_argument("experiments", nargs='+', help="all experiments included in the matrix in <name>-<strategy> format")
-args = parser.parse_args()
-
-experiments: List[Experiment] = [(Experiment.fromFormat(x), getExperimentId(con, Experiment.fromFormat(x))) for x in args.experiments]
-i = 0
-for perm in combinations(experiments, 4):
-    cur = con.execute("""
-        SELECT COUNT(*) FROM query_instance qi
-	        LEFT JOIN query_result qr1 ON qr1.query_instance_id = qi.id AND qr1.experiment_id = ?
-	        LEFT JOIN query_result qr2 ON qr2.query_instance_id = qi.id AND qr2.experiment_id = ?
-	        LEFT JOIN query_result qr3 ON qr3.query_instance_id = qi.id AND qr3.experiment_id = ?
-	        LEFT JOIN query_result qr4 ON qr4.query_instance_id = qi.id AND qr4.experiment_id = ?   
-            WHERE qr1.status = "Answered" OR qr2.status = "Answered" OR qr3.status = "Answered" OR qr4.status = "Answered
-    """)
-    
\ No newline at end of file
+import time
+from typing import List, Optional, Tuple
+
+from columnar_cache import ExperimentColumns, loadExperiments
+from create_matrix import toBitset
+from schema import require_schema
+
+# seconds the exact search may take before --method auto falls back to greedy
+DEFAULT_SEARCH_LIMIT = 5.0
+
+# (answered queries, indices of the experiments in the combination)
+Combination = Tuple[int, Tuple[int, ...]]
+
+def solvedBitset(columns: ExperimentColumns, timeBudget: Optional[float], timeSlices: int = 1) -> int:
+    """
+    The queries the experiment answers as one of the experiments of a
+    portfolio. Run in parallel every experiment gets the whole time budget,
+    time sliced on one core the k experiments get timeBudget / k seconds each
+    """
+    solved = columns.answered()
+    if (timeBudget is not None):
+        solved = solved & (columns.time <= timeBudget / timeSlices)
+    return toBitset(solved)
+
+class SearchLimitReached(Exception):
+    pass
+
+def exactCombinations(sets: List[int], k: int, top: int, searchLimit: Optional[float] = None) -> Tuple[List[Combination], bool]:
+    """
+    The top combinations of k experiments by branch and bound. The remaining
+    experiments of a node are ordered by the queries they would add, so a branch
+    adds at most the next k - chosen gains, and no more than the candidates
+    answer together. Once that bound does not beat the worst kept combination
+    the branch and all later ones are cut. The search stops after searchLimit
+    seconds, returning the best combinations found so far and whether the
+    search was complete.
+    """
+    k = min(k, len(sets))
+    best: List[Combination] = []
+    deadline = time.monotonic() + searchLimit if searchLimit is not None else None
+
+    def checkLimit():
+        if (deadline is not None and time.monotonic() > deadline):
+            raise SearchLimitReached()
+
+    def keep(combination: Combination):
+        if (len(best) < top):
+            heapq.heappush(best, combination)
+        elif (combination[0] > best[0][0]):
+            heapq.heapreplace(best, combination)
+
+    def search(candidates: List[int], chosen: Tuple[int, ...], union: int, unionCount: int):
+        remaining = k - len(chosen)
+        if (remaining == 0):
+            keep((unionCount, chosen))
+            return
+        if (remaining == 1):
+            # the leaves, nothing left to bound
+            checkLimit()
+            for candidate in candidates:
+                keep((unionCount + (sets[candidate] & ~union).bit_count(), chosen + (candidate,)))
+            return
+        gains = sorted((((sets[candidate] & ~union).bit_count(), candidate) for candidate in candidates), reverse=True)
+        # laterUnions[position] are the queries the candidates from position on answer together
+        laterUnions = [0] * (len(gains) + 1)
+        for position in range(len(gains) - 1, -1, -1):
+            laterUnions[position] = laterUnions[position + 1] | sets[gains[position][1]]
+        for position in range(len(gains) - remaining + 1):
+            bound = unionCount + min(sum(gain for gain, _ in gains[position:position + remaining]), (laterUnions[position] & ~union).bit_count())
+            if (len(best) == top and bound <= best[0][0]):
+                break
+            checkLimit()
+            gain, candidate = gains[position]
+            search([later for _, later in gains[position + 1:]], chosen + (candidate,), union | sets[candidate], unionCount + gain)
+
+    try:
+        search(list(range(len(sets))), (), 0, 0)
+    except SearchLimitReached:
+        return sorted(best, reverse=True), False
+    return sorted(best, reverse=True), True
+
+def greedyCombination(sets: List[int], k: int) -> Tuple[Combination, int]:
+    """
+    Lazy greedy, within 1 - 1/e of the best combination. A gain in the heap is
+    from an earlier round and can only have shrunk since, so only the top one
+    is recomputed until it stays on top. Also returns an upper bound on the best
+    combination: after every round it answers at most the queries answered so
+    far plus the k largest gains in the heap, and never more than all
+    experiments answer together.
+    """
+    heap = [(-solved.bit_count(), index) for index, solved in enumerate(sets)]
+    heapq.heapify(heap)
+    chosen: List[int] = []
+    union = 0
+    unionCount = 0
+    allSolved = 0
+    for solved in sets:
+        allSolved |= solved
+    upperBound = min(-sum(gain for gain, _ in heapq.nsmallest(k, heap)), allSolved.bit_count())
+    while (len(chosen) < k and len(heap) > 0):
+        _, index = heapq.heappop(heap)
+        gain = (sets[index] & ~union).bit_count()
+        if (len(heap) > 0 and -heap[0][0] > gain):
+            heapq.heappush(heap, (-gain, index))
+            continue
+        chosen.append(index)
+        union |= sets[index]
+        unionCount += gain
+        upperBound = min(upperBound, unionCount - sum(staleGain for staleGain, _ in heapq.nsmallest(k, heap)))
+    return (unionCount, tuple(chosen)), upperBound
+
+def findCombinations(sets: List[int], k: int, top: int, method: str, searchLimit: float) -> Tuple[List[Combination], Optional[int]]:
+    """
+    The combinations found by the method, and an upper bound on the best
+    combination when they are not known to be the best
+    """
+    combinations: List[Combination] = []
+    complete = False
+    if (method != "greedy"):
+        combinations, complete = exactCombinations(sets, k, top, searchLimit if method == "auto" else None)
+    if (complete):
+        return combinations, None
+    if (method == "auto"):
+        print(f"the exact search did not finish in {searchLimit}s, searching greedily")
+    combination, upperBound = greedyCombination(sets, k)
+    # the exact search may have found a better one before it stopped
+    return [max([combination, *combinations[:1]])], upperBound
+
+if __name__ == '__main__':
+    parser = ArgumentParser(prog="Finds the combinations of k experiments that together answer the most queries based on data.db")
+    parser.add_argument("experiments", nargs='*', help="candidate experiments in <name>-<strategy> format, all experiments when none are given")
+    parser.add_argument("-k", help="Number of experiments in a combination", default=4, type=int)
+    parser.add_argument("--top", help="Number of combinations printed by the exact search", default=5, type=int)
+    parser.add_argument("--method", help="exact: branch and bound, greedy: lazy greedy with an upper bound on the best combination, auto: exact for up to --search-limit seconds, then greedy", choices=["auto", "exact", "greedy"], default="auto")
+    parser.add_argument("--search-limit", help="Seconds the exact search of --method auto runs before it falls back to greedy", default=DEFAULT_SEARCH_LIMIT, type=float)
+    parser.add_argument("--time-budget", help="Seconds per query of the experiments of a combination run in parallel, a query is answered when any of them answers it within the budget", type=float)
+    parser.add_argument("--time-sliced", help="The experiments of a combination share one core instead, each gets --time-budget divided by k", action='store_true')
+    parser.add_argument("--timeout", help="Virtual timeout cut in seconds, slower results count as timeouts", type=float)
+    args = parser.parse_args()
+
+    con = sqlite3.connect("data.db")
+    require_schema(con)
+    names, columns = loadExperiments(con, args.experiments, args.timeout)
+    sets = [solvedBitset(experimentColumns, args.time_budget, args.k if args.time_sliced else 1) for experimentColumns in columns]
+    allSolved = 0
+    for solved in sets:
+        allSolved |= solved
+    print(f"{len(names)} experiments answer {allSolved.bit_count()} queries together")
+
+    combinations, upperBound = findCombinations(sets, args.k, args.top, args.method, args.search_limit)
+    if (upperBound is not None):
+        print(f"the best combination answers at most {upperBound} queries")
+    for answered, indices in combinations:
+        print(f"{answered}: {', '.join(names[index] for index in indices)}")
+    con.close()
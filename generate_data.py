@@ -1,24 +1,25 @@
 #!/usr/bin/python3
 from argparse import ArgumentParser
+from collections import deque
 from contextlib import closing
 from io import TextIOWrapper
-from itertools import islice
+from multiprocessing.pool import AsyncResult, Pool
 from os import remove
 from pathlib import Path
 import tarfile
-from typing import Dict, Iterator, List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 import sqlite3
-from result_parser import QueryInstance, QueryResult, Result, Status
-import xml.etree.ElementTree as ET
-import re
+import time
+from catalogue import get_models, get_query_types, load_catalogue
+from output_store import CODECS, OutputStore, create_output_tables
+from schema import RESULT_CODES, STATUS_CODES, migrate_schema
+from sketch import update_sketches
+from summary import update_summaries
+from result_parser import QueryInstance, QueryResult, Result, ResultSource, Status
 import json
 import typing
 import csv
-
-parser = ArgumentParser(prog="Generates a database with the data from many_results")
-parser.add_argument("timeout", help="Sets a virtual timeout cut", default=100000, type=float)
-parsed = parser.parse_args()
-TIMEOUT = parsed.timeout
+import hashlib
 
 def create_tables(con: sqlite3.Connection):
     
@@ -57,22 +58,19 @@ def create_tables(con: sqlite3.Connection):
     );
     """)
 
-def parse_query_and_type(property: ET.ElementTree) -> Tuple[str, int, Optional[str]]:
-    name = property.find("./{http://mcc.lip6.fr/}id").text
-    m = re.match(r".+\-([^-0-9]+)\-([0-9]+\-)?([0-9]+)$", name)
-    query_name = m.group(1)
-    index = int(m.group(3)) + 1
-
-    if property.find("./{http://mcc.lip6.fr/}formula/{http://mcc.lip6.fr/}all-paths") is not None:
-        return query_name, index, "ag"
-    elif property.find("./{http://mcc.lip6.fr/}formula/{http://mcc.lip6.fr/}exists-path") is not None:
-        return query_name, index, "ef"
-    elif property.find("./{http://mcc.lip6.fr/}formula/{http://mcc.lip6.fr/}negation/{http://mcc.lip6.fr/}all-paths") is not None:
-        return query_name, index, "ef"
-    elif property.find("./{http://mcc.lip6.fr/}formula/{http://mcc.lip6.fr/}negation/{http://mcc.lip6.fr/}exists-path") is not None:
-        return query_name, index, "ag"
-    else:
-        return query_name, index, None
+    create_output_tables(con)
+
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS ingested_archive (
+        path TEXT PRIMARY KEY,
+        size INTEGER,
+        mtime INTEGER,
+        sha256 TEXT,
+        ingested_at TEXT
+    );
+    """)
+
+    migrate_schema(con)
 
 class ConsensusAnswer:
     def __init__(self, model_name: str, category: str, index: int, consensus: Optional[QueryResult]):
@@ -91,142 +89,373 @@ def read_consensus_answers(answerPath: str) -> Iterator[ConsensusAnswer]:
 
 NON_DYNAMIC_QUERY_CATEGORIES = ["ReachabilityDeadlock", "OneSafe", "Liveness", "StableMarking", "QuasiLiveness"]
 DYNAMIC_QUERY_CATEGORIES = ["ReachabilityCardinality", "ReachabilityFireability", "LTLCardinality", "LTLFireability", "CTLCardinality", "CTLFireability"]
-def create_query_instances(con: sqlite3.Connection, path: str):
-    known_models: set[str] = set()
-    consensus_answers = read_consensus_answers('all_answers.csv')
-    for consensus_answer in filter(lambda x : 'COL' in x.model_name, consensus_answers):
-        known_models.add(consensus_answer.model_name)
+
+def create_query_instances(con: sqlite3.Connection, catalogue: sqlite3.Connection):
+    consensus_answers = [consensus_answer for consensus_answer in read_consensus_answers('all_answers.csv') if 'COL' in consensus_answer.model_name]
+    known_models: set[str] = set(consensus_answer.model_name for consensus_answer in consensus_answers)
+    unknown_models = [model_name for model_name in get_models(catalogue) if model_name not in known_models]
+    queryTypes = get_query_types(catalogue)
+
+    rows = []
+    for consensus_answer in consensus_answers:
         expected_answer = None
         if consensus_answer.consensus != None:
             expected_answer = consensus_answer.consensus.name
         if consensus_answer.category == "ReachabilityDeadlock":
-            con.execute("""
-                    INSERT INTO query_instance (model_name, query_name, query_index, query_type, expected_answer) VALUES (?, ?, ?, ?, ?)
-                """, (consensus_answer.model_name, consensus_answer.category, consensus_answer.index, "ef", expected_answer))
+            rows.append((consensus_answer.model_name, consensus_answer.category, consensus_answer.index, "ef", expected_answer))
             continue
         if consensus_answer.category in NON_DYNAMIC_QUERY_CATEGORIES:
-            con.execute("""
-                    INSERT INTO query_instance (model_name, query_name, query_index, query_type, expected_answer) VALUES (?, ?, ?, ?, ?)
-                """, (consensus_answer.model_name, consensus_answer.category, consensus_answer.index, None, expected_answer))
+            rows.append((consensus_answer.model_name, consensus_answer.category, consensus_answer.index, None, expected_answer))
             continue
-        parsed = ET.parse(str(Path(path) / consensus_answer.model_name / (consensus_answer.category + ".xml")))
-        #fix
+        # the consensus index is the position of the property in the file
+        categoryQueryTypes = queryTypes.get((consensus_answer.model_name, consensus_answer.category), [])
         query_type = None
-        for queryElement in islice(parsed.iterfind(".//{http://mcc.lip6.fr/}property"), consensus_answer.index - 1, consensus_answer.index):
-            _, _, query_type = parse_query_and_type(queryElement)
-        
-        con.execute("""
-                INSERT INTO query_instance (model_name, query_name, query_index, query_type, expected_answer) VALUES (?, ?, ?, ?, ?)
-            """, (consensus_answer.model_name, consensus_answer.category, consensus_answer.index, query_type, expected_answer))
-    for modelDirectoryPath in Path(path).glob("*"):
-        model_name = modelDirectoryPath.name 
-        if (modelDirectoryPath.name not in known_models):
-            for queryCategory in DYNAMIC_QUERY_CATEGORIES:
-                parsed = ET.parse(str(modelDirectoryPath / (queryCategory + ".xml")))
-                for queryElement in parsed.iterfind(".//{http://mcc.lip6.fr/}property"):
-                    query_name, index, query_type = parse_query_and_type(queryElement)
-                    con.execute("""
-                        INSERT INTO query_instance (model_name, query_name, query_index, query_type, expected_answer) VALUES (?, ?, ?, ?, ?)
-                    """, (model_name, queryCategory, index, query_type, None))
-            for queryCategory in NON_DYNAMIC_QUERY_CATEGORIES:
-                if queryCategory == "ReachabilityDeadlock":
-                    con.execute("""
-                        INSERT INTO query_instance (model_name, query_name, query_index, query_type, expected_answer) VALUES (?, ?, ?, ?, ?)
-                    """, (model_name, queryCategory, 1, "ef", None))
-                    continue
-                con.execute("""
-                    INSERT INTO query_instance (model_name, query_name, query_index, query_type, expected_answer) VALUES (?, ?, ?, ?, ?)
-                """, (model_name, queryCategory, 1, None, None))
-
-class StrategyResults:
-    def __init__(self, name: str, strategy: str, results: dict[str, Result]):
-        self.name = name
-        self.strategy = strategy
-        self.results = results
-
-def createName(filePath, strategy):
-    return str(filePath.name) + ":" + strategy
-
-def process_results(resultFilesPath: str) -> Dict[str, StrategyResults]:
-    resultDict: Dict[str, StrategyResults] = dict()
-    resultFilePaths = list(Path(resultFilesPath).glob(f"*.tar"))
-    for resultFilePath in resultFilePaths:
-        with tarfile.open(str(resultFilePath), "r") as resultTar:
-            is_large_job = any(map(lambda x: x.endswith('large'), resultTar.getnames()))
-            for memberInfo in resultTar.getmembers():
-                if (memberInfo.path.endswith(".out")):
-                    try:
-                        errInfo = resultTar.getmember(memberInfo.path.removesuffix(".out") + ".err")
-                        with resultTar.extractfile(memberInfo) as outFile:
-                            with resultTar.extractfile(errInfo) as errFile:
-                                outContent = outFile.read().decode()
-                                errContent = errFile.read().decode()
-                                results = Result.fromOutErr(outContent, errContent, is_large_job)
-                                for result in results:
-                                    name = createName(resultFilePath, result.strategy)
-                                    if name not in resultDict:
-                                        resultDict[name] = StrategyResults(resultFilePath.name.split(".")[0], result.strategy, dict())
-                                    resultDict[name].results[result.query_instance.get_key()] = (result)
-                    except KeyError:
-                        print("missing err file for " + memberInfo.path)
-    return resultDict
-
-def processResult(result: Result):
-    if (result.time > TIMEOUT):
-        result.time = None
-        result.states = None
-        result.result = None
-        result.verificationTime = None
-        result.colorReductionTime = None
-        result.status = Status.Timeout
-
-
-def getQueryInstance(con: sqlite3.Connection, queryInstance: QueryInstance) -> int:
-    res = con.execute("SELECT id FROM query_instance WHERE model_name=? AND query_name=? AND query_index=?",
-        (queryInstance.model_name, queryInstance.query_name, int(queryInstance.query_index)))
-    id = res.fetchone()
-    return id[0]
-
-def insertResults(con: sqlite3.Connection, resultsDict: Dict[str, StrategyResults]):
-    for strategy in resultsDict.values():
-        experimentId: Optional[int] = None
-        exists_cur = con.execute("SELECT * FROM experiment WHERE name = ? AND search_strategy = ?", (strategy.name, strategy.strategy))
-        if (len(exists_cur.fetchall()) > 0):
+        if (consensus_answer.index <= len(categoryQueryTypes)):
+            _, query_type = categoryQueryTypes[consensus_answer.index - 1]
+        rows.append((consensus_answer.model_name, consensus_answer.category, consensus_answer.index, query_type, expected_answer))
+    for model_name in unknown_models:
+        for queryCategory in DYNAMIC_QUERY_CATEGORIES:
+            for index, query_type in queryTypes.get((model_name, queryCategory), []):
+                rows.append((model_name, queryCategory, index, query_type, None))
+        for queryCategory in NON_DYNAMIC_QUERY_CATEGORIES:
+            if queryCategory == "ReachabilityDeadlock":
+                rows.append((model_name, queryCategory, 1, "ef", None))
+                continue
+            rows.append((model_name, queryCategory, 1, None, None))
+    con.executemany("""
+        INSERT INTO query_instance (model_name, query_name, query_index, query_type, expected_answer) VALUES (?, ?, ?, ?, ?)
+    """, rows)
+
+class ArchiveChunk:
+    """A slice of the .out/.err pairs of one archive, the unit of work handed to parser processes"""
+    def __init__(self, archiveIndex: int, archivePath: Path, isPlainTar: bool, is_large_job: bool, memberPairs: List[Tuple[tarfile.TarInfo, tarfile.TarInfo]], isFirst: bool, isLast: bool):
+        self.archiveIndex = archiveIndex
+        self.archivePath = archivePath
+        self.isPlainTar = isPlainTar
+        self.is_large_job = is_large_job
+        self.memberPairs = memberPairs
+        self.isFirst = isFirst
+        self.isLast = isLast
+
+def find_member_pairs(resultTar: tarfile.TarFile) -> Tuple[bool, List[Tuple[tarfile.TarInfo, tarfile.TarInfo]]]:
+    members = resultTar.getmembers()
+    is_large_job = any(map(lambda x: x.path.endswith('large'), members))
+    membersByPath = {memberInfo.path: memberInfo for memberInfo in members}
+    memberPairs = []
+    for memberInfo in members:
+        if (not memberInfo.path.endswith(".out")):
+            continue
+        errInfo = membersByPath.get(memberInfo.path.removesuffix(".out") + ".err")
+        if (errInfo is None):
+            print("missing err file for " + memberInfo.path)
             continue
-        exists_cur.close()
-        cur = con.cursor()
-        res = cur.execute("INSERT INTO experiment (name, search_strategy) VALUES (?, ?) RETURNING id", (strategy.name, strategy.strategy))
+        memberPairs.append((memberInfo, errInfo))
+    return is_large_job, memberPairs
+
+def iter_pair_results(resultTar: tarfile.TarFile, memberPairs: List[Tuple[tarfile.TarInfo, tarfile.TarInfo]], is_large_job: bool, archivePath: Optional[str] = None) -> Iterator[Result]:
+    """Parses the pairs, recording where each result's output is in the archive if archivePath is given"""
+    for outInfo, errInfo in memberPairs:
+        # read as bytes, the parser only decodes the parts it needs
+        with resultTar.extractfile(outInfo) as outFile:
+            outContent = outFile.read()
+        with resultTar.extractfile(errInfo) as errFile:
+            errContent = errFile.read()
+        for result in Result.fromOutErr(outContent, errContent, is_large_job):
+            if archivePath is not None:
+                result.source = ResultSource(archivePath, outInfo.name, outInfo.offset_data, errInfo.name, errInfo.offset_data)
+            yield result
+
+def open_archive(resultFilePath: Path) -> Tuple[tarfile.TarFile, bool]:
+    """Opens an archive and tells whether it is an uncompressed tar, whose members can be read at their offsets"""
+    try:
+        return tarfile.open(str(resultFilePath), "r:"), True
+    except tarfile.ReadError:
+        return tarfile.open(str(resultFilePath), "r"), False
+
+def iter_archive_chunks(resultFilePaths: List[Path], chunkSize: int) -> Iterator[ArchiveChunk]:
+    for archiveIndex, resultFilePath in enumerate(resultFilePaths):
+        resultTar, isPlainTar = open_archive(resultFilePath)
+        with resultTar:
+            is_large_job, memberPairs = find_member_pairs(resultTar)
+        chunkStarts = range(0, max(len(memberPairs), 1), chunkSize)
+        for chunkStart in chunkStarts:
+            isLast = chunkStart == chunkStarts[-1]
+            yield ArchiveChunk(archiveIndex, resultFilePath, isPlainTar, is_large_job, memberPairs[chunkStart:chunkStart + chunkSize], chunkStart == 0, isLast)
+
+# archives opened by this process, kept open so consecutive chunks of one archive do not reopen it
+openArchives: Dict[Path, tarfile.TarFile] = dict()
+
+def parse_archive_chunk(chunk: ArchiveChunk) -> List[Result]:
+    if chunk.archivePath not in openArchives:
+        for openArchive in openArchives.values():
+            openArchive.close()
+        openArchives.clear()
+        openArchives[chunk.archivePath] = tarfile.open(str(chunk.archivePath), "r")
+    return list(iter_pair_results(openArchives[chunk.archivePath], chunk.memberPairs, chunk.is_large_job, str(chunk.archivePath) if chunk.isPlainTar else None))
+
+def iter_parsed_chunks(chunks: Iterator[ArchiveChunk], pool: Optional[Pool], window: int) -> Iterator[Tuple[ArchiveChunk, List[Result]]]:
+    """Parses chunks in the pool, yielding them in input order with at most window chunks in flight"""
+    if pool is None:
+        for chunk in chunks:
+            yield chunk, parse_archive_chunk(chunk)
+        return
+    inFlight: deque[Tuple[ArchiveChunk, AsyncResult]] = deque()
+    for chunk in chunks:
+        inFlight.append((chunk, pool.apply_async(parse_archive_chunk, (chunk,))))
+        if (len(inFlight) >= window):
+            chunk, asyncResult = inFlight.popleft()
+            yield chunk, asyncResult.get()
+    while len(inFlight) > 0:
+        chunk, asyncResult = inFlight.popleft()
+        yield chunk, asyncResult.get()
+
+def load_query_instance_ids(con: sqlite3.Connection) -> Dict[Tuple[str, str, int], int]:
+    return {(model_name, query_name, int(query_index)): id for id, model_name, query_name, query_index in con.execute("SELECT id, model_name, query_name, query_index FROM query_instance")}
+
+def configure_bulk_load(con: sqlite3.Connection):
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=NORMAL")
+    con.execute("PRAGMA cache_size=-262144")
+    con.execute("PRAGMA temp_store=MEMORY")
+
+class ResultWriter:
+    """
+    Writes results to the database in batches of at most batchSize results,
+    so memory use does not grow with the number of results in an archive.
+    Experiments that already exist in the database are skipped. Results are
+    stored as measured, timeout cuts are applied when they are analysed. With
+    rawOutput "reference" only the location of the output in its archive is
+    stored, for results that know it. The metric sketches and summaries of the
+    experiments written to are rebuilt in the transaction of every commit.
+    """
+    def __init__(self, con: sqlite3.Connection, batchSize: int, codec: str = "zlib", rawOutput: str = "store"):
+        self.con = con
+        self.batchSize = batchSize
+        self.outputStore = OutputStore(con, codec)
+        self.rawOutput = rawOutput
+        # None marks an experiment that existed before this run and is skipped
+        self.experimentIds: Dict[Tuple[str, str], Optional[int]] = dict()
+        self.queryInstanceIds = load_query_instance_ids(con)
+        self.pending: Dict[Tuple[int, int], Result] = dict()
+        # bitmap per experiment of the query instances already written, to let a later result replace an earlier one
+        self.written: Dict[int, bytearray] = dict()
+        # experiments written to since the last commit
+        self.touched: Set[int] = set()
+        # ids are assigned here so rows can be inserted with executemany, this writer being the only one
+        self.nextResultId: Optional[int] = None
+        self.resultCount = 0
+
+    def getExperimentId(self, name: str, strategy: str) -> Optional[int]:
+        key = (name, strategy)
+        if key in self.experimentIds:
+            return self.experimentIds[key]
+        exists_cur = self.con.execute("SELECT id FROM experiment WHERE name = ? AND search_strategy = ?", (name, strategy))
+        if (exists_cur.fetchone() is not None):
+            print(f"skipping existing {name}-{strategy}")
+            self.experimentIds[key] = None
+            return None
+        res = self.con.execute("INSERT INTO experiment (name, search_strategy) VALUES (?, ?) RETURNING id", (name, strategy))
         experimentId = res.fetchone()[0]
-        print(f"adding {strategy.name}-{strategy.strategy}")
-        for result in strategy.results.values():
-            processResult(result)
-            try:
-                queryInstanceId = getQueryInstance(con, result.query_instance)
-            except:
-                print(result.query_instance.model_name, result.query_instance.query_index, result.query_instance.query_name)
-                raise
-            res = cur.execute("INSERT INTO query_result (experiment_id, query_instance_id, time, status, result, max_memory, states, color_reduction_time, verification_time) VALUES (?,?,?,?,?,?,?,?,?) RETURNING id",
-                (experimentId, queryInstanceId, result.time, result.status.name, result.result.name if result.result != None else None, result.maxMemory, result.states, result.colorReductionTime, result.verificationTime))
-            cur.execute("INSERT INTO extended_result (query_result_id, stdout, stderr) VALUES (?, ?, ?)",
-                (res.fetchone()[0], result.fullOut, result.fullErr)
-            )
-        cur.close()
-        con.commit()
+        print(f"adding {name}-{strategy}")
+        self.experimentIds[key] = experimentId
+        self.written[experimentId] = bytearray()
+        return experimentId
+
+    def add(self, name: str, result: Result):
+        experimentId = self.getExperimentId(name, result.strategy)
+        if (experimentId is None):
+            return
+        queryInstance = result.query_instance
+        queryInstanceId = self.queryInstanceIds.get((queryInstance.model_name, queryInstance.query_name, int(queryInstance.query_index)))
+        if (queryInstanceId is None):
+            print(queryInstance.model_name, queryInstance.query_index, queryInstance.query_name)
+            raise KeyError(queryInstance.get_key())
+        # a query without a time was killed before it finished, a resumed run may have the result it did not get
+        if (result.time is None and ((experimentId, queryInstanceId) in self.pending or self.isWritten(experimentId, queryInstanceId))):
+            return
+        self.pending[(experimentId, queryInstanceId)] = result
+        self.touched.add(experimentId)
+        if (len(self.pending) >= self.batchSize):
+            self.flush()
+
+    def isWritten(self, experimentId: int, queryInstanceId: int) -> bool:
+        written = self.written[experimentId]
+        byteIndex, bit = divmod(queryInstanceId, 8)
+        return byteIndex < len(written) and bool(written[byteIndex] & (1 << bit))
+
+    def flush(self):
+        if (len(self.pending) == 0):
+            return
+        if (self.nextResultId is None):
+            self.nextResultId = self.con.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM query_result").fetchone()[0]
+        replaced: List[Tuple[int, int]] = []
+        queryResultRows = []
+        extendedResultRows = []
+        referenceRows = []
+        for (experimentId, queryInstanceId), result in self.pending.items():
+            written = self.written[experimentId]
+            byteIndex, bit = divmod(queryInstanceId, 8)
+            if (byteIndex >= len(written)):
+                written.extend(bytes(byteIndex + 1 - len(written)))
+            if (written[byteIndex] & (1 << bit)):
+                replaced.append((experimentId, queryInstanceId))
+            written[byteIndex] |= 1 << bit
+            queryResultRows.append((self.nextResultId, experimentId, queryInstanceId, result.time, result.status.name, result.result.name if result.result != None else None, result.maxMemory, result.states, result.colorReductionTime, result.verificationTime,
+                STATUS_CODES[result.status.name], RESULT_CODES[result.result.name] if result.result != None else None))
+            source = result.source
+            if (self.rawOutput == "reference" and source is not None):
+                referenceRows.append((self.nextResultId, source.archivePath,
+                    source.outMember, source.outDataOffset + result.outSpan[0], result.outSpan[1] - result.outSpan[0],
+                    source.errMember, source.errDataOffset + result.errSpan[0], result.errSpan[1] - result.errSpan[0]))
+            else:
+                extendedResultRows.append((self.nextResultId, result.rawOut, result.rawErr))
+            self.nextResultId += 1
+        outputIds = self.outputStore.put_many([output for _, stdout, stderr in extendedResultRows for output in (stdout, stderr)])
+        extendedResultRows = [(queryResultId, outputIds[2 * i], outputIds[2 * i + 1]) for i, (queryResultId, _, _) in enumerate(extendedResultRows)]
+        self.con.executemany("DELETE FROM extended_result WHERE query_result_id IN (SELECT id FROM query_result WHERE experiment_id = ? AND query_instance_id = ?)", replaced)
+        self.con.executemany("DELETE FROM raw_output_reference WHERE query_result_id IN (SELECT id FROM query_result WHERE experiment_id = ? AND query_instance_id = ?)", replaced)
+        self.con.executemany("DELETE FROM query_result WHERE experiment_id = ? AND query_instance_id = ?", replaced)
+        self.con.executemany("INSERT INTO query_result (id, experiment_id, query_instance_id, time, status, result, max_memory, states, color_reduction_time, verification_time, status_code, result_code) VALUES (?,?,?,?,?,?,?,?,?,?,?,?)", queryResultRows)
+        self.con.executemany("INSERT INTO extended_result (query_result_id, stdout_id, stderr_id) VALUES (?, ?, ?)", extendedResultRows)
+        self.con.executemany("INSERT INTO raw_output_reference (query_result_id, archive_path, out_member, out_offset, out_length, err_member, err_offset, err_length) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", referenceRows)
+        self.resultCount += len(self.pending)
+        self.pending.clear()
+
+    def commit(self):
+        self.flush()
+        update_sketches(self.con, sorted(self.touched))
+        update_summaries(self.con, sorted(self.touched))
+        self.touched.clear()
+        self.con.commit()
+
+class ArchiveManifestEntry:
+    def __init__(self, path: str, size: int, mtime: int, sha256: str):
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        self.sha256 = sha256
+
+def archive_experiment_name(archivePath: Path) -> str:
+    return archivePath.name.split(".")[0]
+
+def hash_archive(archivePath: Path) -> str:
+    digest = hashlib.sha256()
+    with archivePath.open("rb") as archiveFile:
+        while (block := archiveFile.read(1 << 20)):
+            digest.update(block)
+    return digest.hexdigest()
+
+def record_archive(con: sqlite3.Connection, entry: ArchiveManifestEntry):
+    con.execute("INSERT OR REPLACE INTO ingested_archive (path, size, mtime, sha256, ingested_at) VALUES (?, ?, ?, ?, datetime('now'))",
+        (entry.path, entry.size, entry.mtime, entry.sha256))
+
+def delete_experiments(con: sqlite3.Connection, name: str):
+    con.execute("DELETE FROM extended_result WHERE query_result_id IN (SELECT qr.id FROM query_result qr JOIN experiment e ON e.id = qr.experiment_id WHERE e.name = ?)", (name,))
+    con.execute("DELETE FROM raw_output_reference WHERE query_result_id IN (SELECT qr.id FROM query_result qr JOIN experiment e ON e.id = qr.experiment_id WHERE e.name = ?)", (name,))
+    con.execute("DELETE FROM query_result WHERE experiment_id IN (SELECT id FROM experiment WHERE name = ?)", (name,))
+    con.execute("DELETE FROM metric_sketch WHERE experiment_id IN (SELECT id FROM experiment WHERE name = ?)", (name,))
+    con.execute("DELETE FROM experiment_summary WHERE experiment_id IN (SELECT id FROM experiment WHERE name = ?)", (name,))
+    con.execute("DELETE FROM experiment WHERE name = ?", (name,))
+
+def check_archives(con: sqlite3.Connection, resultFilePaths: List[Path], reingestChanged: bool) -> List[Tuple[Path, ArchiveManifestEntry, bool]]:
+    """
+    Compares the archives against the ingested_archive manifest and returns
+    the ones to ingest, together with whether their experiments must be
+    replaced. Archives with the size and mtime they were ingested with are
+    skipped without being opened. The manifest is keyed on resolved paths, so
+    it does not depend on the directory ingestion runs from.
+    """
+    toIngest: List[Tuple[Path, ArchiveManifestEntry, bool]] = []
+    unchangedCount = 0
+    # only a manifest that was just created can be missing archives that were ingested
+    manifestIsNew = con.execute("SELECT COUNT(*) FROM ingested_archive").fetchone()[0] == 0
+    for resultFilePath in resultFilePaths:
+        stat = resultFilePath.stat()
+        manifestPath = str(resultFilePath.resolve())
+        row = con.execute("SELECT size, mtime, sha256 FROM ingested_archive WHERE path = ?", (manifestPath,)).fetchone()
+        if (row is None and manifestPath != str(resultFilePath)):
+            # entries were keyed on the path as given before they were resolved
+            row = con.execute("SELECT size, mtime, sha256 FROM ingested_archive WHERE path = ?", (str(resultFilePath),)).fetchone()
+            con.execute("UPDATE ingested_archive SET path = ? WHERE path = ?", (manifestPath, str(resultFilePath)))
+        if (row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime_ns):
+            unchangedCount += 1
+            continue
+        entry = ArchiveManifestEntry(manifestPath, stat.st_size, stat.st_mtime_ns, hash_archive(resultFilePath))
+        if (row is None):
+            if (manifestIsNew and con.execute("SELECT 1 FROM experiment WHERE name = ?", (archive_experiment_name(resultFilePath),)).fetchone() is not None):
+                print(f"{resultFilePath.name} was ingested before the manifest existed, recording it")
+                record_archive(con, entry)
+                continue
+            toIngest.append((resultFilePath, entry, False))
+        elif (row[2] == entry.sha256):
+            unchangedCount += 1
+            record_archive(con, entry)
+        elif (reingestChanged):
+            print(f"{resultFilePath.name} changed since it was ingested, its experiments will be replaced")
+            toIngest.append((resultFilePath, entry, True))
+        else:
+            print(f"{resultFilePath.name} changed since it was ingested, skipping it (use --reingest-changed to replace its experiments)")
+    con.commit()
+    print(f"{unchangedCount} archives unchanged, {len(toIngest)} to ingest")
+    return toIngest
+
+def process_results(con: sqlite3.Connection, resultFilesPath: str, batchSize: int, jobs: int = 1, chunkSize: int = 8, reingestChanged: bool = False, codec: str = "zlib", rawOutput: str = "store"):
+    toIngest = check_archives(con, sorted(Path(resultFilesPath).glob(f"*.tar")), reingestChanged)
+    writer = ResultWriter(con, batchSize, codec, rawOutput)
+    startTime = time.monotonic()
+    # parsing is spread over the pool, while this process stays the only one writing to the database
+    pool = Pool(jobs) if jobs > 1 else None
+    try:
+        # archives are opened by absolute paths, which raw_output_reference records so it reads the same from any directory
+        for chunk, results in iter_parsed_chunks(iter_archive_chunks([path.resolve() for path, _, _ in toIngest], chunkSize), pool, jobs * 2):
+            _, entry, replace = toIngest[chunk.archiveIndex]
+            name = archive_experiment_name(chunk.archivePath)
+            if (chunk.isFirst and replace):
+                delete_experiments(con, name)
+            if (chunk.isFirst and rawOutput == "reference" and not chunk.isPlainTar):
+                print(f"{chunk.archivePath.name} is compressed, storing its outputs instead of referencing them")
+            for result in results:
+                writer.add(name, result)
+            if (not chunk.isLast):
+                continue
+            # an archive is committed as a whole, together with its manifest entry, so an interrupted run never leaves a partial experiment behind
+            record_archive(con, entry)
+            writer.commit()
+            elapsed = time.monotonic() - startTime
+            print(f"[{chunk.archiveIndex + 1}/{len(toIngest)}] {chunk.archivePath.name}: {writer.resultCount} results written ({writer.resultCount / max(elapsed, 1e-9):.0f} results/s)")
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        for openArchive in openArchives.values():
+            openArchive.close()
+        openArchives.clear()
 
-def generate_data(con: sqlite3.Connection, resultsFilePath: str):
+def generate_data(con: sqlite3.Connection, resultsFilePath: str, batchSize: int, jobs: int, chunkSize: int, reingestChanged: bool, codec: str, rawOutput: str, modelsPath: str, cataloguePath: str):
+    configure_bulk_load(con)
     create_tables(con)
     cur = con.execute("SELECT COUNT(*) FROM query_instance")
     if (cur.fetchone()[0] == 0):
         print("Creating query instances")
-        create_query_instances(con, "/usr/local/share/mcc/")
+        catalogue = load_catalogue(cataloguePath, modelsPath, jobs)
+        create_query_instances(con, catalogue)
+        catalogue.close()
         con.commit()
     print("Processing results")
-    results = process_results(resultsFilePath)
-    print("Inserting results")
-    insertResults(con, results)
+    process_results(con, resultsFilePath, batchSize, jobs, chunkSize, reingestChanged, codec, rawOutput)
 
 if __name__ == '__main__':
+    parser = ArgumentParser(prog="Generates a database with the data from many_results")
+    parser.add_argument("-b", "--batch-size", help="Number of results held in memory before they are written to the database", default=10000, type=int)
+    parser.add_argument("-j", "--jobs", help="Number of processes parsing query files and result archives", default=1, type=int)
+    parser.add_argument("--chunk-size", help="Number of .out/.err pairs handed to a parsing process at a time", default=8, type=int)
+    parser.add_argument("--reingest-changed", help="Replace the experiments of archives that changed since they were ingested", action='store_true')
+    parser.add_argument("--codec", help="Compression used for stored stdout and stderr", choices=list(CODECS.keys()), default="zlib")
+    parser.add_argument("--raw-output", help="store: keep stdout and stderr compressed in the database, reference: only record where they are in the archives, which must then be kept unchanged", choices=["store", "reference"], default="store")
+    parser.add_argument("-m", "--models", help="Path to directory containing the mcc models", default="/usr/local/share/mcc/")
+    parser.add_argument("--catalogue", help="Path to the model and query catalogue, built or updated from --models when the query instances are created", default="catalogue.db")
+    args = parser.parse_args()
     db = sqlite3.connect("data.db")
-    generate_data(db, "many_results")
+    generate_data(db, "many_results", args.batch_size, args.jobs, args.chunk_size, args.reingest_changed, args.codec, args.raw_output, args.models, args.catalogue)
     db.commit()
     db.close()
\ No newline at end of file
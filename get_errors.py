@@ -5,6 +5,8 @@ import sqlite3
 from typing import List
 
 from analysis_helper import Experiment, getExperimentId
+from output_store import register_output_functions
+from schema import STATUS_CODES, require_schema
 
 
 parser = ArgumentParser(prog="Gathers all stderr and stdout for errors in given strategy")
@@ -17,18 +19,20 @@ except FileExistsError:
     pass
 
 con = sqlite3.connect("data.db")
+require_schema(con)
+register_output_functions(con)
 
 experimentId = getExperimentId(con, EXPERIMENT)
 
-res = con.execute("""
+res = con.execute(f"""
 SELECT qi.model_name, qi.query_name, qi.query_index, er.stdout, er.stderr
     FROM query_result qr
     LEFT JOIN query_instance qi
         ON qi.id = qr.query_instance_id
-    LEFT JOIN extended_result er
+    JOIN extended_result_text er
         ON qr.id = er.query_result_id
     WHERE
-        lower(qr.status) = "error" AND qr.experiment_id = ?
+        qr.status_code = {STATUS_CODES['Error']} AND qr.experiment_id = ?
 """, (experimentId,))
 
 for model_name, query_name, query_index, stdout, stderr in res.fetchall():
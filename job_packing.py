@@ -0,0 +1,69 @@
+import heapq
+import math
+from pathlib import Path
+from typing import List, Tuple
+
+# (model name, query category, query index), how query_instance identifies a query
+QueryKey = Tuple[str, str, int]
+
+class PlannedQuery:
+    """One verifypn run of a big job"""
+    def __init__(self, modelName: str, modelPath: Path, categoryName: str, isLTL: bool, queryPath: Path, queryIndex: int):
+        self.modelName = modelName
+        self.modelPath = modelPath
+        self.categoryName = categoryName
+        self.isLTL = isLTL
+        self.queryPath = queryPath
+        self.queryIndex = queryIndex
+    def key(self) -> QueryKey:
+        return (self.modelName, self.categoryName, self.queryIndex)
+
+class PackedJob:
+    """Queries run one after another by a job, longest predicted first"""
+    def __init__(self):
+        self.queries: List[PlannedQuery] = []
+        self.predictions: List[float] = []
+        self.predicted = 0.0
+    def add(self, query: PlannedQuery, prediction: float):
+        self.queries.append(query)
+        self.predictions.append(prediction)
+        self.predicted += prediction
+    def timeLimit(self, margin: float, parallel: int = 1) -> int:
+        """
+        The --time of the job in minutes, the predicted seconds with a relative
+        margin and the 10 minutes every big job gets. Running parallel queries
+        at a time, longest first, the job takes at most its share of the total
+        and what the longest query leaves the other slots idle.
+        """
+        seconds = self.predicted / parallel + max(self.predictions, default=0) * (parallel - 1) / parallel
+        return math.ceil(seconds * (1 + margin) / 60) + 10
+
+def pack_queries(queries: List[PlannedQuery], predictions: List[float], targetSeconds: float) -> List[PackedJob]:
+    """
+    Longest processing time first scheduling of the queries on as many jobs as
+    the predicted total needs at the target duration: every query, longest
+    first, goes to the job with the least predicted time so far. The jobs end
+    up close to the target, and a query longer than it gets a job of its own.
+    """
+    jobCount = max(1, math.ceil(sum(predictions) / targetSeconds))
+    jobs = [PackedJob() for _ in range(jobCount)]
+    loads = [(0.0, index) for index in range(jobCount)]
+    for position in sorted(range(len(queries)), key=lambda position: -predictions[position]):
+        load, index = heapq.heappop(loads)
+        jobs[index].add(queries[position], predictions[position])
+        heapq.heappush(loads, (load + predictions[position], index))
+    return [job for job in jobs if len(job.queries) > 0]
+
+def write_query_list(path: Path, job: PackedJob):
+    """The queries of the job for job_runner.py, one tab separated line of model name, model, category, LTL flag, query file and index per query"""
+    with path.open("w") as f:
+        for query in job.queries:
+            f.write(f"{query.modelName}\t{query.modelPath}\t{query.categoryName}\t{1 if query.isLTL else 0}\t{query.queryPath}\t{query.queryIndex}\n")
+
+def read_query_list(path: Path) -> List[PlannedQuery]:
+    queries = []
+    with path.open() as f:
+        for line in f:
+            modelName, modelPath, categoryName, isLTL, queryPath, queryIndex = line.rstrip("\n").split("\t")
+            queries.append(PlannedQuery(modelName, Path(modelPath), categoryName, isLTL == "1", Path(queryPath), int(queryIndex)))
+    return queries
@@ -0,0 +1,189 @@
+#!/usr/bin/python3
+from argparse import ArgumentParser
+import os
+from pathlib import Path
+import re
+import resource
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from typing import BinaryIO, Dict, List
+
+from job_packing import PlannedQuery, read_query_list
+
+CATEGORY_REGEX = re.compile(r"^([^:]+):([^:]+):([^:]+):(.+)$")
+# the per process limit when slurm does not say how much memory the job has, what the ulimit of big_job_script.sh was
+DEFAULT_MEMORY_MB = 15 * 1024
+# how often finished and overdue queries are looked for
+POLL_INTERVAL = 0.05
+# the exit code of the bash loop when a query was interrupted, 128 + SIGINT
+INTERRUPTED = 130
+# slurm sends SIGTERM when a job is cancelled or hits its time limit
+STOP_SIGNALS = {signal.SIGINT, signal.SIGTERM}
+
+def category_queries(categories: str, modelName: str, modelPath: str) -> List[PlannedQuery]:
+    """The queries of the CATEGORIES of a model job, count:category:isLTL:query file separated by spaces"""
+    queries = []
+    for category in categories.split():
+        match = CATEGORY_REGEX.match(category)
+        if (match is None):
+            raise ValueError(f"invalid category description {category}")
+        for queryIndex in range(1, int(match[1]) + 1):
+            queries.append(PlannedQuery(modelName, Path(modelPath), match[2], match[3] == "1", Path(match[4]), queryIndex))
+    return queries
+
+def limit_resources(memoryBytes: int, cpuSeconds: int):
+    """Runs in the child before verifypn is executed, the limits only apply to that query"""
+    resource.setrlimit(resource.RLIMIT_AS, (memoryBytes, memoryBytes))
+    resource.setrlimit(resource.RLIMIT_CPU, (cpuSeconds, cpuSeconds + 5))
+    # the runner blocks them while it starts a query
+    signal.pthread_sigmask(signal.SIG_UNBLOCK, STOP_SIGNALS)
+
+class RunningQuery:
+    def __init__(self, query: PlannedQuery, process: subprocess.Popen, out: BinaryIO, err: BinaryIO, started: float, deadline: float):
+        self.query = query
+        self.process = process
+        self.out = out
+        self.err = err
+        self.started = started
+        self.deadline = deadline
+        self.timedOut = False
+
+class JobRunner:
+    """
+    Runs the queries of a job, up to jobs verifypn processes at a time, where
+    big_job_script.sh ran them one by one in a bash loop. Every process gets the per query
+    timeout as its CPU time limit and its share of the memory as its address
+    space limit. It is killed when it runs past the timeout. The output of a
+    query is collected in temporary files and written as one segment when it
+    finishes, delimited by the same RUNNING markers and ending in the same
+    TOTAL_TIME and MAX_MEMORY lines as the output of the bash loop. The time is
+    the wall time of the process and the memory its maximum resident set size,
+    as /usr/bin/time reported them. As the bash loop exited with 130 when a
+    query was interrupted, no further queries are started after one is, and
+    a runner that is interrupted or terminated kills its queries and exits
+    with 130.
+    """
+    def __init__(self, env: Dict[str, str], jobs: int, memoryBytes: int, out: BinaryIO, err: BinaryIO):
+        self.verifypnPath = env["VERIFYPN_PATH"]
+        self.timeout = float(env["PER_QUERY_TIMEOUT"])
+        self.configuration = f"{env['SUCCESSOR_GENERATOR']}-{env['SEARCH_STRATEGY']}"
+        self.reachabilityOptions = env.get("REACHABILITY_OPTIONS", "").split()
+        self.ltlOptions = env.get("LTL_OPTIONS", "").split()
+        self.jobs = jobs
+        self.memoryBytes = memoryBytes
+        self.out = out
+        self.err = err
+        self.running: Dict[int, RunningQuery] = {}
+        self.interrupted = False
+
+    def marker(self, query: PlannedQuery) -> bytes:
+        return f"\n###### RUNNING {query.modelName} X {self.configuration} X {query.categoryName} X {query.queryIndex} ######\n".encode()
+
+    def start(self, query: PlannedQuery) -> RunningQuery:
+        options = self.ltlOptions if query.isLTL else self.reachabilityOptions
+        out = tempfile.TemporaryFile()
+        err = tempfile.TemporaryFile()
+        cpuSeconds = int(self.timeout) + 1
+        process = subprocess.Popen([self.verifypnPath, "-x", str(query.queryIndex), str(query.modelPath), str(query.queryPath), *options],
+            stdin=subprocess.DEVNULL, stdout=out, stderr=err, start_new_session=True, preexec_fn=lambda: limit_resources(self.memoryBytes, cpuSeconds))
+        started = time.monotonic()
+        return RunningQuery(query, process, out, err, started, started + self.timeout)
+
+    def finish(self, running: RunningQuery, status: int, rusage: resource.struct_rusage):
+        elapsed = time.monotonic() - running.started
+        # the process is reaped, Popen must not wait for it again
+        running.process.returncode = os.waitstatus_to_exitcode(status)
+        exitCode = running.process.returncode
+        interrupted = exitCode == INTERRUPTED or exitCode == -signal.SIGINT
+        running.out.seek(0)
+        running.err.seek(0)
+        marker = self.marker(running.query)
+        outSegment = marker + running.out.read()
+        # what the bash loop echoed after the process: timeout exits with 124 and a CPU time limit ends in SIGXCPU
+        if (running.timedOut or exitCode == -signal.SIGXCPU):
+            outSegment += b"TIMEOUT\n"
+        elif (interrupted):
+            self.interrupted = True
+        elif (exitCode < 0 or exitCode > 2):
+            outSegment += b"ERROR\n"
+        errSegment = marker + running.err.read()
+        # an interrupted query did not finish, without a TOTAL_TIME --resume runs it again
+        if (not interrupted):
+            errSegment += f"TOTAL_TIME: {elapsed:.2f}s\nMAX_MEMORY: {rusage.ru_maxrss}kB\n".encode()
+        running.out.close()
+        running.err.close()
+        # this process is the only writer, a segment is written whole between those of other queries
+        self.out.write(outSegment)
+        self.out.flush()
+        self.err.write(errSegment)
+        self.err.flush()
+
+    def stop(self, signum: int, frame):
+        """Kills the running queries, which lead sessions of their own and do not get the signal of the runner"""
+        for running in self.running.values():
+            try:
+                os.killpg(running.process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                # reaped, but not yet finished
+                pass
+        sys.exit(INTERRUPTED)
+
+    def run(self, queries: List[PlannedQuery]) -> int:
+        """Runs the queries and returns the exit code of the job, 130 when a query was interrupted"""
+        for signum in STOP_SIGNALS:
+            signal.signal(signum, self.stop)
+        pending = list(reversed(queries))
+        running = self.running
+        while ((len(pending) > 0 and not self.interrupted) or len(running) > 0):
+            while (len(pending) > 0 and not self.interrupted and len(running) < self.jobs):
+                # a query is only killed by stop once it is in running
+                signal.pthread_sigmask(signal.SIG_BLOCK, STOP_SIGNALS)
+                try:
+                    started = self.start(pending.pop())
+                    running[started.process.pid] = started
+                finally:
+                    signal.pthread_sigmask(signal.SIG_UNBLOCK, STOP_SIGNALS)
+            pid, status, rusage = os.wait4(-1, os.WNOHANG)
+            if (pid != 0 and pid in running):
+                self.finish(running.pop(pid), status, rusage)
+                continue
+            now = time.monotonic()
+            for overdue in running.values():
+                if (not overdue.timedOut and now >= overdue.deadline):
+                    overdue.timedOut = True
+                    # with whatever it started, it leads its own session
+                    os.killpg(overdue.process.pid, signal.SIGKILL)
+            time.sleep(POLL_INTERVAL)
+        return INTERRUPTED if self.interrupted else 0
+
+def default_jobs() -> int:
+    return int(os.environ.get("RUNNER_JOBS", "1"))
+
+def default_memory_mb(jobs: int) -> int:
+    """
+    The memory of the job split between the queries running at once, slurm
+    sets SLURM_MEM_PER_NODE with --mem. create_big_jobs.py asks for 16G per
+    query, so each gets the 15G of a job running one query at a time.
+    """
+    if ("SLURM_MEM_PER_NODE" not in os.environ):
+        return DEFAULT_MEMORY_MB
+    # a sixteenth is left for everything else, as the 15G ulimit of a 16G job did
+    return int(os.environ["SLURM_MEM_PER_NODE"]) * 15 // 16 // jobs
+
+if __name__ == '__main__':
+    parser = ArgumentParser(prog="Runs the queries of a big job in parallel, reading the job from the environment create_big_jobs.py gives it")
+    parser.add_argument("-j", "--jobs", help="Number of verifypn processes running at once, RUNNER_JOBS when not given", type=int, default=default_jobs())
+    parser.add_argument("--memory-limit", help="Address space limit of every verifypn process in MB, when not given fifteen sixteenths of the memory of the slurm job divided between the processes, or 15G outside slurm", type=int)
+    args = parser.parse_args()
+
+    env = os.environ
+    if ("QUERY_LIST" in env):
+        queries = read_query_list(Path(env["QUERY_LIST"]))
+    else:
+        queries = category_queries(env["CATEGORIES"], env["MODEL_NAME"], env["MODEL_FILE_PATH"])
+    memoryMb = args.memory_limit if args.memory_limit is not None else default_memory_mb(args.jobs)
+    runner = JobRunner(dict(env), args.jobs, memoryMb * 1024 * 1024, sys.stdout.buffer, sys.stderr.buffer)
+    sys.exit(runner.run(queries))
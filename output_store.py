@@ -0,0 +1,210 @@
+#!/usr/bin/python3
+from argparse import ArgumentParser
+import hashlib
+import lzma
+import mmap
+import os
+import sqlite3
+from typing import Dict, List, Optional
+import zlib
+
+CODECS = {
+    "zlib": (lambda data: zlib.compress(data, 6), zlib.decompress),
+    "lzma": (lzma.compress, lzma.decompress),
+    # used for outputs too small to gain from compression
+    "none": (bytes, bytes)
+}
+
+def create_output_tables(con: sqlite3.Connection):
+    """
+    Raw verifypn output is stored compressed in raw_output, once per distinct
+    content, and referenced from extended_result by stdout_id/stderr_id.
+    Rows written before that keep their text in extended_result.stdout/stderr.
+    Results ingested in reference mode only record where their output is in
+    the result archive, in raw_output_reference.
+    """
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS raw_output (
+        id INTEGER PRIMARY KEY,
+        hash BLOB UNIQUE,
+        codec TEXT,
+        size INTEGER,
+        data BLOB
+    );
+    """)
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS raw_output_reference (
+        query_result_id INTEGER PRIMARY KEY,
+        archive_path TEXT,
+        out_member TEXT,
+        out_offset INTEGER,
+        out_length INTEGER,
+        err_member TEXT,
+        err_offset INTEGER,
+        err_length INTEGER,
+        FOREIGN KEY(query_result_id) REFERENCES query_result(id)
+    );
+    """)
+    columns = [row[1] for row in con.execute("PRAGMA table_info(extended_result)")]
+    for column in ["stdout_id", "stderr_id"]:
+        if column not in columns:
+            con.execute(f"ALTER TABLE extended_result ADD COLUMN {column} REFERENCES raw_output(id)")
+    # reading the view requires register_output_functions on the connection
+    con.execute("DROP VIEW IF EXISTS extended_result_text")
+    con.execute("""
+    CREATE VIEW extended_result_text AS
+        SELECT
+            qr.id AS query_result_id,
+            COALESCE(er.stdout, decompress_output(so.codec, so.data), read_archive_output(ref.archive_path, ref.out_offset, ref.out_length)) AS stdout,
+            COALESCE(er.stderr, decompress_output(se.codec, se.data), read_archive_output(ref.archive_path, ref.err_offset, ref.err_length)) AS stderr
+        FROM query_result qr
+            LEFT JOIN extended_result er ON er.query_result_id = qr.id
+            LEFT JOIN raw_output so ON so.id = er.stdout_id
+            LEFT JOIN raw_output se ON se.id = er.stderr_id
+            LEFT JOIN raw_output_reference ref ON ref.query_result_id = qr.id
+    """)
+
+def decompress_output(codec: Optional[str], data: Optional[bytes]) -> Optional[str]:
+    if data is None:
+        return None
+    return CODECS[codec][1](data).decode()
+
+def read_archive_output(archivePath: Optional[str], offset: Optional[int], length: Optional[int], baseDirectory: str = "") -> Optional[str]:
+    """
+    Reads length bytes at offset of an uncompressed archive, only the pages
+    holding them are touched. Archives are referenced by absolute paths,
+    relative ones were recorded relative to the directory of the database.
+    """
+    if archivePath is None or offset is None:
+        return None
+    with open(os.path.join(baseDirectory, archivePath), "rb") as archiveFile:
+        with mmap.mmap(archiveFile.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return mapped[offset:offset + length].decode()
+
+def database_directory(con: sqlite3.Connection) -> str:
+    """The directory of the main database file, the working directory for an in memory database"""
+    for _, name, file in con.execute("PRAGMA database_list"):
+        if name == "main" and file:
+            return os.path.dirname(file)
+    return os.getcwd()
+
+def register_output_functions(con: sqlite3.Connection):
+    baseDirectory = database_directory(con)
+    con.create_function("decompress_output", 2, decompress_output, deterministic=True)
+    con.create_function("read_archive_output", 3, lambda archivePath, offset, length: read_archive_output(archivePath, offset, length, baseDirectory))
+
+def encode_output(output) -> bytes:
+    return output.encode() if isinstance(output, str) else bytes(output)
+
+def hash_output(data: bytes) -> bytes:
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+class OutputStore:
+    """
+    Content addressed store of compressed outputs. It assigns raw_output ids
+    itself, so it must be the only writer of the table while it is used.
+    """
+    def __init__(self, con: sqlite3.Connection, codec: str = "zlib"):
+        self.con = con
+        self.codec = codec
+        self.compress = CODECS[codec][0]
+        self.nextId: Optional[int] = None
+
+    def put_many(self, outputs: List) -> List[Optional[int]]:
+        """Stores str or bytes outputs and returns their ids, None is kept as None"""
+        if self.nextId is None:
+            self.nextId = self.con.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM raw_output").fetchone()[0]
+        encoded = [encode_output(output) for output in outputs if output is not None]
+        hashes = [hash_output(data) for data in encoded]
+        ids: Dict[bytes, int] = dict()
+        distinct = list(dict.fromkeys(hashes))
+        for start in range(0, len(distinct), 500):
+            block = distinct[start:start + 500]
+            for id, outputHash in self.con.execute(f"SELECT id, hash FROM raw_output WHERE hash IN ({','.join('?' * len(block))})", block):
+                ids[outputHash] = id
+        rows = []
+        for outputHash, data in zip(hashes, encoded):
+            if outputHash in ids:
+                continue
+            ids[outputHash] = self.nextId
+            compressed = self.compress(data)
+            if len(compressed) < len(data):
+                rows.append((self.nextId, outputHash, self.codec, len(data), compressed))
+            else:
+                rows.append((self.nextId, outputHash, "none", len(data), data))
+            self.nextId += 1
+        self.con.executemany("INSERT INTO raw_output (id, hash, codec, size, data) VALUES (?, ?, ?, ?, ?)", rows)
+        hashIterator = iter(hashes)
+        return [ids[next(hashIterator)] if output is not None else None for output in outputs]
+
+def database_size(con: sqlite3.Connection) -> int:
+    pageCount = con.execute("PRAGMA page_count").fetchone()[0]
+    freePages = con.execute("PRAGMA freelist_count").fetchone()[0]
+    pageSize = con.execute("PRAGMA page_size").fetchone()[0]
+    return (pageCount - freePages) * pageSize
+
+def migrate(con: sqlite3.Connection, codec: str, batchSize: int):
+    """Moves the plain text outputs of extended_result into raw_output"""
+    create_output_tables(con)
+    store = OutputStore(con, codec)
+    lastId = 0
+    migrated = 0
+    while True:
+        rows = con.execute("SELECT id, stdout, stderr FROM extended_result WHERE id > ? AND (stdout IS NOT NULL OR stderr IS NOT NULL) ORDER BY id LIMIT ?", (lastId, batchSize)).fetchall()
+        if len(rows) == 0:
+            break
+        outputIds = store.put_many([output for _, stdout, stderr in rows for output in (stdout, stderr)])
+        con.executemany("UPDATE extended_result SET stdout = NULL, stderr = NULL, stdout_id = ?, stderr_id = ? WHERE id = ?",
+            [(outputIds[2 * i], outputIds[2 * i + 1], row[0]) for i, row in enumerate(rows)])
+        con.commit()
+        lastId = rows[-1][0]
+        migrated += len(rows)
+        print(f"migrated {migrated} outputs")
+
+def collect_garbage(con: sqlite3.Connection):
+    """Deletes outputs no longer referenced, e.g. after experiments were re-ingested"""
+    cur = con.execute("""
+        DELETE FROM raw_output WHERE id NOT IN (
+            SELECT stdout_id FROM extended_result WHERE stdout_id IS NOT NULL
+            UNION SELECT stderr_id FROM extended_result WHERE stderr_id IS NOT NULL)
+    """)
+    con.commit()
+    print(f"deleted {cur.rowcount} unreferenced outputs")
+
+if __name__ == '__main__':
+    parser = ArgumentParser(prog="Manages the compressed raw output store of data.db")
+    parser.add_argument("command", choices=["migrate", "gc", "stats"], help="migrate: compress plain text outputs, gc: delete unreferenced outputs, stats: print storage statistics")
+    parser.add_argument("--db", help="Path to the database", default="data.db")
+    parser.add_argument("--codec", help="Compression used for migrated outputs", choices=list(CODECS.keys()), default="zlib")
+    parser.add_argument("-b", "--batch-size", help="Number of extended results migrated per transaction", default=10000, type=int)
+    parser.add_argument("--no-vacuum", help="Do not VACUUM after migrating, the file then keeps its size", action='store_true')
+    args = parser.parse_args()
+
+    con = sqlite3.connect(args.db)
+    fileSizeBefore = os.path.getsize(args.db)
+    if args.command == "migrate":
+        migrate(con, args.codec, args.batch_size)
+    elif args.command == "gc":
+        create_output_tables(con)
+        collect_garbage(con)
+    if args.command != "stats" and not args.no_vacuum:
+        print("vacuuming")
+        con.execute("VACUUM")
+    # stats only reads, a database without the output store has none of its outputs
+    tables = [name for (name,) in con.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+    extendedColumns = [row[1] for row in con.execute("PRAGMA table_info(extended_result)")]
+    plainCount, storedCount = 0, 0
+    if "extended_result" in tables:
+        storedFilter = "stdout_id IS NOT NULL" if "stdout_id" in extendedColumns else "0"
+        plainCount, storedCount = con.execute(f"SELECT COUNT(*) FILTER (WHERE stdout IS NOT NULL OR stderr IS NOT NULL), COUNT(*) FILTER (WHERE {storedFilter}) FROM extended_result").fetchone()
+    distinctCount, rawSize, compressedSize = 0, 0, 0
+    if "raw_output" in tables:
+        distinctCount, rawSize, compressedSize = con.execute("SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(length(data)), 0) FROM raw_output").fetchone()
+    print(f"extended results: {plainCount} plain text, {storedCount} in the output store")
+    print(f"output store: {distinctCount} distinct outputs, {rawSize} bytes raw, {compressedSize} bytes compressed")
+    fileSizeAfter = os.path.getsize(args.db)
+    if args.command != "stats":
+        print(f"database file: {fileSizeBefore} -> {fileSizeAfter} bytes ({100 * (1 - fileSizeAfter / max(fileSizeBefore, 1)):.1f}% smaller)")
+    else:
+        print(f"database file: {fileSizeAfter} bytes, {database_size(con)} bytes in use")
+    con.close()
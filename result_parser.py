@@ -1,7 +1,7 @@
 
 from enum import Enum
 import re
-from typing import Iterable, Optional, Self
+from typing import Any, AnyStr, Callable, Dict, Iterable, List, Optional, Self, Tuple, Union
 
 QUERY_SATISFIED = "Query is satisfied"
 QUERY_UNSATISFIED = "Query is NOT satisfied"
@@ -33,18 +33,110 @@ class QueryInstance:
         return f"{self.model_name}:{self.query_name}:{self.query_index}"
 
 class OutputMatch:
-    def __init__(self, name: str, category: str, strategy: str, query_index: int, outResult: str, errResult: str):
+    def __init__(self, name: str, category: str, strategy: str, query_index: int, outResult: AnyStr, errResult: AnyStr, outSpan: Optional[Tuple[int, int]] = None, errSpan: Optional[Tuple[int, int]] = None):
         self.name = name
         self.category = category
         self.strategy = strategy.replace("-", "_")
         self.query_index = query_index
         self.outResult = outResult
         self.errResult = errResult
+        self.outSpan = outSpan
+        self.errSpan = errSpan
 
 pattern = r"#{6}\s+RUNNING\s+([^_]+)_([^\.]+)\.xml_([A-Za-z]+)\s+X\s+([0-9]+)\s+#{6}([^#]+)"
 large_pattern= r"#{6}\s+RUNNING\s+([^\s]+)\s+X\s+([^\s]+)\s+X\s+([^\s]+)\s+X\s+([0-9]+)\s+#{6}([^#]+)"
+compiled_patterns = {
+    str: (re.compile(pattern), re.compile(large_pattern)),
+    bytes: (re.compile(pattern.encode()), re.compile(large_pattern.encode()))
+}
+
+class Metric:
+    """
+    A value read from the out or err segment of a query. The first capturing
+    group of the pattern is passed to convert, which receives bytes or str
+    depending on what the output was read as.
+    """
+    def __init__(self, name: str, stream: str, pattern: str, convert: Callable[[AnyStr], Any] = float):
+        self.name = name
+        self.stream = stream
+        self.pattern = pattern
+        self.convert = convert
+
+class StatusMarker:
+    """A literal in the out or err segment of a query that decides its status and result"""
+    def __init__(self, stream: str, text: str, status: Status, result: Optional[QueryResult] = None):
+        self.stream = stream
+        self.text = text
+        self.status = status
+        self.result = result
+
+class MetricExtractor:
+    """
+    Extracts all registered metrics and the status of a segment. Patterns are
+    compiled once per text type, so bytes can be searched without decoding
+    them. Only the first occurrence of a metric is kept, and status markers are
+    tried in registration order until one is found.
+    """
+    def __init__(self):
+        self.metrics: List[Metric] = []
+        self.markers: List[StatusMarker] = []
+        self.compiled: Dict[type, Tuple[Dict[str, list], list]] = dict()
+
+    def register(self, item: Union[Metric, StatusMarker]):
+        if isinstance(item, Metric):
+            self.metrics.append(item)
+        else:
+            self.markers.append(item)
+        self.compiled.clear()
+
+    def compile(self, kind: type) -> Tuple[Dict[str, List[Tuple[str, Callable, Callable]]], List[Tuple[str, AnyStr, StatusMarker]]]:
+        if kind not in self.compiled:
+            metrics: Dict[str, list] = { "out": [], "err": [] }
+            for metric in self.metrics:
+                metrics[metric.stream].append((metric.name, re.compile(metric.pattern.encode() if kind is bytes else metric.pattern).search, metric.convert))
+            markers = [(marker.stream, marker.text.encode() if kind is bytes else marker.text, marker) for marker in self.markers]
+            self.compiled[kind] = (metrics, markers)
+        return self.compiled[kind]
+
+    def extract(self, out: AnyStr, err: AnyStr) -> Tuple[Dict[str, Any], Status, Optional[QueryResult]]:
+        metrics, markers = self.compile(type(out))
+        values: Dict[str, Any] = dict()
+        for stream, text in (("out", out), ("err", err)):
+            for name, search, convert in metrics[stream]:
+                match = search(text)
+                if match is not None:
+                    values[name] = convert(match[1])
+        for stream, text, marker in markers:
+            if text in (out if stream == "out" else err):
+                return values, marker.status, marker.result
+        return values, Status.Error, None
+
+defaultExtractor = MetricExtractor()
+defaultExtractor.register(Metric("time", "err", r"TOTAL_TIME: ([0-9]+(?:\.[0-9]+)?)s"))
+defaultExtractor.register(Metric("maxMemory", "err", r"MAX_MEMORY: ([0-9]+)kB"))
+defaultExtractor.register(Metric("states", "out", r"passed states: ([0-9]+)"))
+defaultExtractor.register(Metric("verificationTime", "out", r"Spent ([0-9]+(?:\.[0-9]+)?) on verification"))
+defaultExtractor.register(Metric("colorReductionTime", "out", r"Colored structural reductions computed in ([0-9]+(?:\.[0-9]+)?(?:e(?:\+|\-)[0-9]+)?) seconds"))
+defaultExtractor.register(StatusMarker("out", QUERY_SATISFIED, Status.Answered, QueryResult.Satisfied))
+defaultExtractor.register(StatusMarker("out", QUERY_UNSATISFIED, Status.Answered, QueryResult.Unsatisfied))
+defaultExtractor.register(StatusMarker("out", QUERY_TIMEOUT, Status.Timeout))
+defaultExtractor.register(StatusMarker("out", TOO_MANY_BINDINGS, Status.TooManyBindings))
+defaultExtractor.register(StatusMarker("err", OUT_OF_MEMORY, Status.OutOfMemory))
+
+class ResultSource:
+    """The archive and the byte offsets in it of the .out and .err files a result was parsed from"""
+    def __init__(self, archivePath: str, outMember: str, outDataOffset: int, errMember: str, errDataOffset: int):
+        self.archivePath = archivePath
+        self.outMember = outMember
+        self.outDataOffset = outDataOffset
+        self.errMember = errMember
+        self.errDataOffset = errDataOffset
+
+def decodeText(text: AnyStr) -> str:
+    return text.decode() if isinstance(text, bytes) else text
+
 class Result:
-    def __init__(self, query_instance: QueryInstance, time: Optional[float], status: Status, result: Optional[QueryResult], maxMemory: Optional[float], states: Optional[int], strategy: str, colorReductionTime: Optional[float], verificationTime: Optional[float], fullOut: str, fullErr: str):
+    def __init__(self, query_instance: QueryInstance, time: Optional[float], status: Status, result: Optional[QueryResult], maxMemory: Optional[float], states: Optional[int], strategy: str, colorReductionTime: Optional[float], verificationTime: Optional[float], fullOut: AnyStr, fullErr: AnyStr, metrics: Optional[Dict[str, Any]] = None):
         self.query_instance = query_instance
         self.time = time
         self.status = status
@@ -52,88 +144,77 @@ class Result:
         self.maxMemory = maxMemory
         self.states = states
         self.strategy = strategy
-        self.fullOut = fullOut
-        self.fullErr = fullErr
+        # kept as read; bytes are only decoded if the text is asked for
+        self.rawOut = fullOut
+        self.rawErr = fullErr
         self.colorReductionTime = colorReductionTime
         self.verificationTime = verificationTime
+        self.metrics = metrics if metrics is not None else dict()
+        # position of the segments in the .out and .err files they were read from
+        self.outSpan: Optional[Tuple[int, int]] = None
+        self.errSpan: Optional[Tuple[int, int]] = None
+        # where those files are stored, set by whoever read them
+        self.source: Optional[ResultSource] = None
+
+    @property
+    def fullOut(self) -> str:
+        return decodeText(self.rawOut)
+
+    @property
+    def fullErr(self) -> str:
+        return decodeText(self.rawErr)
 
     @staticmethod
-    def fromOutErr(out: str, err: str, is_large_job: bool) -> Iterable[Self]:
+    def fromOutErr(out: AnyStr, err: AnyStr, is_large_job: bool, extractor: MetricExtractor = defaultExtractor) -> Iterable[Self]:
+        compiled_pattern, compiled_large_pattern = compiled_patterns[type(out)]
         if is_large_job:
-            matches = zip(re.finditer(large_pattern, out), re.finditer(large_pattern, err))
+            matches = zip(compiled_large_pattern.finditer(out), compiled_large_pattern.finditer(err))
             
             return map(
-                lambda t: Result.__fromOutErrSingle(t),
+                lambda t: Result.__fromOutErrSingle(t, extractor),
                 map(lambda t: OutputMatch(
-                    t[0].group(1),
-                    t[0].group(3),
-                    t[0].group(2),
-                    int(t[0].group(4)),
-                    t[0].group(5),
-                    t[1].group(5)
+                    decodeText(t[0][1]),
+                    decodeText(t[0][3]),
+                    decodeText(t[0][2]),
+                    int(t[0][4]),
+                    t[0][5],
+                    t[1][5],
+                    t[0].span(5),
+                    t[1].span(5)
                 ), matches)
             )
         else:
-            matches = zip(re.finditer(pattern, out), re.finditer(pattern, err))
+            matches = zip(compiled_pattern.finditer(out), compiled_pattern.finditer(err))
             return map(
-                lambda t: Result.__fromOutErrSingle(t),
+                lambda t: Result.__fromOutErrSingle(t, extractor),
                 map(lambda t: OutputMatch(
-                    t[0].group(1),
-                    t[0].group(2),
-                    t[0].group(3),
-                    int(t[0].group(4)),
-                    t[0].group(5),
-                    t[1].group(5)
+                    decodeText(t[0][1]),
+                    decodeText(t[0][2]),
+                    decodeText(t[0][3]),
+                    int(t[0][4]),
+                    t[0][5],
+                    t[1][5],
+                    t[0].span(5),
+                    t[1].span(5)
                 ), matches)
             )
 
     @staticmethod
-    def __fromOutErrSingle(outputMatch: OutputMatch) -> Self:
+    def __fromOutErrSingle(outputMatch: OutputMatch, extractor: MetricExtractor) -> Self:
         name = outputMatch.name
         category = outputMatch.category
         strategy = outputMatch.strategy
         query_index = outputMatch.query_index
-        outResult = outputMatch.outResult
-        errResult = outputMatch.errResult
-        timeMatch = re.search(r"TOTAL_TIME: ([0-9]+(\.[0-9]+)?)s", errResult)
-        memoryMatch = re.search("MAX_MEMORY: ([0-9]+)kB", errResult)
-        passedListMatch = re.search(r"passed states: ([0-9]+)", outResult)
-        verificationTimeMatch = re.search(r"Spent ([0-9]+(\.[0-9]+)?) on verification", outResult)
-        colorReductionTimeMatch = re.search(r"Colored structural reductions computed in ([0-9]+(\.[0-9]+)?(e(\+|\-)[0-9]+)?) seconds", outResult)
-        time = None
-        status = Status.Error
-        maxMemory = None
-        result = None
-        colorReductionTime = None
-        verificationTime = None
-        exploredCount = None
-        if (verificationTimeMatch is not None):
-            verificationTime = float(verificationTimeMatch.group(1))
-        if (timeMatch != None):
-            time = float(timeMatch.group(1))
-        if (memoryMatch != None):
-            maxMemory = float(memoryMatch.group(1))
-        if (colorReductionTimeMatch != None):
-            colorReductionTime = float(colorReductionTimeMatch.group(1))
-        if (passedListMatch is not None):
-            exploredCount = float(passedListMatch.group(1))
+        values, status, result = extractor.extract(outputMatch.outResult, outputMatch.errResult)
+        time = values.get("time")
+        maxMemory = values.get("maxMemory")
+        colorReductionTime = values.get("colorReductionTime")
+        verificationTime = values.get("verificationTime")
+        exploredCount = values.get("states")
         if (verificationTime is None and exploredCount is not None):
             verificationTime = time - (colorReductionTime if colorReductionTime is not None else 0)
-        if (QUERY_SATISFIED in outResult):
-            status = Status.Answered
-            result = QueryResult.Satisfied
-        elif (QUERY_UNSATISFIED in outResult):
-            status = Status.Answered
-            result = QueryResult.Unsatisfied
-        elif (QUERY_TIMEOUT in outResult):
-            status = Status.Timeout
-        elif (TOO_MANY_BINDINGS in outResult):
-            status = Status.TooManyBindings
-        elif (OUT_OF_MEMORY in errResult):
-            status = Status.OutOfMemory
-        else:
-            status = Status.Error
         
-        return Result(QueryInstance(name, category, query_index), time, status, result, maxMemory, exploredCount, strategy, colorReductionTime, verificationTime, outputMatch.outResult, outputMatch.errResult)
-        
-
+        parsed = Result(QueryInstance(name, category, query_index), time, status, result, maxMemory, exploredCount, strategy, colorReductionTime, verificationTime, outputMatch.outResult, outputMatch.errResult, values)
+        parsed.outSpan = outputMatch.outSpan
+        parsed.errSpan = outputMatch.errSpan
+        return parsed
@@ -0,0 +1,27 @@
+from pathlib import Path
+from typing import Set, Tuple
+
+from result_parser import compiled_patterns
+
+TOTAL_TIME = "TOTAL_TIME: "
+
+def completed_queries(outputPath: Path, is_large_job: bool) -> Set[Tuple[str, str, int]]:
+    """
+    The (model, category, index) of every query with a complete result in the
+    .err files of an output folder. A query is complete when /usr/bin/time
+    reported its TOTAL_TIME, a query whose job hit its time limit or lost its
+    node never gets one.
+    """
+    compiled_pattern, compiled_large_pattern = compiled_patterns[str]
+    completed = set()
+    for errPath in outputPath.glob("*.err"):
+        err = errPath.read_text(errors="replace")
+        if (is_large_job):
+            for match in compiled_large_pattern.finditer(err):
+                if (TOTAL_TIME in match[5]):
+                    completed.add((match[1], match[3], int(match[4])))
+        else:
+            for match in compiled_pattern.finditer(err):
+                if (TOTAL_TIME in match[5]):
+                    completed.add((match[1], match[2], int(match[4])))
+    return completed
@@ -0,0 +1,244 @@
+#!/usr/bin/python3
+from argparse import ArgumentParser
+import math
+import re
+import sqlite3
+from statistics import linear_regression, median
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from analysis_helper import Experiment, getExperimentId
+from job_packing import QueryKey
+from schema import STATUS_CODES, require_schema
+
+# places, transitions and colour sets of a net, as the catalogue counts them
+ModelSize = Tuple[Optional[int], Optional[int], Optional[int]]
+
+# the numeric tail of an MCC model name is its instance parameter, e.g. Philosophers-COL-000010
+FAMILY_PATTERN = re.compile(r"^(.*-COL-[^0-9]*)([0-9]+)$")
+# the size fit of a category needs at least this many models of a known size
+MIN_SIZE_MODELS = 8
+
+class Observation:
+    """A result of a previous experiment, the time capped at the timeout and timeouts counting as it"""
+    def __init__(self, experimentId: int, configuration: str, key: QueryKey, time: float, memory: Optional[float]):
+        self.experimentId = experimentId
+        self.configuration = configuration
+        self.key = key
+        self.time = time
+        self.memory = memory
+
+class Prediction:
+    """Predicted time in seconds and peak memory in kB of a query, and the level of the predictor they came from"""
+    def __init__(self, time: float, memory: Optional[float], source: str):
+        self.time = time
+        self.memory = memory
+        self.source = source
+
+def load_observations(con: sqlite3.Connection, timeout: float, experimentIds: Optional[Iterable[int]] = None) -> List[Observation]:
+    """The results of the experiments, of all experiments when none are given"""
+    condition = ""
+    params: list = []
+    if (experimentIds is not None):
+        experimentIds = list(experimentIds)
+        condition = f"WHERE qr.experiment_id IN ({', '.join('?' * len(experimentIds))})"
+        params = experimentIds
+    observations = []
+    for experimentId, configuration, modelName, queryName, queryIndex, statusCode, time, memory in con.execute(f"""
+        SELECT qr.experiment_id, e.search_strategy, qi.model_name, qi.query_name, qi.query_index, qr.status_code, qr.time, qr.max_memory
+        FROM query_result qr
+            JOIN query_instance qi ON qi.id == qr.query_instance_id
+            JOIN experiment e ON e.id == qr.experiment_id
+        {condition}
+    """, params):
+        if (statusCode == STATUS_CODES["Timeout"] or time is None):
+            time = timeout
+        observations.append(Observation(experimentId, configuration, (modelName, queryName, int(queryIndex)), min(time, timeout), memory))
+    return observations
+
+def model_family(modelName: str) -> Optional[Tuple[str, int]]:
+    """The family and instance parameter of an MCC model name, None when it has no numeric tail"""
+    match = FAMILY_PATTERN.match(modelName)
+    if (match is None):
+        return None
+    return match[1], int(match[2])
+
+def size_features(size: ModelSize) -> Optional[List[float]]:
+    if (any(count is None for count in size)):
+        return None
+    return [1.0, *(math.log1p(count) for count in size)]
+
+def log_value(value: float) -> float:
+    # sub-centisecond times are all the same to a scheduler
+    return math.log(max(value, 0.01))
+
+class MetricModel:
+    """
+    Predicts one metric of a query, trying in order: the median of the query
+    under the same configuration, the median of the query under any
+    configuration, the median of the other queries of the model in the same
+    category, a log-log fit over the instance parameter of the models of the
+    same family, a log-linear fit over the net size of the models and the
+    median of the category.
+    """
+    def __init__(self, values: Iterable[Tuple[str, QueryKey, float]], modelSizes: Dict[str, ModelSize]):
+        byConfiguration: Dict[Tuple[str, QueryKey], List[float]] = {}
+        byInstance: Dict[QueryKey, List[float]] = {}
+        for configuration, key, value in values:
+            byConfiguration.setdefault((configuration, key), []).append(value)
+            byInstance.setdefault(key, []).append(value)
+        self.configurationMedians = {key: median(values) for key, values in byConfiguration.items()}
+        self.instanceMedians = {key: median(values) for key, values in byInstance.items()}
+
+        byModel: Dict[Tuple[str, str], List[float]] = {}
+        for (modelName, category, _), value in self.instanceMedians.items():
+            byModel.setdefault((modelName, category), []).append(value)
+        self.modelMedians = {key: median(values) for key, values in byModel.items()}
+
+        families: Dict[Tuple[str, str], List[Tuple[float, float]]] = {}
+        sizes: Dict[str, Tuple[List[List[float]], List[float]]] = {}
+        byCategory: Dict[str, List[float]] = {}
+        for (modelName, category), value in self.modelMedians.items():
+            byCategory.setdefault(category, []).append(value)
+            family = model_family(modelName)
+            if (family is not None):
+                families.setdefault((family[0], category), []).append((math.log1p(family[1]), log_value(value)))
+            features = size_features(modelSizes.get(modelName, (None, None, None)))
+            if (features is not None):
+                rows, targets = sizes.setdefault(category, ([], []))
+                rows.append(features)
+                targets.append(log_value(value))
+        self.familyFits: Dict[Tuple[str, str], Tuple[float, float]] = {}
+        for key, points in families.items():
+            xs = [x for x, _ in points]
+            ys = [y for _, y in points]
+            if (len(set(xs)) >= 2):
+                self.familyFits[key] = linear_regression(xs, ys)
+            else:
+                self.familyFits[key] = (0.0, sum(ys) / len(ys))
+        self.sizeFits: Dict[str, np.ndarray] = {}
+        for category, (rows, targets) in sizes.items():
+            if (len(rows) >= MIN_SIZE_MODELS):
+                self.sizeFits[category] = np.linalg.lstsq(np.array(rows), np.array(targets), rcond=None)[0]
+        self.categoryMedians = {category: median(values) for category, values in byCategory.items()}
+
+    def predict(self, configuration: Optional[str], key: QueryKey, size: ModelSize) -> Optional[Tuple[float, str]]:
+        modelName, category, _ = key
+        if ((configuration, key) in self.configurationMedians):
+            return self.configurationMedians[(configuration, key)], "configuration"
+        if (key in self.instanceMedians):
+            return self.instanceMedians[key], "instance"
+        if ((modelName, category) in self.modelMedians):
+            return self.modelMedians[(modelName, category)], "model"
+        family = model_family(modelName)
+        if (family is not None and (family[0], category) in self.familyFits):
+            slope, intercept = self.familyFits[(family[0], category)]
+            return math.exp(intercept + slope * math.log1p(family[1])), "family"
+        features = size_features(size)
+        if (features is not None and category in self.sizeFits):
+            return math.exp(float(np.dot(self.sizeFits[category], features))), "size"
+        if (category in self.categoryMedians):
+            return self.categoryMedians[category], "category"
+        return None
+
+class RuntimePredictor:
+    """
+    Predicts the time and peak memory of query instances from the results of
+    previous experiments, see MetricModel for how. Times are capped at the
+    timeout, and a query nothing is known of is predicted to time out.
+    """
+    def __init__(self, observations: Iterable[Observation], timeout: float, modelSizes: Optional[Dict[str, ModelSize]] = None):
+        observations = list(observations)
+        self.timeout = timeout
+        self.modelSizes = modelSizes or {}
+        self.time = MetricModel(((observation.configuration, observation.key, observation.time) for observation in observations), self.modelSizes)
+        self.memory = MetricModel(((observation.configuration, observation.key, observation.memory) for observation in observations if observation.memory is not None), self.modelSizes)
+
+    def predict(self, modelName: str, category: str, queryIndex: int, configuration: Optional[str] = None) -> Prediction:
+        key = (modelName, category, queryIndex)
+        size = self.modelSizes.get(modelName, (None, None, None))
+        time = self.time.predict(configuration, key, size)
+        memory = self.memory.predict(configuration, key, size)
+        if (time is None):
+            return Prediction(self.timeout, None if memory is None else memory[0], "timeout")
+        return Prediction(min(time[0], self.timeout), None if memory is None else memory[0], time[1])
+
+def load_model_sizes(catalogue: sqlite3.Connection) -> Dict[str, ModelSize]:
+    return {name: (places, transitions, colourSets) for name, places, transitions, colourSets in catalogue.execute("SELECT name, places, transitions, colour_sets FROM model")}
+
+def configuration_name(successorGenerator: Optional[str], strategy: Optional[str]) -> str:
+    """The search_strategy of the experiment a create_big_jobs.py run becomes"""
+    return f"{successorGenerator or 'default'}_{strategy or 'default'}"
+
+def evaluate(observations: List[Observation], timeout: float, modelSizes: Dict[str, ModelSize]) -> List[Tuple[int, int, float, float, float, float]]:
+    """
+    Leave one experiment out: the results of every experiment predicted from
+    the other experiments. Per experiment the number of results, the median
+    absolute error in seconds, the fraction predicted within a factor 2 and
+    the predicted and measured total time.
+    """
+    rows = []
+    for experimentId in sorted(set(observation.experimentId for observation in observations)):
+        predictor = RuntimePredictor((observation for observation in observations if observation.experimentId != experimentId), timeout, modelSizes)
+        heldOut = [observation for observation in observations if observation.experimentId == experimentId]
+        predicted = [predictor.predict(*observation.key, observation.configuration).time for observation in heldOut]
+        errors = [abs(prediction - observation.time) for prediction, observation in zip(predicted, heldOut)]
+        withinFactor = sum(max(prediction, 0.01) / max(observation.time, 0.01) <= 2 and max(observation.time, 0.01) / max(prediction, 0.01) <= 2 for prediction, observation in zip(predicted, heldOut))
+        rows.append((experimentId, len(heldOut), median(errors), withinFactor / len(heldOut), sum(predicted), sum(observation.time for observation in heldOut)))
+    return rows
+
+if __name__ == '__main__':
+    from catalogue import get_models, get_query_counts, load_catalogue
+
+    parser = ArgumentParser(prog="Predicts the CPU time of a create_big_jobs.py run from the results in data.db")
+    parser.add_argument("--db", help="Path to the database of previous experiments", default="data.db")
+    parser.add_argument("--experiments", help="comma seperated list of the experiments to learn from in <name>-<strategy> format, all experiments when not given")
+    parser.add_argument("--evaluate", help="Print the accuracy of predicting each experiment from the others instead", action='store_true')
+    # the options of the planned create_big_jobs.py run
+    parser.add_argument('-m', '--models', help="Path to directory containing the mcc models", default='/nfs/petrinet/mcc/2024/colour/')
+    parser.add_argument('--catalogue', help="Path to the model and query catalogue, updated from --models before predicting", default='catalogue.db')
+    parser.add_argument('-S', '--strategy')
+    parser.add_argument('--colored-successor-generator', help="The argument supplied to --colored-successor-generator")
+    parser.add_argument('-t', '--timeout', help="The timeout for each query in minutes", type=int, default=5)
+    parser.add_argument("-c", "--categories", help="comma seperated list of jobs", default="ReachabilityCardinality,ReachabilityFireability,ReachabilityDeadlock")
+    args = parser.parse_args()
+
+    timeout = args.timeout * 60
+    con = sqlite3.connect(args.db)
+    require_schema(con, args.db)
+    experimentIds = None
+    if (args.experiments is not None):
+        experimentIds = [getExperimentId(con, Experiment.fromFormat(experiment)) for experiment in args.experiments.split(",")]
+    observations = load_observations(con, timeout, experimentIds)
+    catalogue = load_catalogue(args.catalogue, args.models)
+    modelSizes = load_model_sizes(catalogue)
+
+    if (args.evaluate):
+        names = {id: f"{name}-{strategy}" for id, name, strategy in con.execute("SELECT id, name, search_strategy FROM experiment")}
+        header = ["experiment", "results", "median error (s)", "within 2x", "predicted (h)", "measured (h)"]
+        rows = [[names[id], str(count), f"{error:.2f}", f"{within:.1%}", f"{predicted / 3600:.2f}", f"{measured / 3600:.2f}"] for id, count, error, within, predicted, measured in evaluate(observations, timeout, modelSizes)]
+        widths = [max(len(row[i]) for row in [header, *rows]) for i in range(len(header))]
+        for row in [header, *rows]:
+            print("  ".join(value.ljust(width) if i == 0 else value.rjust(width) for i, (value, width) in enumerate(zip(row, widths))))
+        exit(0)
+
+    predictor = RuntimePredictor(observations, timeout, modelSizes)
+    configuration = configuration_name(args.colored_successor_generator, args.strategy)
+    categories = set(args.categories.split(","))
+    predictions: List[Prediction] = []
+    for modelName in get_models(catalogue):
+        queryCounts = get_query_counts(catalogue, modelName)
+        queryCounts["ReachabilityDeadlock"] = 1
+        for category, queryCount in queryCounts.items():
+            if (category in categories):
+                predictions.extend(predictor.predict(modelName, category, queryIndex, configuration) for queryIndex in range(1, queryCount + 1))
+    bySource: Dict[str, int] = {}
+    for prediction in predictions:
+        bySource[prediction.source] = bySource.get(prediction.source, 0) + 1
+    memories = [prediction.memory for prediction in predictions if prediction.memory is not None]
+    print(f"{len(predictions)} queries of {configuration}, predicted by {', '.join(f'{source}: {count}' for source, count in bySource.items())}")
+    print(f"predicted {sum(prediction.time for prediction in predictions) / 3600:.2f} CPU hours, at most {len(predictions) * timeout / 3600:.2f} with every query timing out")
+    if (len(memories) > 0):
+        print(f"predicted peak memory: median {median(memories) / 1024:.0f} MB, largest {max(memories) / 1024:.0f} MB")
+    con.close()
@@ -7,11 +7,21 @@
 #SBATCH --ntasks=1
 #SBATCH --cpus-per-task=2
 
+# array tasks export the assignments of their line of the task manifest
+if [ -n "$SLURM_ARRAY_TASK_ID" ] && [ -n "$TASK_MANIFEST" ]; then
+    TASK_LINE=$(sed -n "$((ARRAY_OFFSET + SLURM_ARRAY_TASK_ID + 1))p" "$TASK_MANIFEST")
+    IFS=$'\t' read -r -a TASK_ASSIGNMENTS <<< "$TASK_LINE"
+    for TASK_ASSIGNMENT in "${TASK_ASSIGNMENTS[@]}"; do
+        export "$TASK_ASSIGNMENT"
+    done
+fi
+
 let "m=1024*1024*15"
 ulimit -v $m
-for QUERY_INDEX in $(seq $QUERY_COUNT) ;
+# resumed jobs only run the QUERY_INDICES missing a result
+for QUERY_INDEX in ${QUERY_INDICES:-$(seq $QUERY_COUNT)} ;
 do
-    line="\n###### RUNNING $SLURM_JOB_NAME X $QUERY_INDEX ######"
+    line="\n###### RUNNING ${TASK_NAME:-$SLURM_JOB_NAME} X $QUERY_INDEX ######"
     echo -e "$line"
     echo -e "$line" >&2
     /usr/bin/time --format="TOTAL_TIME: %es\nMAX_MEMORY: %MkB" timeout 60 $VERIFYPN_PATH -x $QUERY_INDEX $MODEL_FILE_PATH $QUERY_FILE_PATH $VERIFYPN_OPTIONS
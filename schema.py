@@ -0,0 +1,124 @@
+#!/usr/bin/python3
+from argparse import ArgumentParser
+import sqlite3
+import sys
+
+from output_store import create_output_tables
+from sketch import create_sketch_tables, update_sketches
+
+# codes of the status and result columns, in the order of result_parser.Status and QueryResult
+STATUS_CODES = {"Answered": 0, "Timeout": 1, "TooManyBindings": 2, "OutOfMemory": 3, "Error": 4}
+RESULT_CODES = {"Satisfied": 0, "Unsatisfied": 1}
+
+def code_expression(column: str, codes: dict) -> str:
+    return "CASE " + column + " " + " ".join(f"WHEN '{name}' THEN {code}" for name, code in codes.items()) + " END"
+
+def try_unique_index(con: sqlite3.Connection, name: str, table: str, columns: str):
+    try:
+        con.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+    except sqlite3.IntegrityError:
+        print(f"{table} contains duplicate ({columns}) rows, not adding the unique index {name}")
+
+def remove_duplicate_results(con: sqlite3.Connection):
+    """Keeps only the last written result of every (experiment, query instance), as the writer does since it replaces results"""
+    duplicates = "SELECT id FROM query_result WHERE id NOT IN (SELECT MAX(id) FROM query_result GROUP BY experiment_id, query_instance_id)"
+    tables = [name for (name,) in con.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+    for table in ["extended_result", "raw_output_reference"]:
+        if (table in tables):
+            con.execute(f"DELETE FROM {table} WHERE query_result_id IN ({duplicates})")
+    cur = con.execute(f"DELETE FROM query_result WHERE id IN ({duplicates})")
+    if (cur.rowcount > 0):
+        print(f"removed {cur.rowcount} duplicate results")
+
+QUERY_RESULT_COLUMNS = "id, experiment_id, query_instance_id, time, status, result, max_memory, states, color_reduction_time, verification_time"
+
+def migrate_to_1(con: sqlite3.Connection):
+    """Typed query_result with integer coded status and result, uniqueness constraints and the indexes of the report queries"""
+    remove_duplicate_results(con)
+    # query_result was created without column types, comparing its query_instance_id
+    # with the integer query_instance.id then applies an affinity that rules out its indexes.
+    # The codes are plain columns written by ResultWriter, sqlite does not use indexes
+    # containing generated columns as covering indexes
+    con.execute("DROP VIEW IF EXISTS extended_result_text")
+    con.execute("""
+    CREATE TABLE query_result_typed (
+        id INTEGER PRIMARY KEY,
+        experiment_id INTEGER,
+        query_instance_id INTEGER,
+        time REAL,
+        status TEXT,
+        result TEXT,
+        max_memory REAL,
+        states REAL,
+        color_reduction_time REAL,
+        verification_time REAL,
+        status_code INTEGER,
+        result_code INTEGER,
+        FOREIGN KEY(experiment_id) REFERENCES experiment(id),
+        FOREIGN KEY(query_instance_id) REFERENCES query_instance(id)
+    )
+    """)
+    con.execute(f"""
+    INSERT INTO query_result_typed ({QUERY_RESULT_COLUMNS}, status_code, result_code)
+        SELECT {QUERY_RESULT_COLUMNS}, {code_expression('status', STATUS_CODES)}, {code_expression('result', RESULT_CODES)} FROM query_result
+    """)
+    con.execute("DROP TABLE query_result")
+    con.execute("ALTER TABLE query_result_typed RENAME TO query_result")
+    create_output_tables(con)
+    con.execute("CREATE UNIQUE INDEX IF NOT EXISTS query_result_key ON query_result (experiment_id, query_instance_id)")
+    # covers the experiment filtered self-joins on query_instance_id of the reports
+    con.execute("CREATE INDEX IF NOT EXISTS query_result_cover ON query_result (experiment_id, query_instance_id, status_code, result_code, time, max_memory)")
+    try_unique_index(con, "query_instance_key", "query_instance", "model_name, query_name, query_index")
+    try_unique_index(con, "experiment_key", "experiment", "name, search_strategy")
+    con.execute("CREATE INDEX IF NOT EXISTS extended_result_query_result ON extended_result (query_result_id)")
+
+def migrate_to_2(con: sqlite3.Connection):
+    """Percentile sketches of every experiment's answered results, kept up to date by ResultWriter"""
+    create_sketch_tables(con)
+    update_sketches(con, [id for (id,) in con.execute("SELECT id FROM experiment")])
+
+def migrate_to_3(con: sqlite3.Connection):
+    """Result counts of every experiment by category, kept up to date by ResultWriter"""
+    # summary takes the codes from this module
+    from summary import create_summary_tables, update_summaries
+    create_summary_tables(con)
+    update_summaries(con, [id for (id,) in con.execute("SELECT id FROM experiment")])
+
+# MIGRATIONS[i] brings a database from user_version i to i + 1
+MIGRATIONS = [migrate_to_1, migrate_to_2, migrate_to_3]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+def migrate_schema(con: sqlite3.Connection):
+    """Applies the migrations a database created by generate_data.create_tables has not had yet"""
+    version = con.execute("PRAGMA user_version").fetchone()[0]
+    if (version >= SCHEMA_VERSION):
+        return
+    for migration in MIGRATIONS[version:]:
+        print(f"migrating data.db schema to version {version + 1}")
+        migration(con)
+        version += 1
+        con.execute(f"PRAGMA user_version = {version}")
+        con.commit()
+
+def require_schema(con: sqlite3.Connection, databasePath: str = "data.db"):
+    """
+    Exits when a database has not been migrated to the current schema. The
+    migrations rewrite query_result, so scripts that only read the database
+    leave them to generate_data.py and the migrate command of this script.
+    """
+    version = con.execute("PRAGMA user_version").fetchone()[0]
+    if (version < SCHEMA_VERSION):
+        sys.exit(f"{databasePath} has schema version {version}, version {SCHEMA_VERSION} is needed: run schema.py migrate --db {databasePath}")
+
+if __name__ == '__main__':
+    parser = ArgumentParser(prog="Migrates data.db to the current schema")
+    parser.add_argument("command", nargs="?", choices=["migrate", "version"], default="migrate", help="migrate: bring the database to the current schema, which can remove duplicate results, version: print its schema version")
+    parser.add_argument("--db", help="Path to the database", default="data.db")
+    args = parser.parse_args()
+    con = sqlite3.connect(args.db)
+    if (args.command == "migrate"):
+        # creates the tables added since the database was generated, then migrates
+        from generate_data import create_tables
+        create_tables(con)
+    print(f"schema version {con.execute('PRAGMA user_version').fetchone()[0]}")
+    con.close()
@@ -0,0 +1,242 @@
+#!/usr/bin/python3
+from argparse import ArgumentParser
+from array import array
+import math
+import random
+import sqlite3
+import struct
+from typing import Dict, Iterable, List, Optional, Tuple
+
+SKETCH_K = 200
+# metrics sketched over the answered results, as the expression computing them from query_result qr
+SKETCH_METRICS = {
+    "time": "qr.time",
+    "max_memory": "qr.max_memory",
+    # the throughputs create_other_cactus_data.py plots
+    "throughput": "CASE WHEN qr.states > 2 AND qr.verification_time > 0 AND qr.states / qr.verification_time > 1 THEN qr.states / qr.verification_time END",
+}
+HEADER = struct.Struct("<IQddI")
+
+class KLLSketch:
+    """
+    KLL quantile sketch. Values are kept in compactors, an item of level h
+    standing for 2^h values; a full compactor is sorted and every other item
+    moves up a level. Ranks are off by about count / k at the most, whatever
+    the number of values, and sketches of the same k merge into one that is
+    as accurate as a sketch of all their values.
+    """
+    def __init__(self, k: int = SKETCH_K):
+        self.k = k
+        self.count = 0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self.compactors: List[List[float]] = [[]]
+        self.maxSize = self.capacity(0)
+        self.size = 0
+        # a fixed seed keeps the sketches, and the reports made from them, reproducible
+        self.coin = random.Random(0)
+
+    def capacity(self, level: int) -> int:
+        return max(2, math.ceil(self.k * (2 / 3) ** (len(self.compactors) - level - 1)))
+
+    def grow(self):
+        self.compactors.append([])
+        self.maxSize = sum(self.capacity(level) for level in range(len(self.compactors)))
+
+    def update(self, value: float):
+        self.count += 1
+        self.minimum = min(self.minimum, value)
+        self.maximum = max(self.maximum, value)
+        self.compactors[0].append(value)
+        self.size += 1
+        if (self.size >= self.maxSize):
+            self.compress()
+
+    def compress(self):
+        for level in range(len(self.compactors)):
+            compactor = self.compactors[level]
+            if (len(compactor) < self.capacity(level)):
+                continue
+            if (level + 1 == len(self.compactors)):
+                self.grow()
+            compactor.sort()
+            # an odd item out stays behind
+            kept = [compactor.pop()] if len(compactor) % 2 == 1 else []
+            self.compactors[level + 1].extend(compactor[self.coin.randrange(2)::2])
+            self.compactors[level] = kept
+            self.size = sum(len(items) for items in self.compactors)
+            if (self.size < self.maxSize):
+                break
+
+    def merge(self, other: "KLLSketch"):
+        if (other.k != self.k):
+            raise ValueError(f"cannot merge sketches of k {self.k} and {other.k}")
+        while (len(self.compactors) < len(other.compactors)):
+            self.grow()
+        for level, items in enumerate(other.compactors):
+            self.compactors[level].extend(items)
+        self.count += other.count
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        self.size = sum(len(items) for items in self.compactors)
+        while (self.size >= self.maxSize):
+            self.compress()
+
+    def weighted(self) -> List[Tuple[float, int]]:
+        return sorted((value, 1 << level) for level, items in enumerate(self.compactors) for value in items)
+
+    def quantiles(self, fractions: List[float]) -> List[Optional[float]]:
+        """The values at the given fractions of the values, None for an empty sketch"""
+        if (self.count == 0):
+            return [None for _ in fractions]
+        items = self.weighted()
+        total = sum(weight for _, weight in items)
+        answers = []
+        for fraction in fractions:
+            if (fraction <= 0):
+                answers.append(self.minimum)
+                continue
+            if (fraction >= 1):
+                answers.append(self.maximum)
+                continue
+            target = fraction * total
+            cumulative = 0
+            for value, weight in items:
+                cumulative += weight
+                if (cumulative >= target):
+                    answers.append(value)
+                    break
+        return answers
+
+    def rank(self, value: float) -> float:
+        """The estimated number of values below value"""
+        items = self.weighted()
+        total = sum(weight for _, weight in items)
+        if (total == 0):
+            return 0
+        return self.count * sum(weight for itemValue, weight in items if itemValue < value) / total
+
+    def histogram(self, edges: List[float]) -> List[float]:
+        """Estimated number of values in [edges[i], edges[i + 1]), the last bin includes its upper edge"""
+        ranks = [self.rank(edge) for edge in edges[:-1]] + [self.count]
+        return [ranks[i + 1] - ranks[i] for i in range(len(edges) - 1)]
+
+    def toBytes(self) -> bytes:
+        data = bytearray(HEADER.pack(self.k, self.count, self.minimum, self.maximum, len(self.compactors)))
+        data += struct.pack(f"<{len(self.compactors)}I", *(len(items) for items in self.compactors))
+        for items in self.compactors:
+            data += array("d", items).tobytes()
+        return bytes(data)
+
+    @staticmethod
+    def fromBytes(data: bytes) -> "KLLSketch":
+        k, count, minimum, maximum, levels = HEADER.unpack_from(data)
+        sketch = KLLSketch(k)
+        sketch.count = count
+        sketch.minimum = minimum
+        sketch.maximum = maximum
+        lengths = struct.unpack_from(f"<{levels}I", data, HEADER.size)
+        offset = HEADER.size + 4 * levels
+        sketch.compactors = []
+        for length in lengths:
+            items = array("d")
+            items.frombytes(data[offset:offset + 8 * length])
+            sketch.compactors.append(items.tolist())
+            offset += 8 * length
+        sketch.maxSize = sum(sketch.capacity(level) for level in range(levels))
+        sketch.size = sum(lengths)
+        return sketch
+
+def create_sketch_tables(con: sqlite3.Connection):
+    """One sketch per experiment, query category (query_instance.query_name) and metric"""
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS metric_sketch (
+        experiment_id INTEGER,
+        category TEXT,
+        metric TEXT,
+        count INTEGER,
+        sketch BLOB,
+        PRIMARY KEY (experiment_id, category, metric),
+        FOREIGN KEY(experiment_id) REFERENCES experiment(id)
+    );
+    """)
+
+def update_sketches(con: sqlite3.Connection, experimentIds: Iterable[int]):
+    """
+    Rebuilds the sketches of the experiments from their answered results. It
+    only reads the rows of those experiments, ResultWriter calls it in the
+    transaction that commits an archive.
+    """
+    # schema imports this module for its migration
+    from schema import STATUS_CODES
+    for experimentId in experimentIds:
+        sketches: Dict[Tuple[str, str], KLLSketch] = {}
+        cur = con.execute(f"""
+            SELECT qi.query_name, {', '.join(SKETCH_METRICS.values())}
+            FROM main.query_result qr
+            JOIN query_instance qi ON qi.id = qr.query_instance_id
+            WHERE qr.experiment_id = ? AND qr.status_code = {STATUS_CODES['Answered']}
+        """, (experimentId,))
+        for category, *values in cur:
+            for metric, value in zip(SKETCH_METRICS, values):
+                if (value is None):
+                    continue
+                if ((category, metric) not in sketches):
+                    sketches[(category, metric)] = KLLSketch()
+                sketches[(category, metric)].update(value)
+        con.execute("DELETE FROM metric_sketch WHERE experiment_id = ?", (experimentId,))
+        con.executemany("INSERT INTO metric_sketch (experiment_id, category, metric, count, sketch) VALUES (?, ?, ?, ?, ?)",
+            [(experimentId, category, metric, sketch.count, sketch.toBytes()) for (category, metric), sketch in sketches.items()])
+
+def load_sketches(con: sqlite3.Connection, metric: str, category: Optional[str]) -> Dict[str, KLLSketch]:
+    """The sketches of the metric by experiment in <name>-<strategy> format, of all categories merged when category is None"""
+    sketches: Dict[str, KLLSketch] = {}
+    cur = con.execute("""
+        SELECT e.name, e.search_strategy, ms.sketch
+        FROM metric_sketch ms
+        JOIN experiment e ON e.id = ms.experiment_id
+        WHERE ms.metric = ? AND (? IS NULL OR ms.category = ?)
+        ORDER BY e.id, ms.category
+    """, (metric, category, category))
+    for name, strategy, data in cur:
+        experiment = f"{name}-{strategy}"
+        if (experiment not in sketches):
+            sketches[experiment] = KLLSketch.fromBytes(data)
+        else:
+            sketches[experiment].merge(KLLSketch.fromBytes(data))
+    return sketches
+
+if __name__ == '__main__':
+    parser = ArgumentParser(prog="Prints percentiles and histograms of the answered results from the metric sketches of one or more databases")
+    parser.add_argument("experiments", nargs='*', help="experiments in <name>-<strategy> format, all when none are given")
+    parser.add_argument("--db", help="Path to a database, given several times the sketches of the same experiment are merged", action='append')
+    parser.add_argument("--metric", help="Metric to report", choices=list(SKETCH_METRICS.keys()), default="time")
+    parser.add_argument("--category", help="Only results of this query category, e.g. ReachabilityCardinality")
+    parser.add_argument("--percentiles", help="Percentiles to print", nargs='+', type=float, default=[50, 90, 99])
+    parser.add_argument("--histogram", help="Also print a histogram of this many equal width bins", type=int)
+    parser.add_argument("--rebuild", help="Rebuild the sketches from query_result first", action='store_true')
+    args = parser.parse_args()
+    from schema import require_schema
+
+    merged: Dict[str, KLLSketch] = {}
+    for path in args.db or ["data.db"]:
+        con = sqlite3.connect(path)
+        require_schema(con, path)
+        if (args.rebuild):
+            update_sketches(con, [id for (id,) in con.execute("SELECT id FROM experiment")])
+            con.commit()
+        for experiment, sketch in load_sketches(con, args.metric, args.category).items():
+            if (experiment not in merged):
+                merged[experiment] = sketch
+            else:
+                merged[experiment].merge(sketch)
+        con.close()
+
+    for experiment in args.experiments or list(merged.keys()):
+        sketch = merged.get(experiment, KLLSketch())
+        values = sketch.quantiles([percentile / 100 for percentile in args.percentiles])
+        print(f"{experiment}: {sketch.count} answered, min {sketch.minimum if sketch.count > 0 else None}, " + ", ".join(f"p{percentile:g} {value}" for percentile, value in zip(args.percentiles, values)) + f", max {sketch.maximum if sketch.count > 0 else None}")
+        if (args.histogram is not None and sketch.count > 0):
+            edges = [sketch.minimum + (sketch.maximum - sketch.minimum) * i / args.histogram for i in range(args.histogram + 1)]
+            for low, high, count in zip(edges, edges[1:], sketch.histogram(edges)):
+                print(f"    {low:.6g} - {high:.6g}: {count:.0f}")
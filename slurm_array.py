@@ -0,0 +1,83 @@
+from itertools import groupby
+import math
+from pathlib import Path
+import subprocess
+from typing import Dict, List, Optional, Tuple
+
+# slurm's default MaxArraySize is 1001, array indices go up to one less
+DEFAULT_MAX_ARRAY_SIZE = 1000
+DEFAULT_THROTTLE = 100
+# minutes the time limits of array tasks are rounded up to
+DEFAULT_TIME_BUCKET = 5
+
+def write_manifest(manifestPath: Path, tasks: List[Dict[str, str]]):
+    """
+    One line per task of tab separated KEY=VALUE assignments, which the
+    sbatch scripts export before running the line of their array task.
+    """
+    with manifestPath.open("w") as f:
+        for task in tasks:
+            for key, value in task.items():
+                if ("\t" in value or "\n" in value or "=" in key):
+                    raise ValueError(f"{key}={value} cannot be written to a task manifest")
+            f.write("\t".join(f"{key}={value}" for key, value in task.items()) + "\n")
+
+def array_chunks(start: int, stop: int, maxArraySize: int) -> List[range]:
+    """The task lines of each array submitted for lines start to stop, slurm limits the number of tasks in an array"""
+    return [range(offset, min(offset + maxArraySize, stop)) for offset in range(start, stop, maxArraySize)]
+
+def bucket_time_limits(timeLimits: List[int], bucket: int) -> List[int]:
+    """
+    The time limits in minutes rounded up to multiples of bucket minutes. Every
+    distinct limit is submitted as arrays of its own, the buckets keep their
+    number down while a task reserves at most bucket - 1 minutes more than it needs.
+    """
+    return [math.ceil(timeLimit / bucket) * bucket for timeLimit in timeLimits]
+
+def submit_array(manifestPath: Path, tasks: List[Dict[str, str]], script: str, jobName: str, outputPath: Path, sbatchArgs: List[str], env: Dict[str, str], throttle: int, maxArraySize: int, go: bool, timeLimits: Optional[List[int]] = None):
+    """
+    Writes the tasks to the manifest and submits them as job arrays running
+    at most throttle tasks at a time, instead of one sbatch call per task.
+    Array task i of a submission runs line ARRAY_OFFSET + i of the manifest.
+    With the time limit of every task, the manifest is ordered by them and the
+    tasks of each distinct limit are submitted with it as their --time.
+    """
+    groups: List[Tuple[Optional[int], int, int]] = [(None, 0, len(tasks))]
+    if (timeLimits is not None):
+        order = sorted(range(len(tasks)), key=lambda index: timeLimits[index])
+        tasks = [tasks[index] for index in order]
+        sortedLimits = [timeLimits[index] for index in order]
+        groups = []
+        start = 0
+        for timeLimit, group in groupby(sortedLimits):
+            stop = start + len(list(group))
+            groups.append((timeLimit, start, stop))
+            start = stop
+    if (go):
+        write_manifest(manifestPath, tasks)
+    else:
+        print(f"FAKE WRITE {len(tasks)} tasks to {manifestPath}")
+    for timeLimit, start, stop in groups:
+        timeArgs = [] if timeLimit is None else ["--time", str(timeLimit)]
+        for chunk in array_chunks(start, stop, maxArraySize):
+            chunkEnv = env.copy()
+            chunkEnv["TASK_MANIFEST"] = str(manifestPath.absolute())
+            chunkEnv["ARRAY_OFFSET"] = str(chunk.start)
+            args = [
+                "sbatch",
+                "--job-name",
+                jobName,
+                "--array",
+                f"0-{len(chunk) - 1}%{throttle}",
+                "--output",
+                str(outputPath / f"{jobName}-%A_%a.out"),
+                "--error",
+                str(outputPath / f"{jobName}-%A_%a.err"),
+                *timeArgs,
+                *sbatchArgs,
+                script
+            ]
+            if (go):
+                subprocess.call(args, env=chunkEnv)
+            else:
+                print(args, f"ARRAY_OFFSET={chunk.start}")
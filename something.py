@@ -4,15 +4,19 @@ from io import TextIOWrapper
 from os import mkdir
 import sqlite3
 from typing import List
-from analysis_helper import Experiment, getExperimentId
+from analysis_helper import Experiment, applyTimeout, getExperimentId
+from schema import RESULT_CODES, STATUS_CODES, require_schema
 
 
 parser = ArgumentParser(prog="Generates cactus graphs for all given experiments")
 parser.add_argument("baseline")
 parser.add_argument("experiment")
+parser.add_argument("--timeout", help="Virtual timeout cut in seconds, slower results count as timeouts", type=float)
 args = parser.parse_args()
 
 con = sqlite3.connect("data.db")
+require_schema(con)
+applyTimeout(con, args.timeout)
 
 baseline = Experiment.fromFormat(args.baseline)
 experiment = Experiment.fromFormat(args.experiment)
@@ -28,10 +32,10 @@ def getData(con: sqlite3.Connection):
             WHERE lqr.experiment_id = ? 
             AND lqr.states IS NOT NULL
             AND rqr.states IS NOT NULL
-            AND lqr.status = 'Answered'
-            AND rqr.status = 'Answered'
-            AND (qi.query_type = 'ef' AND lqr.result = 'Unsatisfied'
-            OR qi.query_type = 'ag' AND lqr.result = 'Satisfied')
+            AND lqr.status_code = {STATUS_CODES['Answered']}
+            AND rqr.status_code = {STATUS_CODES['Answered']}
+            AND (qi.query_type = 'ef' AND lqr.result_code = {RESULT_CODES['Unsatisfied']}
+            OR qi.query_type = 'ag' AND lqr.result_code = {RESULT_CODES['Satisfied']})
 	        ORDER BY rqr.states ASC
     """, (baselineId, experimentId))
     return [(time[0], time[1]) for i, time in enumerate(cur.fetchall())]
@@ -0,0 +1,92 @@
+#!/usr/bin/python3
+from argparse import ArgumentParser
+import sqlite3
+from typing import Dict, Iterable, List, Optional
+
+from analysis_helper import applyTimeout
+from schema import RESULT_CODES, STATUS_CODES, require_schema
+
+# column of experiment_summary -> the count of query_result qr joined with query_instance qi it holds
+COUNTS = {
+    "results": "TRUE",
+    "answered": f"qr.status_code = {STATUS_CODES['Answered']}",
+    "timeouts": f"qr.status_code = {STATUS_CODES['Timeout']}",
+    "too_many_bindings": f"qr.status_code = {STATUS_CODES['TooManyBindings']}",
+    "out_of_memory": f"qr.status_code = {STATUS_CODES['OutOfMemory']}",
+    "errors": f"qr.status_code = {STATUS_CODES['Error']}",
+    "satisfied": f"qr.result_code = {RESULT_CODES['Satisfied']}",
+    "unsatisfied": f"qr.result_code = {RESULT_CODES['Unsatisfied']}",
+    # answers found by a counter example, the others needed the full state space
+    "counter_example": f"(qi.query_type = 'ef' AND qr.result_code = {RESULT_CODES['Satisfied']}) OR (qi.query_type = 'ag' AND qr.result_code = {RESULT_CODES['Unsatisfied']})",
+    "full_state_space": f"(qi.query_type = 'ag' AND qr.result_code = {RESULT_CODES['Satisfied']}) OR (qi.query_type = 'ef' AND qr.result_code = {RESULT_CODES['Unsatisfied']})",
+}
+
+def summary_query(table: str) -> str:
+    return f"""
+        SELECT qi.query_name, {', '.join(f'COUNT(*) FILTER (WHERE {condition})' for condition in COUNTS.values())}
+        FROM {table} qr
+            LEFT JOIN query_instance qi ON qi.id == qr.query_instance_id
+        WHERE qr.experiment_id = ?
+        GROUP BY qi.query_name
+    """
+
+class ExperimentSummary:
+    """The result counts of an experiment by query category (query_instance.query_name)"""
+    def __init__(self, categories: Dict[Optional[str], Dict[str, int]]):
+        self.categories = categories
+
+    def count(self, column: str, category: Optional[str] = None) -> int:
+        """The count of the category, of all categories when it is None"""
+        if (category is not None):
+            return self.categories.get(category, {}).get(column, 0)
+        return sum(counts[column] for counts in self.categories.values())
+
+def create_summary_tables(con: sqlite3.Connection):
+    con.execute(f"""
+    CREATE TABLE IF NOT EXISTS experiment_summary (
+        experiment_id INTEGER,
+        category TEXT,
+        {', '.join(f'{column} INTEGER' for column in COUNTS)},
+        PRIMARY KEY (experiment_id, category),
+        FOREIGN KEY(experiment_id) REFERENCES experiment(id)
+    );
+    """)
+
+def update_summaries(con: sqlite3.Connection, experimentIds: Iterable[int]):
+    """Recounts the results of the experiments, ResultWriter calls it in the transaction that commits an archive"""
+    for experimentId in experimentIds:
+        con.execute("DELETE FROM experiment_summary WHERE experiment_id = ?", (experimentId,))
+        con.executemany(f"INSERT INTO experiment_summary (experiment_id, category, {', '.join(COUNTS)}) VALUES (?, ?, {', '.join('?' * len(COUNTS))})",
+            [(experimentId, *row) for row in con.execute(summary_query("main.query_result"), (experimentId,))])
+
+def get_summary(con: sqlite3.Connection, experimentId: int, timeout: Optional[float] = None) -> ExperimentSummary:
+    """
+    The stored counts of the experiment. They count the results as measured,
+    with a timeout cut they are counted from query_result, which must then be
+    the view of analysis_helper.applyTimeout.
+    """
+    if (timeout is None):
+        rows = con.execute(f"SELECT category, {', '.join(COUNTS)} FROM experiment_summary WHERE experiment_id = ?", (experimentId,))
+    else:
+        rows = con.execute(summary_query("query_result"), (experimentId,))
+    return ExperimentSummary({category: dict(zip(COUNTS, counts)) for category, *counts in rows})
+
+if __name__ == '__main__':
+    parser = ArgumentParser(prog="Prints the result counts of every experiment in data.db")
+    parser.add_argument("--category", help="Only count results of this query category, e.g. ReachabilityCardinality")
+    parser.add_argument("--timeout", help="Virtual timeout cut in seconds, slower results count as timeouts, counted from query_result instead of the summary", type=float)
+    args = parser.parse_args()
+
+    con = sqlite3.connect("data.db")
+    require_schema(con)
+    applyTimeout(con, args.timeout)
+    columns: List[str] = list(COUNTS)
+    rows = []
+    for id, name, strategy in con.execute("SELECT id, name, search_strategy FROM experiment ORDER BY id").fetchall():
+        experimentSummary = get_summary(con, id, args.timeout)
+        rows.append([f"{name}-{strategy}", *(experimentSummary.count(column, args.category) for column in columns)])
+    header = ["experiment", *columns]
+    widths = [max(len(str(row[i])) for row in [header, *rows]) for i in range(len(header))]
+    for row in [header, *rows]:
+        print("  ".join(str(value).ljust(width) if i == 0 else str(value).rjust(width) for i, (value, width) in enumerate(zip(row, widths))))
+    con.close()
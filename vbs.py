@@ -0,0 +1,92 @@
+#!/usr/bin/python3
+from argparse import ArgumentParser
+from io import TextIOWrapper
+import os
+import sqlite3
+from typing import List
+
+import numpy as np
+
+from columnar_cache import ExperimentColumns, loadExperiments
+from schema import require_schema
+
+class VirtualBestSolver:
+    """
+    The fastest answer of every query instance over the experiments. The
+    experiments are folded in one at a time, keeping the best and second best
+    time and the winner per query instance, so memory does not grow with the
+    number of experiments. Ties go to the experiment given first.
+    """
+    def __init__(self, experiments: List[ExperimentColumns]):
+        instanceCount = len(experiments[0].status)
+        self.best = np.full(instanceCount, np.inf)
+        self.second = np.full(instanceCount, np.inf)
+        self.winner = np.full(instanceCount, -1, dtype=np.int32)
+        self.solved = np.zeros(len(experiments), dtype=np.int64)
+        for index, columns in enumerate(experiments):
+            answered = columns.answered()
+            self.solved[index] = np.count_nonzero(answered)
+            # answers without a time cannot win
+            times = np.where(answered & ~np.isnan(columns.time), columns.time, np.inf)
+            better = times < self.best
+            self.second = np.where(better, self.best, np.minimum(self.second, times))
+            self.winner = np.where(better, index, self.winner)
+            self.best = np.where(better, times, self.best)
+
+    def solvedMask(self) -> np.ndarray:
+        return np.isfinite(self.best)
+
+    def totalTime(self) -> float:
+        return float(self.best[self.solvedMask()].sum())
+
+    def wins(self, index: int) -> int:
+        return int(np.count_nonzero(self.winner == index))
+
+    def uniques(self, index: int) -> int:
+        """The query instances only this experiment answered, what the VBS solves less without it"""
+        return int(np.count_nonzero((self.winner == index) & np.isinf(self.second)))
+
+    def timeSaved(self, index: int) -> float:
+        """How much slower the VBS is without this experiment on the query instances the others also answered"""
+        won = (self.winner == index) & np.isfinite(self.second)
+        return float((self.second[won] - self.best[won]).sum())
+
+def writeWinners(out: TextIOWrapper, con: sqlite3.Connection, solver: VirtualBestSolver, names: List[str]):
+    out.write("model name,query name,query index,winner,time,runner-up time\n")
+    for id, modelName, queryName, queryIndex in con.execute("SELECT id, model_name, query_name, query_index FROM query_instance ORDER BY id"):
+        if (id >= len(solver.best) or solver.winner[id] < 0):
+            continue
+        second = solver.second[id]
+        out.write(f"{modelName},{queryName},{queryIndex},{names[solver.winner[id]]},{solver.best[id]},{second if np.isfinite(second) else ''}\n")
+
+def createTab(out: TextIOWrapper, times: np.ndarray):
+    out.write("counter\ttime\n")
+    for i, time in enumerate(np.sort(times).tolist()):
+        out.write(f"{i}\t{time}\n")
+
+if __name__ == '__main__':
+    parser = ArgumentParser(prog="Computes the virtual best solver of experiments in data.db, the fastest answer of every query instance")
+    parser.add_argument("experiments", nargs='*', help="experiments in <name>-<strategy> format, all experiments when none are given")
+    parser.add_argument("--timeout", help="Virtual timeout cut in seconds, slower results count as timeouts", type=float)
+    parser.add_argument("-o", "--output", help="Directory of the per query winners (winners.csv) and the cactus data of the VBS (VBS.tab)", default="vbs")
+    args = parser.parse_args()
+
+    con = sqlite3.connect("data.db")
+    require_schema(con)
+    names, columns = loadExperiments(con, args.experiments, args.timeout)
+    solver = VirtualBestSolver(columns)
+    solved = solver.solvedMask()
+    print(f"VBS of {len(names)} experiments: {np.count_nonzero(solved)} answered in {solver.totalTime():.2f}s")
+
+    header = ["experiment", "answered", "fastest", "unique", "time saved"]
+    rows = [[name, str(solver.solved[index]), str(solver.wins(index)), str(solver.uniques(index)), f"{solver.timeSaved(index):.2f}"] for index, name in enumerate(names)]
+    widths = [max(len(row[i]) for row in [header, *rows]) for i in range(len(header))]
+    for row in [header, *rows]:
+        print("  ".join(value.ljust(width) if i == 0 else value.rjust(width) for i, (value, width) in enumerate(zip(row, widths))))
+
+    os.makedirs(args.output, exist_ok=True)
+    with open(os.path.join(args.output, "winners.csv"), "w") as f:
+        writeWinners(f, con, solver, names)
+    with open(os.path.join(args.output, "VBS.tab"), "w") as f:
+        createTab(f, solver.best[solved])
+    con.close()